@@ -8,6 +8,8 @@ import os
 from .utils.error_handlers import register_error_handlers
 from .models import db
 from .utils.logging_utils import setup_logger
+from .utils.json_provider import install_json_provider
+from .utils.sql_instrumentation import install_sql_instrumentation
 
 # Initialize extensions
 migrate = Migrate()
@@ -15,6 +17,8 @@ socketio = SocketIO()
 
 def create_app():
     app = Flask(__name__)
+    install_json_provider(app)
+    install_sql_instrumentation(app)
     load_dotenv()
     
     # Set up logging
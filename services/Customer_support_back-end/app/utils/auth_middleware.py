@@ -1,10 +1,10 @@
 from functools import wraps
 from flask import request, jsonify, current_app
-import requests
 import os
 import logging
 from dotenv import load_dotenv
 from .logger import log_auth_success, log_auth_failure, log_support_agent_action
+from .auth_utils import auth_utils
 
 load_dotenv()
 
@@ -50,31 +50,17 @@ def auth_required(f):
             log_auth_success(request.user['id'], request.endpoint)
             return f(*args, **kwargs)
             
-        # Verify token with auth service
-        auth_service_url = os.getenv('AUTH_SERVICE_URL', 'http://localhost:5002')
-        try:
-            logger.info(f"Making request to {auth_service_url}/auth/verify")
-            response = requests.get(
-                f"{auth_service_url}/auth/verify",
-                headers={'Authorization': f'Bearer {token}'}
-            )
+        # Verify token locally, asking the auth service only for users it has not seen
+        user_data = auth_utils.verify_token(token)
+        if not user_data:
+            log_auth_failure("Invalid token", request.remote_addr, request.endpoint)
+            return jsonify({"error": "Invalid token"}), 401
             
-            logger.info(f"Auth service response: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Invalid token response: {response.text}")
-                log_auth_failure("Invalid token", request.remote_addr, request.endpoint)
-                return jsonify({"error": "Invalid token"}), 401
-                
-            # Add user info to request context
-            user_data = response.json().get('user')
-            logger.info(f"Authenticated user: {user_data.get('email')}")
-            request.user = user_data
-            log_auth_success(request.user['id'], request.endpoint)
-            return f(*args, **kwargs)
-        except requests.exceptions.RequestException:
-            log_auth_failure("Auth service unavailable", request.remote_addr, request.endpoint)
-            return jsonify({"error": "Auth service unavailable"}), 503
+        # Add user info to request context
+        logger.info(f"Authenticated user: {user_data.get('email')}")
+        request.user = user_data
+        log_auth_success(request.user['id'], request.endpoint)
+        return f(*args, **kwargs)
             
     return decorated_function
 
@@ -114,34 +100,20 @@ def support_agent_required(f):
             log_support_agent_action(request.user['id'], request.endpoint, 'debug_mode_access')
             return f(*args, **kwargs)
             
-        # Verify token with auth service
-        auth_service_url = os.getenv('AUTH_SERVICE_URL', 'http://localhost:5002')
-        try:
-            logger.info(f"Making support agent request to {auth_service_url}/auth/verify")
-            response = requests.get(
-                f"{auth_service_url}/auth/verify",
-                headers={'Authorization': f'Bearer {token}'}
-            )
+        # Verify token locally, asking the auth service only for users it has not seen
+        user = auth_utils.verify_token(token)
+        if not user:
+            log_auth_failure("Invalid token", request.remote_addr, request.endpoint)
+            return jsonify({"error": "Invalid token"}), 401
             
-            logger.info(f"Auth service support agent response: {response.status_code}")
+        # Check if user is a support agent
+        if not user.get('is_support_agent', False):
+            logger.error(f"User is not a support agent: {user.get('email')}")
+            log_auth_failure("Not a support agent", request.remote_addr, request.endpoint)
+            return jsonify({"error": "Support agent access required"}), 403
             
-            if response.status_code != 200:
-                logger.error(f"Invalid support agent token response: {response.text}")
-                log_auth_failure("Invalid token", request.remote_addr, request.endpoint)
-                return jsonify({"error": "Invalid token"}), 401
-            
-            user = response.json().get('user')
-            # Check if user is a support agent
-            if not user.get('is_support_agent', False):
-                logger.error(f"User is not a support agent: {user.get('email')}")
-                log_auth_failure("Not a support agent", request.remote_addr, request.endpoint)
-                return jsonify({"error": "Support agent access required"}), 403
-                
-            request.user = user
-            log_auth_success(request.user['id'], request.endpoint)
-            return f(*args, **kwargs)
-        except requests.exceptions.RequestException:
-            log_auth_failure("Auth service unavailable", request.remote_addr, request.endpoint)
-            return jsonify({"error": "Auth service unavailable"}), 503
+        request.user = user
+        log_auth_success(request.user['id'], request.endpoint)
+        return f(*args, **kwargs)
             
     return decorated_function
\ No newline at end of file
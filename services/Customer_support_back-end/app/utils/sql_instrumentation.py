@@ -0,0 +1,202 @@
+"""
+Per-request SQL instrumentation for the Shop Meeting API services.
+
+install_sql_instrumentation(app) times every statement SQLAlchemy executes
+while a request is being handled (via before/after_cursor_execute events) and:
+
+- adds a Server-Timing header, e.g. ``db;dur=12.3;desc="7 queries"``
+- logs a structured line per request (DEBUG, or WARNING over the
+  SQL_WARN_QUERY_COUNT / SQL_WARN_DB_MS thresholds)
+- aggregates count, DB time and the slowest statement per endpoint, served as
+  JSON from SQL_STATS_URL when SQL_STATS_ENDPOINT is enabled
+
+Endpoints that declare a budget by setting ``g.query_budget`` (the product
+service's @query_budget does) also report how often they went over it.
+
+Each service keeps a copy of this module next to its other shared utilities;
+edit this file and copy it over rather than changing a service's copy.
+"""
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Longest statement text kept for the slowest query
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestSQLStats:
+    """SQL statements executed while handling one request"""
+
+    __slots__ = ('count', 'total_time', 'slowest_time', 'slowest_statement')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total_time += duration
+        if duration > self.slowest_time:
+            self.slowest_time = duration
+            self.slowest_statement = statement
+
+
+class EndpointSQLStats:
+    """Process-wide SQL totals per endpoint"""
+
+    def __init__(self):
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, stats, budget=None):
+        """Fold one request's statistics into its endpoint's totals"""
+        with self._lock:
+            totals = self._endpoints.get(endpoint)
+            if totals is None:
+                totals = self._endpoints[endpoint] = {
+                    'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0, 'max_db_time': 0.0,
+                    'slowest_time': 0.0, 'slowest_statement': None, 'budget': None, 'over_budget': 0,
+                }
+            totals['requests'] += 1
+            totals['queries'] += stats.count
+            totals['max_queries'] = max(totals['max_queries'], stats.count)
+            totals['db_time'] += stats.total_time
+            totals['max_db_time'] = max(totals['max_db_time'], stats.total_time)
+            if stats.slowest_time > totals['slowest_time']:
+                totals['slowest_time'] = stats.slowest_time
+                totals['slowest_statement'] = stats.slowest_statement
+            if budget is not None:
+                totals['budget'] = budget
+                if stats.count > budget:
+                    totals['over_budget'] += 1
+
+    def snapshot(self):
+        """
+        Get the per-endpoint totals, most expensive endpoints first
+
+        Returns:
+            list: One dict per endpoint with averages in milliseconds
+        """
+        with self._lock:
+            endpoints = [(endpoint, dict(totals)) for endpoint, totals in self._endpoints.items()]
+        result = []
+        for endpoint, totals in endpoints:
+            requests = totals['requests']
+            result.append({
+                'endpoint': endpoint,
+                'requests': requests,
+                'avg_queries': round(totals['queries'] / requests, 2),
+                'max_queries': totals['max_queries'],
+                'avg_db_ms': round(totals['db_time'] * 1000 / requests, 3),
+                'max_db_ms': round(totals['max_db_time'] * 1000, 3),
+                'total_db_ms': round(totals['db_time'] * 1000, 3),
+                'slowest_ms': round(totals['slowest_time'] * 1000, 3),
+                'slowest_statement': totals['slowest_statement'],
+                'budget': totals['budget'],
+                'over_budget': totals['over_budget'],
+            })
+        result.sort(key=lambda item: item['total_db_ms'], reverse=True)
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context() and g.get('_sql_stats') is not None:
+        context._sql_instrumentation_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_sql_instrumentation_start', None)
+    if start is None or not has_request_context():
+        return
+    stats = g.get('_sql_stats')
+    if stats is not None:
+        stats.record(statement[:MAX_STATEMENT_LENGTH], time.perf_counter() - start)
+
+
+def _endpoint_name():
+    """Method and URL rule of the current request, e.g. 'GET /api/v1/products'"""
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    return f"{request.method} {rule}" if rule else None
+
+
+def install_sql_instrumentation(app):
+    """
+    Record SQL statistics for every request an app handles
+
+    Args:
+        app: Flask application
+
+    Returns:
+        EndpointSQLStats: The app's per-endpoint totals
+    """
+    endpoint_stats = EndpointSQLStats()
+    app.extensions['sql_instrumentation'] = endpoint_stats
+    warn_queries = int(app.config.get('SQL_WARN_QUERY_COUNT', os.getenv('SQL_WARN_QUERY_COUNT', '20')))
+    warn_ms = float(app.config.get('SQL_WARN_DB_MS', os.getenv('SQL_WARN_DB_MS', '500')))
+
+    @app.before_request
+    def _start_sql_stats():
+        g._sql_stats = RequestSQLStats()
+
+    @app.after_request
+    def _report_sql_stats(response):
+        stats = g.get('_sql_stats')
+        if stats is None:
+            return response
+        g._sql_stats = None
+
+        db_ms = stats.total_time * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.2f};desc="{stats.count} queries"')
+
+        endpoint = _endpoint_name()
+        budget = g.get('query_budget')
+        if endpoint is not None:
+            endpoint_stats.add(endpoint, stats, budget)
+
+        level = logging.WARNING if stats.count > warn_queries or db_ms > warn_ms else logging.DEBUG
+        if logger.isEnabledFor(level):
+            fields = {
+                'endpoint': endpoint or request.path,
+                'status': response.status_code,
+                'queries': stats.count,
+                'db_ms': round(db_ms, 2),
+                'slowest_ms': round(stats.slowest_time * 1000, 2),
+                'budget': budget,
+            }
+            logger.log(
+                level,
+                "sql_stats " + ' '.join(f"{key}={value}" for key, value in fields.items()),
+                extra={'sql_stats': dict(fields, slowest_statement=stats.slowest_statement)}
+            )
+        return response
+
+    enabled = app.config.get('SQL_STATS_ENDPOINT', os.getenv('SQL_STATS_ENDPOINT', 'false').lower() == 'true')
+    if enabled:
+        def sql_stats():
+            """Per-endpoint SQL statistics for this process (DELETE resets them)"""
+            if request.method == 'DELETE':
+                endpoint_stats.reset()
+                return jsonify({'message': 'SQL statistics reset'}), 200
+            return jsonify({'endpoints': endpoint_stats.snapshot()}), 200
+
+        app.add_url_rule(
+            app.config.get('SQL_STATS_URL', '/debug/sql-stats'),
+            'sql_stats', sql_stats, methods=['GET', 'DELETE']
+        )
+
+    return endpoint_stats
@@ -1,79 +1,134 @@
 import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError, OperationalError, SQLAlchemyError
 from app.models import db, User
 import logging
 
 logger = logging.getLogger(__name__)
 
+class KnownUsers:
+    """
+    Bounded set of user IDs this process has already synced, with a
+    fingerprint of the synced fields so changed claims are written again
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_current(self, user_id, fingerprint):
+        with self._lock:
+            if self._entries.get(user_id) != fingerprint:
+                return False
+            self._entries.move_to_end(user_id)
+            return True
+
+    def add(self, user_id, fingerprint):
+        with self._lock:
+            self._entries[user_id] = fingerprint
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Create a singleton instance
+known_users = KnownUsers(max_entries=int(os.environ.get('USER_SYNC_CACHE_SIZE', '10000')))
+
+def upsert_user(values, update_columns):
+    """
+    Insert a user row, or update update_columns if the ID exists, in one statement
+
+    Uses INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite; the update
+    is skipped when nothing changed, and an existing row is left alone when
+    update_columns is empty. Other databases fall back to a lookup.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        user = User.query.get(values['id'])
+        if user is None:
+            db.session.add(User(**values))
+        else:
+            for column in update_columns:
+                setattr(user, column, values[column])
+        return
+
+    table = User.__table__
+    stmt = insert(table).values(**values)
+    if not update_columns:
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=[table.c.id]))
+        return
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={column: stmt.excluded[column] for column in update_columns},
+        where=or_(*(table.c[column].is_distinct_from(stmt.excluded[column]) for column in update_columns))
+    )
+    db.session.execute(stmt)
+
 def sync_user_from_auth(user_data):
     """
     Sync user data from Auth Service to the Customer Support Service database.
     This ensures that a user record exists for authenticated users.
-    
+
+    Users already synced by this process with the same data are skipped
+    without touching the database; otherwise the record is upserted. Only
+    the fields derived from claims present in user_data are written to an
+    existing record, so a minimal user (e.g. while the Auth Service is
+    unreachable) never replaces real details with placeholders.
+
     Args:
         user_data (dict): User data from Auth Service token
-        
+
     Returns:
-        User: The synchronized user record
+        bool: True if the user record exists and is up to date, False if it
+        could not be synced (e.g. the database is not available)
     """
     user_id = user_data.get('id')
     if not user_id:
         logger.warning("User data missing ID, cannot sync")
-        return None
-    
+        return False
+
+    # Combine first_name and last_name for full_name field
+    full_name = f"{user_data.get('first_name') or ''} {user_data.get('last_name') or ''}".strip()
+    email = user_data.get('email')
+
+    # Use email as username if not provided
+    values = {
+        'id': user_id,
+        'username': email or f"user_{user_id}",
+        'email': email or f"user_{user_id}@example.com",
+        'full_name': full_name or "Unknown User",
+        # Secure placeholder password since we're using JWT for auth; only
+        # set on insert and never used for auth
+        'password': os.urandom(16).hex()
+    }
+    update_columns = (['username', 'email'] if email else []) + (['full_name'] if full_name else [])
+    fingerprint = tuple((column, values[column]) for column in update_columns)
+    if known_users.is_current(str(user_id), fingerprint):
+        return True
+
     try:
-        # Check if user already exists
-        user = User.query.filter_by(id=user_id).first()
-        
-        if not user:
-            # Create user record if it doesn't exist
-            try:
-                # Combine first_name and last_name for full_name field
-                full_name = f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip()
-                if not full_name:
-                    full_name = "Unknown User"
-                
-                # Use email as username if not provided
-                username = user_data.get('email', f"user_{user_id}")
-                email = user_data.get('email', f"user_{user_id}@example.com")
-                
-                # Create a secure placeholder password since we're using JWT for auth
-                placeholder_password = os.urandom(16).hex()
-                
-                user = User(
-                    id=user_id,
-                    username=username,
-                    email=email,
-                    password=placeholder_password,  # Will never be used for auth
-                    full_name=full_name
-                )
-                db.session.add(user)
-                db.session.commit()
-                logger.info(f"Created new user: {user_id} in Customer Support Service database")
-                return user
-            except IntegrityError:
-                # In case of race condition, roll back and try to fetch again
-                db.session.rollback()
-                logger.warning(f"Integrity error when creating user {user_id}, rolling back")
-                return User.query.filter_by(id=user_id).first()
-        
-        return user
-        
+        upsert_user(values, update_columns)
+        db.session.commit()
+    except IntegrityError:
+        # e.g. the email or username belongs to another user row
+        db.session.rollback()
+        logger.warning(f"Integrity error when syncing user {user_id}, rolling back")
+        return False
     except (OperationalError, SQLAlchemyError) as e:
         db.session.rollback()
         logger.error(f"Database error in sync_user_from_auth: {str(e)}")
-        
-        # Return a mock user object when database is not available
-        # This allows the service to continue functioning in production mode
-        mock_user = type('obj', (object,), {
-            'id': user_id,
-            'username': user_data.get('email', f"user_{user_id}"),
-            'email': user_data.get('email', f"user_{user_id}@example.com"),
-            'full_name': f"{user_data.get('first_name', '')} {user_data.get('last_name', '')}".strip() or "Unknown User",
-            'is_admin': user_data.get('is_admin', False),
-            'is_support_agent': user_data.get('is_support_agent', False),
-            'is_mock': True
-        })
-        
-        logger.info(f"Returning mock user for {user_id} due to database unavailability")
-        return mock_user
+        return False
+
+    known_users.add(str(user_id), fingerprint)
+    logger.debug(f"Synced user {user_id} to Customer Support Service database")
+    return True
@@ -0,0 +1,37 @@
+import pytest
+from flask import Flask
+from app.models import db, User
+from app.utils.user_sync import known_users, sync_user_from_auth
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    known_users.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+    known_users.clear()
+
+
+def test_sync_user_only_overwrites_supplied_details(app):
+    assert sync_user_from_auth({'id': 7, 'email': 'jane@example.com', 'first_name': 'Jane', 'last_name': 'Doe'})
+    known_users.clear()
+    # Minimal user data, e.g. while the Auth Service is unreachable
+    assert sync_user_from_auth({'id': 7, 'role': 'user'})
+    user = User.query.get(7)
+    assert (user.username, user.email, user.full_name) == ('jane@example.com', 'jane@example.com', 'Jane Doe')
+
+    # Placeholders are per user, so new minimal users do not collide
+    assert sync_user_from_auth({'id': 8, 'role': 'user'})
+    assert sync_user_from_auth({'id': 9, 'role': 'user'})
+    assert User.query.get(9).email == 'user_9@example.com'
+
+    # A name without an email updates the name only
+    assert sync_user_from_auth({'id': 7, 'first_name': 'Janet', 'last_name': 'Doe'})
+    db.session.expire_all()
+    user = User.query.get(7)
+    assert (user.email, user.full_name) == ('jane@example.com', 'Janet Doe')
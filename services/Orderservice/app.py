@@ -9,10 +9,20 @@ import os
 from models import db, Order, OrderItem, ReturnRequest
 from utils.auth_utils import auth_required, admin_required
 from utils.user_sync import sync_user_from_auth
-from utils.service_utils import call_service
+from utils.service_utils import call_service, fetch_products, stock_reference, reserve_stock, confirm_stock_hold, release_stock
+from utils.json_provider import install_json_provider
+from utils.sql_instrumentation import install_sql_instrumentation
+
+# Order details a new order must carry, with the longest value each column holds
+ORDER_DETAIL_FIELDS = {
+    field: getattr(Order, field).type.length
+    for field in ('shipping_address', 'billing_address', 'payment_method')
+}
 
 def create_app(test_config=None):
     app = Flask(__name__)
+    install_json_provider(app)
+    install_sql_instrumentation(app)
     load_dotenv()
     
     # Configure CORS with allowed origins
@@ -64,6 +74,22 @@ def create_app(test_config=None):
             print(f"Error sending email: {e}")
             return False
 
+    def restock_order(order):
+        """Give a cancelled order's stock back to product-service"""
+        if not order.items:
+            return
+        result = release_stock(os.getenv('PRODUCT_SERVICE_URL'), stock_reference(order.id))
+        if result is None:
+            app.logger.error(f"Could not release stock for cancelled order {order.id}")
+
+    def discard_order(order):
+        """Delete a Pending order whose stock could not be reserved"""
+        try:
+            db.session.delete(order)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Could not discard pending order {order.id}: {str(e)}")
 
     def validate_json(required_fields):
         def decorator(func):
@@ -301,6 +327,9 @@ def create_app(test_config=None):
             db.session.rollback()
             return jsonify({'error': f'Database error: {str(e)}'}), 500
         
+        if new_status == 'Cancelled':
+            restock_order(order)
+        
         # Send notification if shipped
         if new_status == 'Shipped':
             user_email = f"user{order.user_id}@example.com"  # In production, get from user service
@@ -357,6 +386,7 @@ def create_app(test_config=None):
                 db.session.rollback()
                 return jsonify({'error': f'Database error: {str(e)}'}), 500
             
+            restock_order(order)
             return jsonify({'message': 'Order cancelled successfully'}), 200
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -368,6 +398,14 @@ def create_app(test_config=None):
         if not data or 'items' not in data:
             return jsonify({'error': 'Missing required fields'}), 400
 
+        # The order can not be stored without where it goes and how it is paid
+        for field, max_length in ORDER_DETAIL_FIELDS.items():
+            value = data.get(field)
+            if not isinstance(value, str) or not value.strip():
+                return jsonify({'error': f'Missing required field: {field}'}), 400
+            if len(value.strip()) > max_length:
+                return jsonify({'error': f'{field} must be at most {max_length} characters'}), 400
+
         # Check if DEBUG_MODE is enabled
         debug_mode = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
         
@@ -415,19 +453,24 @@ def create_app(test_config=None):
 
         product_service_url = os.getenv('PRODUCT_SERVICE_URL')
 
+        # Fetch details for every line from product-service in one round trip
+        batch = fetch_products(product_service_url, [item.get('product_id') for item in items])
+        if batch is None:
+            return jsonify({'error': 'Product service unavailable'}), 503
+        if 'error' in batch:
+            # Product-service refused the lines themselves, e.g. non-integer IDs
+            return jsonify({'error': batch['error'], 'message': batch.get('message')}), 400
+        products = batch.get('products', {})
+
         for item in items:
             product_id = item.get('product_id')
             quantity = item.get('quantity', 1)
 
-            # Fetch product details from product-service
-            product = call_service(product_service_url, f"/api/products/{product_id}")
+            product = products.get(str(product_id))
 
             if not product:
                 return jsonify({'error': f'Product with ID {product_id} not found'}), 404
 
-            if product['stock_quantity'] < quantity:
-                return jsonify({'error': f'Insufficient stock for product ID {product_id}'}), 400
-
             total_amount += product['price'] * quantity
             order_items.append({
                 'product_id': product_id,
@@ -436,26 +479,72 @@ def create_app(test_config=None):
                 'price': product['price']
             })
 
-        # Create the order
-        order = Order(user_id=user_id, total_amount=total_amount, status='Processing')
+        # Store the order as Pending before touching stock: its ID names the
+        # reservation, and no transaction is held open across the calls below
+        order = Order(
+            user_id=user_id,
+            total_amount=total_amount,
+            status='Pending',
+            shipping_address=data['shipping_address'].strip(),
+            billing_address=data['billing_address'].strip(),
+            payment_method=data['payment_method'].strip(),
+            items=[OrderItem(**item) for item in order_items]
+        )
         db.session.add(order)
-        db.session.flush()
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': f'Failed to create order: {str(e)}'}), 500
+        reference = stock_reference(order.id)
 
-        for item in order_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item['product_id'],
-                product_name=item['product_name'],
-                quantity=item['quantity'],
-                price=item['price']
-            )
-            db.session.add(order_item)
+        # Take the stock atomically in product-service; nothing is taken if any line is short.
+        # A checkout that holds its stock confirms the hold instead.
+        stock_lines = [{'product_id': item['product_id'], 'quantity': item['quantity']} for item in order_items]
+        if data.get('hold_id'):
+            service_headers = {'Authorization': request.headers.get('Authorization')}
+            reservation = confirm_stock_hold(product_service_url, data['hold_id'], reference, stock_lines, headers=service_headers)
+        else:
+            reservation = reserve_stock(product_service_url, reference, stock_lines)
+        if reservation is None:
+            # Product-service may have taken the stock before the call failed;
+            # give it back. A 404 only means nothing was reserved
+            if release_stock(product_service_url, reference) is None:
+                app.logger.warning(f"Could not release stock {reference}; it may never have been reserved")
+            discard_order(order)
+            return jsonify({'error': 'Product service unavailable'}), 503
+        if data.get('hold_id') and 'confirmed' not in reservation and 'shortages' not in reservation:
+            discard_order(order)
+            return jsonify({'error': f"Stock hold could not be confirmed: {reservation.get('error')}"}), 409
+        if 'reserved' not in reservation and 'confirmed' not in reservation and 'shortages' not in reservation:
+            # Refused before any stock was checked, e.g. an invalid quantity
+            discard_order(order)
+            return jsonify({'error': reservation.get('error'), 'message': reservation.get('message')}), 400
+        if 'reserved' not in reservation and 'confirmed' not in reservation:
+            discard_order(order)
+            short_ids = [line['product_id'] for line in reservation.get('shortages', [])] + reservation.get('missing', [])
+            return jsonify({
+                'error': f'Insufficient stock for product ID {", ".join(str(product_id) for product_id in short_ids)}',
+                'shortages': reservation.get('shortages', []),
+                'missing': reservation.get('missing', [])
+            }), 400
 
         try:
+            order.status = 'Processing'
             db.session.commit()
-            return jsonify({'message': 'Order created successfully', 'order_id': order.id}), 201
+            return jsonify({
+                'message': 'Order created successfully',
+                'order_id': order.id,
+                'total_amount': order.total_amount,
+                'status': order.status,
+                'items': order_items
+            }), 201
         except Exception as e:
             db.session.rollback()
+            # Give the reserved stock back so a failed order does not leak it
+            if release_stock(product_service_url, reference) is None:
+                app.logger.error(f"Could not release stock {reference} after failed order: {str(e)}")
+            discard_order(order)
             return jsonify({'error': f'Failed to create order: {str(e)}'}), 500
 
     @app.route('/returns', methods=['POST'])
@@ -71,6 +71,7 @@ class Order(SerializerMixin, db.Model):
     returns = db.relationship('ReturnRequest', backref='order', lazy=True)
 
     STATUS_CHOICES = {
+        'Pending': 'Order placed, stock not yet reserved',
         'Processing': 'Order received, not yet shipped',
         'Shipped': 'Order has been shipped',
         'Delivered': 'Order delivered to customer',
@@ -7,7 +7,14 @@ import json
 from unittest.mock import patch
 from app import create_app, db
 import datetime
-from models import Order, ReturnRequest
+import time
+import jwt
+import requests
+from unittest.mock import Mock
+from models import Order, ReturnRequest, User
+from utils.auth_utils import auth_utils
+from utils.service_utils import SERVICE_TIMEOUT, reserve_stock
+from utils.user_sync import known_users, sync_user_from_auth
 
 @pytest.fixture
 def client():
@@ -165,3 +172,149 @@ def test_process_return_invalid_action(client):
     assert response.status_code == 400
     data = response.get_json()
     assert 'error' in data
+
+@pytest.fixture
+def sqlite_app():
+    app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    known_users.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+    known_users.clear()
+
+def test_sync_user_keeps_details_missing_from_user_data(sqlite_app):
+    assert sync_user_from_auth({'id': 7, 'email': 'jane@example.com', 'first_name': 'Jane', 'last_name': 'Doe'})
+    # Minimal user data (e.g. while the Auth Service is down) creates
+    # distinct placeholder rows and leaves existing rows alone
+    assert sync_user_from_auth({'id': 8, 'role': 'user'})
+    assert sync_user_from_auth({'id': 9, 'role': 'user'})
+    known_users.clear()
+    assert sync_user_from_auth({'id': 7, 'role': 'user'})
+    user = User.query.get(7)
+    assert (user.email, user.first_name, user.last_name) == ('jane@example.com', 'Jane', 'Doe')
+
+    assert sync_user_from_auth({'id': 7, 'email': 'jane@example.com', 'first_name': 'Janet', 'last_name': 'Doe'})
+    db.session.expire_all()
+    assert User.query.get(7).first_name == 'Janet'
+    assert User.query.get(8).email == 'user_8@example.com'
+
+
+def product_response(status_code, body):
+    response = Mock(status_code=status_code)
+    response.json.return_value = body
+    if status_code >= 400:
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+    return response
+
+def order_payload(items, **details):
+    return {
+        'items': items,
+        'shipping_address': '1 Main St, Springfield',
+        'billing_address': '1 Main St, Springfield',
+        'payment_method': 'card',
+        **details
+    }
+
+def user_headers():
+    token = jwt.encode({
+        'sub': 1, 'type': 'access', 'exp': int(time.time()) + 300,
+        'email': 'jane@example.com', 'first_name': 'Jane', 'last_name': 'Doe', 'role': 'user'
+    }, auth_utils.jwt_secret, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+def test_create_order_passes_product_service_refusals_through(sqlite_app, monkeypatch):
+    monkeypatch.setenv('PRODUCT_SERVICE_URL', 'http://products')
+    headers = user_headers()
+    client = sqlite_app.test_client()
+
+    with patch('utils.service_utils.requests.post') as post:
+        post.return_value = product_response(400, {'error': 'Product IDs must be integers'})
+        response = client.post('/orders', json=order_payload([{'product_id': 'x', 'quantity': 1}]), headers=headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Product IDs must be integers'
+        assert post.call_args.kwargs['timeout'] == SERVICE_TIMEOUT
+
+        post.side_effect = requests.exceptions.Timeout()
+        response = client.post('/orders', json=order_payload([{'product_id': 1, 'quantity': 1}]), headers=headers)
+        assert response.status_code == 503
+
+        # The stock reservation is refused the same way, not reported as an outage
+        post.side_effect = None
+        post.return_value = product_response(400, {'error': 'Invalid items', 'message': 'quantity must be positive'})
+        assert reserve_stock('http://products', 'order-1', [{'product_id': 1, 'quantity': -1}])['error'] == 'Invalid items'
+        assert post.call_args.kwargs['timeout'] == SERVICE_TIMEOUT
+    assert Order.query.count() == 0
+
+
+def test_create_order_stores_the_reserved_items(sqlite_app, monkeypatch):
+    monkeypatch.setenv('PRODUCT_SERVICE_URL', 'http://products')
+    headers = user_headers()
+    client = sqlite_app.test_client()
+    products = {'products': {'1': {'id': 1, 'name': 'Lamp', 'price': 20.0}, '2': {'id': 2, 'name': 'Desk', 'price': 150.0}}}
+    items = [{'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': 1}]
+
+    # The order can not be stored without its delivery and payment details
+    response = client.post('/orders', json=order_payload(items, payment_method=' '), headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Missing required field: payment_method'
+
+    def product_service(url, **kwargs):
+        if url.endswith('/products/batch'):
+            return product_response(200, products)
+        return product_response(200, {'reference': kwargs['json']['reference'], 'reserved': kwargs['json']['items']})
+
+    with patch('utils.service_utils.requests.post', side_effect=product_service):
+        response = client.post('/orders', json=order_payload(items), headers=headers)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body['total_amount'] == 190.0
+    assert [(item['product_name'], item['quantity']) for item in body['items']] == [('Lamp', 2), ('Desk', 1)]
+
+    order = Order.query.get(body['order_id'])
+    assert (order.status, order.shipping_address, order.payment_method) == ('Processing', '1 Main St, Springfield', 'card')
+    assert sorted((item.product_id, item.quantity) for item in order.items) == [(1, 2), (2, 1)]
+
+    # A reservation that times out may still have taken the stock, so it is
+    # released and the pending order dropped
+    released = []
+    def reserve_times_out(url, **kwargs):
+        if url.endswith('/products/batch'):
+            return product_response(200, products)
+        if url.endswith('/stock/release'):
+            released.append(kwargs['json']['reference'])
+            return product_response(404, {'error': 'Reservation not found'})
+        raise requests.exceptions.Timeout()
+
+    with patch('utils.service_utils.requests.post', side_effect=reserve_times_out):
+        response = client.post('/orders', json=order_payload(items), headers=headers)
+    assert response.status_code == 503
+    assert len(released) == 1
+    assert Order.query.count() == 1
+
+
+def test_demoted_admins_old_token_is_refused(sqlite_app, monkeypatch):
+    monkeypatch.setattr(auth_utils, 'service_api_key', 'service-key')
+    auth_utils.claims_cache.clear()
+    current = {'email': 'admin@example.com', 'first_name': 'Ada', 'last_name': 'Min', 'role': 'admin', 'is_admin': True, 'cv': 1}
+    lookups = []
+    def auth_service(url, **kwargs):
+        lookups.append((url, kwargs['headers']['X-Service-Key']))
+        return product_response(200, {'id': 5, 'claims': current})
+
+    token = jwt.encode({'sub': 5, 'type': 'access', 'exp': int(time.time()) + 300, **current}, auth_utils.jwt_secret, algorithm='HS256')
+    headers = {'Authorization': f'Bearer {token}'}
+    client = sqlite_app.test_client()
+    with patch('utils.auth_utils.requests.get', side_effect=auth_service):
+        # Admin while the claims version matches (the order does not exist)
+        assert client.put('/orders/missing/status', json={'status': 'Shipped'}, headers=headers).status_code == 404
+        assert client.put('/orders/missing/status', json={'status': 'Shipped'}, headers=headers).status_code == 404
+        assert lookups == [(f'{auth_utils.auth_service_url}/auth/users/5/claims', 'service-key')]
+
+        # Demoted: once the cached claims expire, the old token only carries the current role
+        current = dict(current, role='user', is_admin=False, cv=2)
+        auth_utils.claims_cache.clear()
+        response = client.put('/orders/missing/status', json={'status': 'Shipped'}, headers=headers)
+        assert response.status_code == 403
+        assert response.get_json()['error'] == 'Admin access required'
+    auth_utils.claims_cache.clear()
@@ -1,18 +1,26 @@
+import os
 import requests
 from flask import current_app
 
+# Seconds to wait for another service before treating it as unavailable
+SERVICE_TIMEOUT = float(os.getenv('SERVICE_TIMEOUT', '5'))
+
+# Statuses with which product-service refuses the request itself; their bodies
+# say why and are returned to the caller. Anything else is a failure
+REFUSED_STATUSES = (400, 404, 409)
+
 # Utility function to make inter-service API calls
 def call_service(service_url, endpoint, method='GET', headers=None, data=None):
     url = f"{service_url}{endpoint}"
     try:
         if method == 'GET':
-            response = requests.get(url, headers=headers)
+            response = requests.get(url, headers=headers, timeout=SERVICE_TIMEOUT)
         elif method == 'POST':
-            response = requests.post(url, headers=headers, json=data)
+            response = requests.post(url, headers=headers, json=data, timeout=SERVICE_TIMEOUT)
         elif method == 'PUT':
-            response = requests.put(url, headers=headers, json=data)
+            response = requests.put(url, headers=headers, json=data, timeout=SERVICE_TIMEOUT)
         elif method == 'DELETE':
-            response = requests.delete(url, headers=headers)
+            response = requests.delete(url, headers=headers, timeout=SERVICE_TIMEOUT)
         else:
             raise ValueError("Unsupported HTTP method")
 
@@ -20,4 +28,87 @@ def call_service(service_url, endpoint, method='GET', headers=None, data=None):
         return response.json()
     except requests.exceptions.RequestException as e:
         current_app.logger.error(f"Error calling service {url}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+# Fetch many products from product-service in a single call
+def fetch_products(service_url, product_ids):
+    """
+    Look up products by ID with product-service's batch endpoint
+
+    Returns a dict with 'products' (keyed by product ID as a string) and
+    'missing' (IDs that do not exist), a body with 'error' if product-service
+    refused the IDs (e.g. not integers, or too many), or None if
+    product-service failed.
+    """
+    url = f"{service_url}/api/v1/products/batch"
+    try:
+        response = requests.post(url, json={'ids': list(product_ids)}, timeout=SERVICE_TIMEOUT)
+        if response.status_code not in REFUSED_STATUSES:
+            response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Error calling service {url}: {e}")
+        return None
+
+# Credential for product-service's service-only endpoints
+def service_headers():
+    return {'X-Service-Key': os.getenv('SERVICE_API_KEY', '')}
+
+# Name under which an order's stock is reserved in product-service
+def stock_reference(order_id):
+    return f"order-{order_id}"
+
+# Atomically take stock for order lines in product-service
+def reserve_stock(service_url, reference, lines):
+    """
+    Reserve stock for [{'product_id', 'quantity'}] lines, all or nothing
+
+    Returns product-service's response body: {'reserved': [...]} on success,
+    {'error', 'shortages', 'missing'} when some line could not be satisfied (in
+    which case nothing was reserved), or a body with 'error' when the lines
+    were refused as invalid. Returns None if product-service failed.
+    """
+    url = f"{service_url}/api/v1/products/stock/reserve"
+    try:
+        response = requests.post(
+            url, headers=service_headers(), json={'reference': reference, 'items': lines}, timeout=SERVICE_TIMEOUT
+        )
+        if response.status_code not in REFUSED_STATUSES:
+            response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Error calling service {url}: {e}")
+        return None
+
+# Turn a checkout stock hold into a stock decrement
+def confirm_stock_hold(service_url, hold_id, reference, lines, headers=None):
+    """
+    Confirm a product-service stock hold, which must cover exactly these lines,
+    recording the stock as reserved under reference for release_stock
+
+    Returns {'confirmed': [...]} on success, or a body with 'error' when the
+    lines are invalid (400), the hold expired (404) or does not match (409).
+    Returns None if product-service failed.
+    """
+    url = f"{service_url}/api/v1/products/stock/holds/{hold_id}/confirm"
+    try:
+        response = requests.post(
+            url, headers={**(headers or {}), **service_headers()}, json={'reference': reference, 'items': lines},
+            timeout=SERVICE_TIMEOUT
+        )
+        if response.status_code not in REFUSED_STATUSES:
+            response.raise_for_status()
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        current_app.logger.error(f"Error calling service {url}: {e}")
+        return None
+
+# Give back the stock reserved under a reference with reserve_stock or confirm_stock_hold
+def release_stock(service_url, reference):
+    return call_service(
+        service_url,
+        '/api/v1/products/stock/release',
+        method='POST',
+        headers=service_headers(),
+        data={'reference': reference}
+    )
@@ -1,46 +1,123 @@
 import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import or_
 from sqlalchemy.exc import IntegrityError, OperationalError
 from models import db, User
 
+class KnownUsers:
+    """
+    Bounded set of user IDs this process has already synced, with a
+    fingerprint of the synced fields so changed claims are written again
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_current(self, user_id, fingerprint):
+        with self._lock:
+            if self._entries.get(user_id) != fingerprint:
+                return False
+            self._entries.move_to_end(user_id)
+            return True
+
+    def add(self, user_id, fingerprint):
+        with self._lock:
+            self._entries[user_id] = fingerprint
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Create a singleton instance
+known_users = KnownUsers(max_entries=int(os.environ.get('USER_SYNC_CACHE_SIZE', '10000')))
+
+def upsert_user(values, update_columns):
+    """
+    Insert a user row, or update update_columns if the ID exists, in one statement
+
+    Uses INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite; the update
+    is skipped when nothing changed, and an existing row is left alone when
+    update_columns is empty. Other databases fall back to a lookup.
+    """
+    dialect = db.engine.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        user = User.query.get(values['id'])
+        if user is None:
+            db.session.add(User(**values))
+        else:
+            for column in update_columns:
+                setattr(user, column, values[column])
+        return
+
+    table = User.__table__
+    stmt = insert(table).values(**values)
+    if not update_columns:
+        db.session.execute(stmt.on_conflict_do_nothing(index_elements=[table.c.id]))
+        return
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={column: stmt.excluded[column] for column in update_columns},
+        where=or_(*(table.c[column].is_distinct_from(stmt.excluded[column]) for column in update_columns))
+    )
+    db.session.execute(stmt)
+
 def sync_user_from_auth(user_data):
     """
     Sync user data from Auth Service to the Order Service database.
     This ensures that a user record exists for authenticated users.
-    
+
+    Users already synced by this process with the same data are skipped
+    without touching the database; otherwise the record is upserted. Only
+    the claims present in user_data are written to an existing record, so a
+    minimal user (e.g. while the Auth Service is unreachable) never replaces
+    real details with placeholders.
+
     Args:
         user_data (dict): User data from Auth Service token
-        
+
     Returns:
-        User: The synchronized user record or None if database not available
+        bool: True if the user record exists and is up to date, False if it
+        could not be synced (e.g. the database is not available)
     """
     user_id = user_data.get('id')
     if not user_id:
-        return None
-        
+        return False
+
+    claims = {column: user_data[column] for column in ('email', 'first_name', 'last_name') if user_data.get(column)}
+    # Placeholders only fill in a new record; the email is per user as it is unique
+    values = dict({
+        'id': user_id,
+        'email': f"user_{user_id}@example.com",
+        'first_name': 'Unknown',
+        'last_name': 'User'
+    }, **claims)
+    fingerprint = tuple(sorted(claims.items()))
+    if known_users.is_current(str(user_id), fingerprint):
+        return True
+
     try:
-        # Check if user already exists
-        user = User.query.filter_by(id=user_id).first()
-        
-        if not user:
-            # Create user record if it doesn't exist
-            try:
-                user = User(
-                    id=user_id,
-                    email=user_data.get('email', 'unknown@example.com'),
-                    first_name=user_data.get('first_name', 'Unknown'),
-                    last_name=user_data.get('last_name', 'User')
-                )
-                db.session.add(user)
-                db.session.commit()
-                return user
-            except IntegrityError:
-                # In case of race condition, roll back and try to fetch again
-                db.session.rollback()
-                return User.query.filter_by(id=user_id).first()
-        
-        return user
+        upsert_user(values, list(claims))
+        db.session.commit()
+    except IntegrityError:
+        # e.g. the email belongs to another user row
+        db.session.rollback()
+        return False
     except OperationalError:
-        # If database is not available, just return None
+        # If database is not available, just return False
         # The application will fall back to using mock data
+        db.session.rollback()
         print(f"Unable to connect to database. User {user_id} will not be synced.")
-        return None
+        return False
+
+    known_users.add(str(user_id), fingerprint)
+    return True
@@ -1,22 +1,34 @@
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from flask_migrate import Migrate
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 
 from .models.user import db
 from .routes.auth_routes import auth_bp
-from .commands import create_support_agent
+from .commands import create_support_agent, set_user_role
 from .utils.error_handlers import register_error_handlers
+from .utils.json_provider import install_json_provider
+from .utils.login_limiter import login_limiter
+from .utils.password_hashing import password_hasher
+from .utils.rate_limit import limiter
+from .utils.sql_instrumentation import install_sql_instrumentation
 from config import Config
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    install_json_provider(app)
+    install_sql_instrumentation(app)
+    
+    # Take the client address from the gateway's X-Forwarded-For, so rate
+    # limits are per client rather than per gateway
+    if app.config['PROXY_FIX_HOPS']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_HOPS'])
     
     # Initialize extensions
     db.init_app(app)
+    password_hasher.init_app(app)
     jwt = JWTManager(app)
     
     # Configure CORS with allowed origins
@@ -30,19 +42,16 @@ def create_app(config_class=Config):
     
     migrate = Migrate(app, db)
     
-    # Initialize rate limiter
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=["200 per day", "50 per hour"],
-        storage_uri=app.config['RATELIMIT_STORAGE_URL']
-    )
+    # Initialize rate limiters
+    limiter.init_app(app)
+    login_limiter.init_app(app)
     
     # Register error handlers
     register_error_handlers(app)
     
     # Register commands
     app.cli.add_command(create_support_agent)
+    app.cli.add_command(set_user_role)
     
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -25,4 +25,22 @@ def create_support_agent(email, password, first_name, last_name):
         click.echo(f"Support agent created successfully: {email}")
     except Exception as e:
         click.echo(f"Error creating support agent: {str(e)}")
+        db.session.rollback()
+
+@click.command('set-user-role')
+@click.argument('email')
+@click.argument('role', type=click.Choice(['user', 'support_agent', 'admin']))
+@with_appcontext
+def set_user_role(email, role):
+    """Change a user's role; their existing tokens stop being accepted"""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        click.echo(f"User not found: {email}")
+        return
+    try:
+        user.role = role
+        db.session.commit()
+        click.echo(f"{email} is now {role} (claims version {user.claims_version})")
+    except Exception as e:
+        click.echo(f"Error changing role: {str(e)}")
         db.session.rollback()
\ No newline at end of file
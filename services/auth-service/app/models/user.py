@@ -1,9 +1,15 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect
 from datetime import datetime
-import bcrypt
+
+from ..utils.password_hashing import password_hasher
 
 db = SQLAlchemy()
 
+# Fields embedded in access tokens (or deciding whether one may be issued);
+# changing any of them bumps the user's claims version
+CLAIM_FIELDS = ('email', 'first_name', 'last_name', 'role', 'is_active')
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -14,16 +20,24 @@ class User(db.Model):
     last_name = db.Column(db.String(50))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
+    # No longer written: failed logins are counted by utils.login_limiter
     login_attempts = db.Column(db.Integer, default=0)
     last_login_attempt = db.Column(db.DateTime)
     role = db.Column(db.String(20), default='user')  # 'user', 'support_agent', 'admin'
+    # Version of the claims in this user's tokens; tokens carrying an older
+    # version are refused by /verify and /refresh
+    claims_version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
 
+    # Hashing runs in the password hashing pool and raises HasherBusy when it is full
     def set_password(self, password):
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return password_hasher.check(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """Check whether the password was hashed with an outdated bcrypt cost"""
+        return password_hasher.needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
@@ -36,4 +50,23 @@ class User(db.Model):
             'role': self.role,
             'is_support_agent': self.role == 'support_agent',
             'is_admin': self.role == 'admin'
-        }
\ No newline at end of file
+        }
+    
+    def token_claims(self):
+        """Compact claims embedded in access tokens so services can authorize locally"""
+        return {
+            'email': self.email,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'role': self.role,
+            'is_support_agent': self.role == 'support_agent',
+            'is_admin': self.role == 'admin',
+            'cv': self.claims_version or 1
+        }
+
+@event.listens_for(User, 'before_update')
+def bump_claims_version(mapper, connection, user):
+    """Invalidate the user's tokens when a field their claims depend on changes"""
+    state = inspect(user)
+    if any(state.attrs[field].history.has_changes() for field in CLAIM_FIELDS):
+        user.claims_version = (user.claims_version or 1) + 1
\ No newline at end of file
@@ -1,14 +1,48 @@
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt, decode_token
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError, ExpiredSignatureError
 from datetime import datetime, timedelta
 from email_validator import validate_email, EmailNotValidError
 import os
 
 from ..models.user import db, User
-from ..utils.auth import check_rate_limit, update_login_attempts
+from ..utils.decorators import service_required
+from ..utils.login_limiter import login_limiter
+from ..utils.password_hashing import HasherBusy
+from ..utils.rate_limit import limiter
+from ..utils.user_cache import user_cache
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/v1/auth')
 
+# Claims of the DEBUG_MODE test user's tokens
+DEBUG_USER_CLAIMS = {
+    'email': 'newuser@example.com',
+    'first_name': 'Test',
+    'last_name': 'User',
+    'role': 'user',
+    'is_support_agent': False,
+    'is_admin': False,
+    'cv': 1
+}
+
+def issue_tokens(user, refresh=True):
+    """
+    Create an access token carrying the user's claims (and a refresh token
+    pinned to the same claims version)
+    """
+    tokens = {"access_token": create_access_token(identity=user.id, additional_claims=user.token_claims())}
+    if refresh:
+        tokens["refresh_token"] = create_refresh_token(
+            identity=user.id, additional_claims={'cv': user.claims_version or 1}
+        )
+    return tokens
+
+def claims_are_current(user):
+    """Check that the current token was issued for the user's claims version"""
+    # Tokens issued before claims were versioned count as version 1
+    return get_jwt().get('cv', 1) == (user.claims_version or 1)
+
 @auth_bp.route('/register', methods=['POST'])  # Now becomes /api/v1/auth/register
 def register():
     data = request.get_json()
@@ -81,7 +115,7 @@ def login():
         # Check against test users from memory
         # newuser@example.com with password: password123
         if data['email'] == "newuser@example.com" and data['password'] == "password123":
-            access_token = create_access_token(identity="test_user_id")
+            access_token = create_access_token(identity="test_user_id", additional_claims=DEBUG_USER_CLAIMS)
             refresh_token = create_refresh_token(identity="test_user_id")
             
             return jsonify({
@@ -99,34 +133,35 @@ def login():
         else:
             return jsonify({"error": "Invalid email or password"}), 401
     
+    # Check rate limiting (per account and per client IP, before touching the database)
+    client_ip = request.remote_addr
+    retry_after = login_limiter.check(data['email'], client_ip)
+    if retry_after is not None:
+        response = jsonify({
+            "error": "Too many login attempts. Please try again later.",
+            "retry_after": f"{retry_after} seconds"
+        })
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    
     # Not in DEBUG_MODE - use database
     user = User.query.filter_by(email=data['email']).first()
     
-    if not user or not user.is_active:
-        return jsonify({"error": "Invalid email or password"}), 401
-    
-    # Check rate limiting
-    if not check_rate_limit(user):
-        return jsonify({
-            "error": "Too many login attempts. Please try again later.",
-            "retry_after": "15 minutes"
-        }), 429
-    
-    if not user.check_password(data['password']):
-        update_login_attempts(user, success=False)
-        db.session.commit()
+    if not user or not user.is_active or not user.check_password(data['password']):
+        login_limiter.record_failure(data['email'], client_ip)
         return jsonify({"error": "Invalid email or password"}), 401
     
     # Successful login
-    update_login_attempts(user, success=True)
-    db.session.commit()
-    
-    access_token = create_access_token(identity=user.id)
-    refresh_token = create_refresh_token(identity=user.id)
+    login_limiter.record_success(data['email'], client_ip)
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except HasherBusy:
+            pass  # Keep the old hash; a later login upgrades it
     
     return jsonify({
-        "access_token": access_token,
-        "refresh_token": refresh_token,
+        **issue_tokens(user),
         "user": user.to_dict()
     }), 200
 
@@ -154,12 +189,15 @@ def verify_token():
                     }
                 }), 200
         
-        # Not in DEBUG_MODE - use database
-        user = User.query.get(user_id)
+        # Not in DEBUG_MODE - read through the user cache
+        user = user_cache.get_or_load(user_id)
         
         if not user or not user.is_active:
             return jsonify({"error": "User not found or inactive"}), 401
             
+        if not claims_are_current(user):
+            return jsonify({"error": "Token claims are out of date, please log in again"}), 401
+            
         return jsonify({
             "message": "Token is valid",
             "user": user.to_dict()
@@ -168,6 +206,74 @@ def verify_token():
     except Exception as e:
         return jsonify({"error": str(e)}), 401
 
+@auth_bp.route('/verify/batch', methods=['POST'])  # Now becomes /api/v1/auth/verify/batch
+@limiter.limit(lambda: current_app.config['VERIFY_BATCH_RATE_LIMIT'])
+@service_required
+def verify_tokens_batch():
+    """
+    Verify many access tokens in one call
+    
+    Only for services sending SERVICE_API_KEY in X-Service-Key, since the
+    results carry user details, and limited to VERIFY_BATCH_RATE_LIMIT. Takes
+    {"tokens": [...]} (at most VERIFY_BATCH_MAX_TOKENS). Tokens are decoded
+    in-process and their users loaded with one IN query (through the user
+    cache). Returns one result per token, in order: {"valid": true,
+    "user": {...}} or {"valid": false, "error": "..."}.
+    """
+    data = request.get_json(silent=True) or {}
+    tokens = data.get('tokens')
+    if not isinstance(tokens, list) or not all(isinstance(token, str) for token in tokens):
+        return jsonify({"error": "tokens must be a list of token strings"}), 400
+        
+    max_tokens = current_app.config.get('VERIFY_BATCH_MAX_TOKENS', 500)
+    if len(tokens) > max_tokens:
+        return jsonify({"error": f"At most {max_tokens} tokens can be verified at once"}), 400
+        
+    debug_mode = current_app.config.get('DEBUG_MODE', False)
+    
+    # Decode everything first so the users can be loaded together
+    decoded = []
+    for token in tokens:
+        try:
+            claims = decode_token(token)
+        except ExpiredSignatureError:
+            decoded.append({"valid": False, "error": "Token has expired"})
+            continue
+        except (PyJWTError, JWTExtendedException):
+            decoded.append({"valid": False, "error": "Invalid token"})
+            continue
+        if claims.get('type') != 'access':
+            decoded.append({"valid": False, "error": "Not an access token"})
+            continue
+        decoded.append(claims)
+        
+    user_ids = [claims['sub'] for claims in decoded if 'sub' in claims]
+    users = user_cache.get_many_or_load(user_ids) if user_ids else {}
+    
+    results = []
+    for claims in decoded:
+        if 'sub' not in claims:
+            results.append(claims)
+            continue
+        if debug_mode and claims['sub'] == "test_user_id":
+            results.append({"valid": True, "user": {
+                "id": 1,
+                "email": "newuser@example.com",
+                "first_name": "Test",
+                "last_name": "User",
+                "role": "user"
+            }})
+            continue
+        user = users.get(str(claims['sub']))
+        if not user or not user.is_active:
+            results.append({"valid": False, "error": "User not found or inactive"})
+        elif claims.get('cv', 1) != (user.claims_version or 1):
+            results.append({"valid": False, "error": "Token claims are out of date"})
+        else:
+            results.append({"valid": True, "user": user.to_dict()})
+            
+    return jsonify({"results": results}), 200
+
 @auth_bp.route('/refresh', methods=['POST'])  # Now becomes /api/v1/auth/refresh
 @jwt_required(refresh=True)
 def refresh_token():
@@ -181,23 +287,48 @@ def refresh_token():
         if debug_mode:
             # For test user
             if user_id == "test_user_id":
-                access_token = create_access_token(identity="test_user_id")
+                access_token = create_access_token(identity="test_user_id", additional_claims=DEBUG_USER_CLAIMS)
                 return jsonify({
                     "access_token": access_token,
                     "message": "Token refreshed successfully"
                 }), 200
                 
-        # Not in DEBUG_MODE - use database
-        user = User.query.get(user_id)
+        # Not in DEBUG_MODE - read through the user cache
+        user = user_cache.get_or_load(user_id)
         
         if not user or not user.is_active:
             return jsonify({"error": "User not found or inactive"}), 401
             
-        access_token = create_access_token(identity=user.id)
+        # A role change since login means signing in again
+        if not claims_are_current(user):
+            return jsonify({"error": "Token claims are out of date, please log in again"}), 401
+            
         return jsonify({
-            "access_token": access_token,
+            **issue_tokens(user, refresh=False),
             "user": user.to_dict()
         }), 200
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 401
\ No newline at end of file
+        return jsonify({"error": str(e)}), 401
+
+@auth_bp.route('/users/<int:user_id>/claims', methods=['GET'])  # Now becomes /api/v1/auth/users/<id>/claims
+@service_required
+def current_user_claims(user_id):
+    """
+    The claims a new access token for the user would carry
+    
+    Only for services sending SERVICE_API_KEY in X-Service-Key. Services
+    compare the claims version (cv) of the tokens they accept with this one,
+    so a role change applies before the old tokens expire. Read through the
+    user cache; 404 for users that do not exist or are inactive.
+    """
+    user = user_cache.get_or_load(user_id)
+    if not user or not user.is_active:
+        return jsonify({"error": "User not found or inactive"}), 404
+    return jsonify({"id": user.id, "claims": user.token_claims()}), 200
+
+@auth_bp.route('/user-cache/stats', methods=['GET'])  # Now becomes /api/v1/auth/user-cache/stats
+@service_required
+def user_cache_stats():
+    """Hit/miss counters of this worker's user cache, for monitoring"""
+    return jsonify(user_cache.stats()), 200
\ No newline at end of file
@@ -1,3 +1,4 @@
+import hmac
 from functools import wraps
 from flask import request, jsonify, current_app
 import requests
@@ -13,6 +14,21 @@ def login_required(f):
             return jsonify({"error": "Invalid or missing token"}), 401
     return decorated_function
 
+def has_service_credential():
+    """Check whether the request carries the SERVICE_API_KEY in X-Service-Key"""
+    expected = current_app.config.get('SERVICE_API_KEY')
+    provided = request.headers.get('X-Service-Key', '')
+    return bool(expected) and hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8'))
+
+def service_required(f):
+    """Decorator restricting an endpoint to services holding SERVICE_API_KEY"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not has_service_credential():
+            return jsonify({"error": "Service credential required"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 def verify_auth_service(auth_service_url=None):
     """Decorator that verifies token with auth service"""
     def decorator(f):
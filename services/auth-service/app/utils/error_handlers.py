@@ -1,5 +1,7 @@
 from flask import jsonify
 
+from .password_hashing import HasherBusy
+
 def register_error_handlers(app):
     @app.errorhandler(400)
     def bad_request(error):
@@ -29,6 +31,15 @@ def register_error_handlers(app):
             'message': str(error.description)
         }), 404
 
+    @app.errorhandler(HasherBusy)
+    def hasher_busy(error):
+        response = jsonify({
+            'error': 'Service Unavailable',
+            'message': str(error)
+        })
+        response.headers['Retry-After'] = str(error.retry_after)
+        return response, 503
+
     @app.errorhandler(500)
     def internal_server_error(error):
         return jsonify({
@@ -0,0 +1,208 @@
+"""
+Login rate limiting without database writes.
+
+Failed logins are counted in a sliding window (LOGIN_LIMIT_WINDOW seconds)
+twice, once per account and once per client IP, so guessing against one
+account and spraying many accounts (including ones that do not exist) from one
+address are both limited. A successful login clears the account's failures,
+including its share of the IP's count; other accounts' failures from the same
+IP are kept.
+
+Counters live in a backend chosen with LOGIN_LIMIT_STORAGE_URL (config.py):
+'redis://...' keeps them in Redis or anything speaking its protocol, so every
+gunicorn worker sees the same counts (the production default); 'memory://'
+keeps them in the worker process, for development and tests. Any other URL is
+refused when the app starts rather than quietly counting per process.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Sliding-window counters in this process, for development and tests"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _window(self, key, now, window):
+        """Get a key's (timestamp, tag) events with the ones outside the window dropped"""
+        events = self._windows.get(key)
+        if events is None:
+            return None
+        while events and events[0][0] <= now - window:
+            events.popleft()
+        if not events:
+            del self._windows[key]
+            return None
+        return events
+
+    def hit(self, key, now, window, tag=''):
+        """Record an event and return the number of events in the window"""
+        with self._lock:
+            events = self._window(key, now, window)
+            if events is None:
+                events = self._windows[key] = deque()
+            events.append((now, tag))
+            self._windows.move_to_end(key)
+            while len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+            return len(events)
+
+    def peek(self, key, now, window):
+        """
+        Get the events in the window
+
+        Returns:
+            tuple: (count, timestamp of the oldest event or None)
+        """
+        with self._lock:
+            events = self._window(key, now, window)
+            if events is None:
+                return 0, None
+            return len(events), events[0][0]
+
+    def clear(self, key):
+        with self._lock:
+            self._windows.pop(key, None)
+
+    def discard(self, key, tag):
+        """Drop a key's events recorded with tag"""
+        with self._lock:
+            events = self._windows.get(key)
+            if events is None:
+                return
+            kept = deque(event for event in events if event[1] != tag)
+            if kept:
+                self._windows[key] = kept
+            else:
+                del self._windows[key]
+
+
+class RedisBackend:
+    """Sliding-window counters in Redis sorted sets, shared by every worker"""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+
+    def hit(self, key, now, window, tag=''):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now - window)
+        pipe.zadd(key, {f"{tag}:{now}:{uuid.uuid4().hex}": now})
+        pipe.zcard(key)
+        pipe.expire(key, int(math.ceil(window)))
+        return pipe.execute()[2]
+
+    def peek(self, key, now, window):
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now - window)
+        pipe.zcard(key)
+        pipe.zrange(key, 0, 0, withscores=True)
+        _, count, oldest = pipe.execute()
+        return count, (oldest[0][1] if oldest else None)
+
+    def clear(self, key):
+        self.client.delete(key)
+
+    def discard(self, key, tag):
+        # Windows hold at most a limit's worth of events, so scanning is cheap
+        members = [member for member in self.client.zrange(key, 0, -1)
+                   if member.decode('utf-8').split(':', 1)[0] == tag]
+        if members:
+            self.client.zrem(key, *members)
+
+
+def create_backend(url):
+    """
+    Build the backend for a storage URL
+
+    Returns:
+        MemoryBackend or RedisBackend
+
+    Raises:
+        ValueError: If the URL names no supported storage
+    """
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    if url == 'memory://':
+        return MemoryBackend()
+    raise ValueError(f"Unsupported LOGIN_LIMIT_STORAGE_URL '{url}': use redis://... or memory://")
+
+
+class LoginLimiter:
+    """Failed-login limits per account and per client IP"""
+
+    def __init__(self, backend, max_attempts=5, max_ip_attempts=20, window=900):
+        self.backend = backend
+        self.max_attempts = max_attempts
+        self.max_ip_attempts = max_ip_attempts
+        self.window = window
+
+    def init_app(self, app):
+        """Apply the app's LOGIN_LIMIT_* settings"""
+        url = app.config['LOGIN_LIMIT_STORAGE_URL']
+        self.backend = create_backend(url)
+        self.max_attempts = app.config['LOGIN_LIMIT_ATTEMPTS']
+        self.max_ip_attempts = app.config['LOGIN_LIMIT_IP_ATTEMPTS']
+        self.window = app.config['LOGIN_LIMIT_WINDOW']
+        if isinstance(self.backend, MemoryBackend) and not (app.testing or app.config.get('DEBUG_MODE')):
+            logger.warning("LOGIN_LIMIT_STORAGE_URL is memory://: each worker counts failed logins on its own")
+
+    def _keys(self, email, ip):
+        keys = [(f"login:account:{email.strip().lower()}", self.max_attempts)]
+        if ip:
+            keys.append((f"login:ip:{ip}", self.max_ip_attempts))
+        return keys
+
+    @staticmethod
+    def _tag(email):
+        """Tag for an account's events in IP windows, without storing the email"""
+        return hashlib.sha256(email.strip().lower().encode('utf-8')).hexdigest()[:16]
+
+    def check(self, email, ip):
+        """
+        Check whether a login may be attempted
+
+        Returns:
+            int or None: Seconds until the next attempt is allowed, or None if
+            it is allowed now
+        """
+        now = time.time()
+        retry_after = None
+        for key, limit in self._keys(email, ip):
+            count, oldest = self.backend.peek(key, now, self.window)
+            if count >= limit:
+                wait = max(1, int(math.ceil(oldest + self.window - now)))
+                retry_after = max(retry_after or 0, wait)
+        return retry_after
+
+    def record_failure(self, email, ip):
+        """Count a failed login against the account and the IP"""
+        now = time.time()
+        tag = self._tag(email)
+        for key, _ in self._keys(email, ip):
+            self.backend.hit(key, now, self.window, tag=tag)
+
+    def record_success(self, email, ip=None):
+        """
+        Clear the account's failures, and the IP's failures for this account;
+        the IP's failures for other accounts are kept
+        """
+        keys = self._keys(email, ip)
+        self.backend.clear(keys[0][0])
+        if ip:
+            self.backend.discard(keys[1][0], self._tag(email))
+
+
+# Create a singleton instance; create_app configures it with init_app
+login_limiter = LoginLimiter(MemoryBackend())
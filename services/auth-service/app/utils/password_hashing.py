@@ -0,0 +1,151 @@
+"""
+Password hashing off the request thread.
+
+bcrypt is slow on purpose, and hashing inline lets a burst of logins pin every
+worker on CPU while /verify requests queue behind them. Hashes are computed in
+a process pool instead (PASSWORD_HASH_WORKERS, one process per core by
+default). At most PASSWORD_HASH_QUEUE_SIZE jobs wait for a free process; past
+that, hashing fails fast with HasherBusy, which the app turns into a 503 with a
+Retry-After header, rather than piling up requests.
+
+The bcrypt cost is PASSWORD_HASH_ROUNDS. Hashes made with a different cost
+still verify, and login re-hashes them with the current one. The settings are
+read from config.py by create_app.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+logger = logging.getLogger(__name__)
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated; retry after retry_after seconds"""
+
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+        super().__init__("Too many password checks in progress, please try again shortly")
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_rounds(password_hash):
+    """
+    Get the cost a bcrypt hash was made with
+
+    Returns:
+        int or None: The cost, or None if the hash is not a bcrypt hash
+    """
+    try:
+        return int(password_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing in a bounded process pool.
+
+    The pool is created on first use in each process, so gunicorn workers
+    forked from a preloaded app each get their own. With workers=0 hashing
+    runs inline, e.g. for CLI commands and tests.
+    """
+
+    def __init__(self, rounds=12, workers=None, queue_size=None, timeout=10, retry_after=1):
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self.configure(rounds, workers, queue_size, timeout, retry_after)
+
+    def configure(self, rounds=12, workers=None, queue_size=None, timeout=10, retry_after=1):
+        """Set the cost and pool limits; a running pool is replaced on next use"""
+        self.rounds = rounds
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.queue_size = self.workers * 2 if queue_size is None else queue_size
+        self.timeout = timeout
+        self.retry_after = retry_after
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    def init_app(self, app):
+        """Apply the app's PASSWORD_HASH_* settings"""
+        self.configure(
+            rounds=app.config['PASSWORD_HASH_ROUNDS'],
+            workers=app.config['PASSWORD_HASH_WORKERS'],
+            queue_size=app.config['PASSWORD_HASH_QUEUE_SIZE'],
+            timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+            retry_after=app.config['PASSWORD_HASH_RETRY_AFTER']
+        )
+
+    def _pool(self):
+        """Get this process's executor and job slots, creating them if needed"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                self._pid = os.getpid()
+            return self._executor, self._slots
+
+    def _discard_pool(self, executor):
+        """Drop a pool one of whose processes died; the next call starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            self.rejected += 1
+            raise HasherBusy(self.retry_after)
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            slots.release()
+            self._discard_pool(executor)
+            raise HasherBusy(self.retry_after)
+        # The slot is held until the job finishes, even if the caller gave up
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            logger.warning(f"Password hashing took longer than {self.timeout}s")
+            raise HasherBusy(self.retry_after)
+        except BrokenProcessPool:
+            # A pool process died while this job was queued or running
+            logger.error("Password hashing pool broke; starting a new one")
+            self._discard_pool(executor)
+            raise HasherBusy(self.retry_after)
+
+    def hash(self, password):
+        """Hash a password with the current cost"""
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, password, password_hash):
+        """Check a password against a bcrypt hash"""
+        return self._run(_check_password, password, password_hash)
+
+    def needs_rehash(self, password_hash):
+        """Check whether a hash was made with a different cost than the current one"""
+        return hash_rounds(password_hash) != self.rounds
+
+
+# Create a singleton instance; create_app configures it with init_app
+password_hasher = PasswordHasher()
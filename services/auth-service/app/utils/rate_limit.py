@@ -0,0 +1,9 @@
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+
+# Create a singleton instance; create_app binds it with init_app so routes
+# can declare their own limits with @limiter.limit
+limiter = Limiter(
+    key_func=get_remote_address,
+    default_limits=["200 per day", "50 per hour"]
+)
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..models.user import User
+
+
+class CachedUser:
+    """
+    Read-only snapshot of the User fields /verify and /refresh need
+
+    Quacks like User for to_dict(), token_claims() and the attributes the
+    routes check, without holding on to a session-bound instance.
+    """
+
+    __slots__ = ('id', 'is_active', 'claims_version', '_data', '_claims')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.is_active = user.is_active
+        self.claims_version = user.claims_version
+        self._data = user.to_dict()
+        self._claims = user.token_claims()
+
+    def to_dict(self):
+        return dict(self._data)
+
+    def token_claims(self):
+        return dict(self._claims)
+
+
+class UserCache:
+    """
+    In-process LRU of user records keyed by user ID.
+
+    Entries expire after a short TTL and are dropped as soon as this process
+    updates or deletes the user. The cache is per worker process, so the TTL
+    bounds how stale a record can be in workers that did not see the write.
+    """
+
+    def __init__(self, ttl=30, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        """
+        Get a cached user
+
+        Returns:
+            CachedUser or None: Cached user, or None if missing or expired
+        """
+        key = str(user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, user):
+        """Cache a user, evicting the least recently used entry when full"""
+        cached = CachedUser(user)
+        with self._lock:
+            self._entries[str(user.id)] = (time.monotonic() + self.ttl, cached)
+            self._entries.move_to_end(str(user.id))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return cached
+
+    def get_or_load(self, user_id):
+        """
+        Get a user from the cache or the database
+
+        Returns:
+            CachedUser or None: The user, or None if it does not exist
+        """
+        cached = self.get(user_id)
+        if cached is not None:
+            return cached
+        user = User.query.get(user_id)
+        return self.set(user) if user is not None else None
+
+    def get_many_or_load(self, user_ids):
+        """
+        Get many users, loading the ones not cached with a single IN query
+
+        Returns:
+            dict: User ID (as a string) -> CachedUser, for the users that exist
+        """
+        found = {}
+        missing = []
+        for user_id in dict.fromkeys(str(user_id) for user_id in user_ids):
+            cached = self.get(user_id)
+            if cached is not None:
+                found[user_id] = cached
+            else:
+                missing.append(user_id)
+        numeric = [int(user_id) for user_id in missing if user_id.isdigit()]
+        if numeric:
+            for user in User.query.filter(User.id.in_(numeric)).all():
+                found[str(user.id)] = self.set(user)
+        return found
+
+    def invalidate(self, user_id=None):
+        """Drop one user, or every user if none is given"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            elif self._entries.pop(str(user_id), None) is None:
+                return
+            self.invalidations += 1
+
+    def stats(self):
+        """Hit/miss counters and size, for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+# Create a singleton instance
+user_cache = UserCache(
+    ttl=int(os.environ.get('USER_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('USER_CACHE_MAX_ENTRIES', '10000'))
+)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, user):
+    """Forget a user whose role, status or profile was just written"""
+    user_cache.invalidate(user.id)
+    # Again after commit, in case another request cached the old row meanwhile
+    session = inspect(user).session
+    if session is not None:
+        session.info.setdefault('user_cache_invalidate', set()).add(user.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_users(session):
+    for user_id in session.info.pop('user_cache_invalidate', ()):
+        user_cache.invalidate(user_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_users(session):
+    session.info.pop('user_cache_invalidate', None)
@@ -39,9 +39,14 @@ class Config:
             }
         }
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your_super_secret_jwt_key')
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # Services authorize with the claims in access tokens until they expire,
+    # so this is also how long a role change can take to reach them
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', '60')))
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Maximum number of tokens accepted by POST /auth/verify/batch
+    VERIFY_BATCH_MAX_TOKENS = int(os.environ.get('VERIFY_BATCH_MAX_TOKENS', '500'))
+    
     # CORS settings
     CORS_ORIGINS = [
         'http://localhost:5000',  # Main application
@@ -54,6 +59,36 @@ class Config:
     # Rate limiting
     RATELIMIT_DEFAULT = "200 per day"
     RATELIMIT_STORAGE_URL = "memory://"  # Use Redis in production
+    RATELIMIT_STORAGE_URI = RATELIMIT_STORAGE_URL  # The name Flask-Limiter 2.x reads
+    # Number of trusted proxies (the API gateway) in front of the service;
+    # their X-Forwarded-For entries are used as the client address. 0 trusts none
+    PROXY_FIX_HOPS = int(os.environ.get('PROXY_FIX_HOPS', '1'))
+    # Limit on POST /auth/verify/batch per calling address
+    VERIFY_BATCH_RATE_LIMIT = os.environ.get('VERIFY_BATCH_RATE_LIMIT', '120 per minute')
+    
+    # Password hashing (app/utils/password_hashing.py): bcrypt cost, hashing
+    # processes per worker (unset: one per core, 0: inline), jobs that may wait
+    # for one (unset: twice the processes), and the Retry-After of the 503
+    # answered when they are all taken or a hash takes longer than the timeout
+    PASSWORD_HASH_ROUNDS = int(os.environ.get('PASSWORD_HASH_ROUNDS', '12'))
+    PASSWORD_HASH_WORKERS = int(os.environ['PASSWORD_HASH_WORKERS']) if os.environ.get('PASSWORD_HASH_WORKERS') else None
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ['PASSWORD_HASH_QUEUE_SIZE']) if os.environ.get('PASSWORD_HASH_QUEUE_SIZE') else None
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+    PASSWORD_HASH_RETRY_AFTER = int(os.environ.get('PASSWORD_HASH_RETRY_AFTER', '1'))
+    
+    # Failed-login limits (app/utils/login_limiter.py). The counters have to be
+    # shared by every gunicorn worker, so outside DEBUG_MODE they default to
+    # Redis; memory:// counts per process
+    LOGIN_LIMIT_STORAGE_URL = os.environ.get(
+        'LOGIN_LIMIT_STORAGE_URL', 'memory://' if DEBUG_MODE else 'redis://localhost:6379/0'
+    )
+    LOGIN_LIMIT_ATTEMPTS = int(os.environ.get('LOGIN_LIMIT_ATTEMPTS', '5'))
+    LOGIN_LIMIT_IP_ATTEMPTS = int(os.environ.get('LOGIN_LIMIT_IP_ATTEMPTS', '20'))
+    LOGIN_LIMIT_WINDOW = int(os.environ.get('LOGIN_LIMIT_WINDOW', '900'))
+    
+    # Shared secret other services send in X-Service-Key for service-only
+    # endpoints (batch verify, cache stats); unset rejects every such call
+    SERVICE_API_KEY = os.environ.get('SERVICE_API_KEY')
     
     # Service URLs
     CART_SERVICE_URL = os.environ.get('CART_SERVICE_URL', 'http://localhost:5001')
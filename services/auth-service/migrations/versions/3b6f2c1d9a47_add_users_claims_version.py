@@ -0,0 +1,42 @@
+"""add users.claims_version
+
+Revision ID: 3b6f2c1d9a47
+Revises:
+Create Date: 2026-10-17 10:12:05.412093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b6f2c1d9a47'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _user_columns():
+    """Get the users table's column names, or None if db.create_all has not created it yet"""
+    inspector = sa.inspect(op.get_bind())
+    if 'users' not in inspector.get_table_names():
+        return None
+    return {column['name'] for column in inspector.get_columns('users')}
+
+
+def upgrade():
+    # The tables are created by db.create_all, which adds the column itself on
+    # new databases; only existing users tables need it added
+    columns = _user_columns()
+    if columns is None or 'claims_version' in columns:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.add_column(sa.Column('claims_version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    columns = _user_columns()
+    if columns is None or 'claims_version' not in columns:
+        return
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.drop_column('claims_version')
@@ -0,0 +1,219 @@
+import os
+import pytest
+from flask_jwt_extended import decode_token
+from app import create_app
+from app.models.user import db, User
+from app.utils.login_limiter import LoginLimiter, MemoryBackend, create_backend, login_limiter
+from app.utils.password_hashing import HasherBusy, PasswordHasher, password_hasher
+from app.utils.user_cache import user_cache
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    DEBUG_MODE = False
+    SERVICE_API_KEY = 'service-key'
+    # Flask-Limiter's default limits would trip across tests
+    RATELIMIT_ENABLED = False
+    # Fresh in-process login counters for every app
+    LOGIN_LIMIT_STORAGE_URL = 'memory://'
+    # Hash inline and cheaply
+    PASSWORD_HASH_WORKERS = 0
+    PASSWORD_HASH_ROUNDS = 4
+
+
+@pytest.fixture
+def app():
+    # Every test starts without cached users (IDs restart with each database)
+    user_cache.invalidate()
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        user = User(email='user@example.com', first_name='Test', last_name='User')
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+
+def login(client, email, password, ip='203.0.113.1'):
+    return client.post('/auth/login', json={'email': email, 'password': password},
+                       headers={'X-Forwarded-For': ip})
+
+
+def bearer(token):
+    return {'Authorization': f'Bearer {token}'}
+
+
+def test_login_limiter_locks_out_and_success_forgives_only_the_account():
+    limiter = LoginLimiter(MemoryBackend(), max_attempts=3, max_ip_attempts=4, window=60)
+    for _ in range(2):
+        limiter.record_failure('a@example.com', '10.0.0.1')
+        limiter.record_failure('b@example.com', '10.0.0.1')
+    # Four failures from the address lock it for every account
+    assert limiter.check('c@example.com', '10.0.0.1') is not None
+    assert limiter.check('c@example.com', '10.0.0.2') is None
+
+    # a's success removes a's failures, from the account and the address;
+    # b's failures from the address still count
+    limiter.record_success('A@example.com ', '10.0.0.1')
+    assert limiter.check('c@example.com', '10.0.0.1') is None
+    limiter.record_failure('b@example.com', '10.0.0.1')
+    assert limiter.check('b@example.com', '10.0.0.2') is not None
+    limiter.record_failure('b@example.com', '10.0.0.1')
+    assert limiter.check('c@example.com', '10.0.0.1') is not None
+
+
+def test_login_limits_are_configured_by_the_app():
+    class StrictConfig(TestConfig):
+        LOGIN_LIMIT_ATTEMPTS = 2
+        LOGIN_LIMIT_WINDOW = 60
+    create_app(StrictConfig)
+    assert (login_limiter.max_attempts, login_limiter.window) == (2, 60)
+    assert isinstance(login_limiter.backend, MemoryBackend)
+
+    # Storage that can not be shared is refused instead of counting per process
+    with pytest.raises(ValueError):
+        create_backend('memcached://localhost:11211')
+
+
+def test_login_is_limited_per_account_and_forwarded_client(app, client):
+    for _ in range(login_limiter.max_attempts):
+        assert login(client, 'user@example.com', 'wrong').status_code == 401
+    locked = login(client, 'user@example.com', 'password123', ip='203.0.113.9')
+    assert locked.status_code == 429
+    assert int(locked.headers['Retry-After']) > 0
+
+    # Spraying accounts from one client locks that client, not the others
+    # behind the same gateway
+    for i in range(login_limiter.max_ip_attempts):
+        login(client, f'spray{i}@example.com', 'wrong', ip='203.0.113.2')
+    assert login(client, 'nobody@example.com', 'wrong', ip='203.0.113.2').status_code == 429
+    assert login(client, 'nobody@example.com', 'wrong', ip='203.0.113.3').status_code == 401
+
+
+def test_successful_login_resets_the_account(app, client):
+    for _ in range(login_limiter.max_attempts - 1):
+        login(client, 'user@example.com', 'wrong')
+    assert login(client, 'user@example.com', 'password123').status_code == 200
+    for _ in range(login_limiter.max_attempts - 1):
+        assert login(client, 'user@example.com', 'wrong').status_code == 401
+    assert login(client, 'user@example.com', 'password123').status_code == 200
+
+
+def test_claim_changes_invalidate_issued_tokens(app, client):
+    tokens = login(client, 'user@example.com', 'password123').get_json()
+    with app.app_context():
+        claims = decode_token(tokens['access_token'])
+    assert (claims['email'], claims['role'], claims['cv']) == ('user@example.com', 'user', 1)
+    assert client.get('/auth/verify', headers=bearer(tokens['access_token'])).status_code == 200
+
+    with app.app_context():
+        user = User.query.filter_by(email='user@example.com').first()
+        user.role = 'admin'
+        db.session.commit()
+        assert user.claims_version == 2
+    assert client.get('/auth/verify', headers=bearer(tokens['access_token'])).status_code == 401
+    assert client.post('/auth/refresh', headers=bearer(tokens['refresh_token'])).status_code == 401
+
+    # Logging in again issues tokens for the new claims
+    access_token = login(client, 'user@example.com', 'password123').get_json()['access_token']
+    response = client.get('/auth/verify', headers=bearer(access_token))
+    assert response.status_code == 200
+    assert response.get_json()['user']['role'] == 'admin'
+
+
+def test_verify_reads_users_through_the_cache(app, client):
+    access_token = login(client, 'user@example.com', 'password123').get_json()['access_token']
+    assert client.get('/auth/user-cache/stats').status_code == 403
+    stats = lambda: client.get('/auth/user-cache/stats', headers={'X-Service-Key': 'service-key'}).get_json()
+
+    before = stats()
+    assert client.get('/auth/verify', headers=bearer(access_token)).status_code == 200
+    assert client.get('/auth/verify', headers=bearer(access_token)).status_code == 200
+    after = stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+    # Writing the user drops the entry, so a deactivation applies immediately
+    with app.app_context():
+        User.query.filter_by(email='user@example.com').first().is_active = False
+        db.session.commit()
+    assert client.get('/auth/verify', headers=bearer(access_token)).status_code == 401
+    assert stats()['invalidations'] > after['invalidations']
+
+
+def test_services_read_users_current_claims(app, client):
+    with app.app_context():
+        user_id = User.query.filter_by(email='user@example.com').first().id
+    url = f'/auth/users/{user_id}/claims'
+    service = {'X-Service-Key': 'service-key'}
+    assert client.get(url).status_code == 403
+    assert client.get(url, headers=service).get_json()['claims']['cv'] == 1
+
+    # Services compare the version with the one in the tokens they accept
+    with app.app_context():
+        User.query.get(user_id).role = 'admin'
+        db.session.commit()
+    claims = client.get(url, headers=service).get_json()['claims']
+    assert (claims['role'], claims['is_admin'], claims['cv']) == ('admin', True, 2)
+
+    with app.app_context():
+        User.query.get(user_id).is_active = False
+        db.session.commit()
+    assert client.get(url, headers=service).status_code == 404
+
+
+def test_batch_verify_checks_each_token_for_services_only(app, client):
+    tokens = login(client, 'user@example.com', 'password123').get_json()
+    batch = [tokens['access_token'], 'not-a-token', tokens['refresh_token']]
+    assert client.post('/auth/verify/batch', json={'tokens': batch}).status_code == 403
+
+    service = {'X-Service-Key': 'service-key'}
+    response = client.post('/auth/verify/batch', json={'tokens': batch}, headers=service)
+    assert response.status_code == 200
+    results = response.get_json()['results']
+    assert results[0]['valid'] and results[0]['user']['email'] == 'user@example.com'
+    assert results[1] == {'valid': False, 'error': 'Invalid token'}
+    assert results[2] == {'valid': False, 'error': 'Not an access token'}
+
+    too_many = [tokens['access_token']] * (app.config['VERIFY_BATCH_MAX_TOKENS'] + 1)
+    assert client.post('/auth/verify/batch', json={'tokens': too_many}, headers=service).status_code == 400
+
+
+def test_saturated_hashing_pool_fails_fast(app, client, monkeypatch):
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=0, retry_after=2)
+    _, slots = hasher._pool()
+    slots.acquire()
+    with pytest.raises(HasherBusy):
+        hasher.hash('password123')
+    assert hasher.rejected == 1
+    slots.release()
+    hasher._executor.shutdown()
+
+    # A pool whose process died answers busy once, then is replaced
+    hasher = PasswordHasher(rounds=4, workers=1, queue_size=1, retry_after=2)
+    broken, _ = hasher._pool()
+    with pytest.raises(HasherBusy):
+        hasher._run(os._exit, 1)
+    assert hasher._executor is None
+    assert hasher.check('password123', hasher.hash('password123'))
+    assert hasher._executor is not broken
+    hasher._executor.shutdown()
+
+    def busy(password, password_hash):
+        raise HasherBusy(2)
+    monkeypatch.setattr(password_hasher, 'check', busy)
+    response = login(client, 'user@example.com', 'password123')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
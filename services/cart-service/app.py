@@ -10,8 +10,12 @@ from error_handlers import register_error_handlers
 from utils.logging_utils import cart_logger as logger
 from utils.user_sync import sync_user_from_auth
 from utils.service_utils import call_service
+from utils.json_provider import install_json_provider
+from utils.sql_instrumentation import install_sql_instrumentation
 
 app = Flask(__name__)
+install_json_provider(app)
+install_sql_instrumentation(app)
 CORS(app)
 load_dotenv()
 
@@ -0,0 +1,32 @@
+import pytest
+from flask import Flask
+from models import db, User
+from utils.user_sync import known_users, sync_user_from_auth
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(TESTING=True, SQLALCHEMY_DATABASE_URI='sqlite://', SQLALCHEMY_TRACK_MODIFICATIONS=False)
+    db.init_app(app)
+    known_users.clear()
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.drop_all()
+    known_users.clear()
+
+
+def test_sync_user_keeps_the_name_when_user_data_has_none(app):
+    assert sync_user_from_auth({'id': 7, 'first_name': 'Jane', 'last_name': 'Doe'})
+    known_users.clear()
+    # Minimal user data, e.g. while the Auth Service is unreachable
+    assert sync_user_from_auth({'id': 7, 'role': 'user'})
+    assert User.query.get(7).username == 'Jane Doe'
+
+    assert sync_user_from_auth({'id': 8, 'role': 'user'})
+    assert User.query.get(8).username == 'Unknown User'
+
+    assert sync_user_from_auth({'id': 7, 'first_name': 'Janet', 'last_name': 'Doe'})
+    db.session.expire_all()
+    assert User.query.get(7).username == 'Janet Doe'
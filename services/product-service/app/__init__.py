@@ -4,6 +4,8 @@ from flask_migrate import Migrate
 from flask_cors import CORS
 from config import Config
 from app.models import db
+from app.shared.utils.json_provider import install_json_provider
+from app.shared.utils.sql_instrumentation import install_sql_instrumentation
 import os
 import logging
 
@@ -14,6 +16,8 @@ logger.setLevel(logging.DEBUG)
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    install_json_provider(app)
+    install_sql_instrumentation(app)
     
     # Configure CORS with allowed origins
     CORS(app, resources={
@@ -34,6 +38,14 @@ def create_app(config_class=Config):
     db.init_app(app)
     Migrate(app, db)
     
+    # Register commands
+    from app.commands import init_search_index, repair_rating_aggregates, import_products_command, process_images, expire_stock_holds
+    app.cli.add_command(init_search_index)
+    app.cli.add_command(repair_rating_aggregates)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(process_images)
+    app.cli.add_command(expire_stock_holds)
+    
     # Register blueprints
     from app.routes import (
         product_routes,
@@ -47,6 +59,24 @@ def create_app(config_class=Config):
     app.register_blueprint(category_routes.bp)
     app.register_blueprint(review_routes.bp)
     
+    # Warm the category directory; a fresh database may not have its tables yet
+    from app.utils.category_directory import category_directory
+    with app.app_context():
+        try:
+            category_directory.load()
+        except Exception as e:
+            logger.warning(f"Category directory not loaded at startup: {str(e)}")
+    
+    # Process queued image uploads/deletions in the background
+    if app.config.get('IMAGE_WORKER_THREAD') and not app.config.get('TESTING'):
+        from app.utils.image_jobs import image_worker
+        image_worker.start(app)
+    
+    # Release expired checkout stock holds in the background
+    if app.config.get('STOCK_HOLD_SWEEPER_THREAD') and not app.config.get('TESTING'):
+        from app.utils.stock import hold_sweeper
+        hold_sweeper.start(app)
+    
     @app.route('/health', methods=['GET'])
     def health_check():
         logger.debug("Health check received")
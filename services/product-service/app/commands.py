@@ -0,0 +1,112 @@
+import json
+import time
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from .models import db, Product
+from .utils.search import ensure_search_index
+from .utils.http_cache import catalog_version
+from .utils.bulk_import import FORMATS, detect_format, iter_rows, import_products
+from .utils.image_jobs import process_pending_jobs
+from .utils.stock import expire_holds
+
+@click.command('init-search-index')
+@with_appcontext
+def init_search_index():
+    """Create (or rebuild) the full-text product search index"""
+    try:
+        with db.engine.begin() as connection:
+            if ensure_search_index(connection, rebuild=True):
+                click.echo("Search index is ready")
+            else:
+                click.echo("Full-text search is not supported on this database")
+    except Exception as e:
+        click.echo(f"Error creating search index: {str(e)}")
+
+@click.command('repair-rating-aggregates')
+@with_appcontext
+def repair_rating_aggregates():
+    """Recompute every product's rating aggregates from its reviews"""
+    try:
+        reviewed = Product.rebuild_rating_aggregates()
+        catalog_version.bump()
+        db.session.commit()
+        click.echo(f"Rating aggregates rebuilt ({reviewed} products with reviews)")
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f"Error rebuilding rating aggregates: {str(e)}")
+
+@click.command('import-products')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help="Feed format (detected from the file name by default)")
+@click.option('--batch-size', type=int, default=None, help="Rows validated and written per transaction")
+@click.option('--report', 'report_path', type=click.Path(dir_okay=False), help="Write the full JSON report to this file")
+@with_appcontext
+def import_products_command(path, fmt, batch_size, report_path):
+    """Bulk create or update products from a CSV or NDJSON feed, upserting by SKU"""
+    fmt = fmt or detect_format(path)
+    if fmt is None:
+        click.echo("Could not detect the feed format, pass --format csv or --format ndjson")
+        return
+    batch_size = batch_size or current_app.config.get('IMPORT_BATCH_SIZE', 1000)
+    try:
+        with open(path, 'rb') as feed:
+            report = import_products(iter_rows(feed, fmt), batch_size=batch_size)
+    except Exception as e:
+        db.session.rollback()
+        click.echo(f"Error importing products: {str(e)}")
+        return
+
+    click.echo(f"Imported {report.processed} rows: {report.created} created, "
+               f"{report.updated} updated, {report.failed} failed")
+    for error in report.errors[:20]:
+        click.echo(f"  row {error['row']} (sku {error['sku']}): {error['error']}")
+    if report.failed > 20 and not report_path:
+        click.echo("  ... use --report to write every error to a file")
+    if report_path:
+        with open(report_path, 'w') as report_file:
+            json.dump(report.to_dict(), report_file, indent=2)
+        click.echo(f"Report written to {report_path}")
+
+@click.command('process-images')
+@click.option('--once', is_flag=True, help="Process the jobs that are due and exit")
+@click.option('--interval', type=float, default=None, help="Seconds between polls")
+@with_appcontext
+def process_images(once, interval):
+    """Upload and delete product images queued by product writes"""
+    interval = interval or current_app.config.get('IMAGE_WORKER_POLL_INTERVAL', 5)
+    while True:
+        try:
+            processed = process_pending_jobs()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Error processing image jobs: {str(e)}")
+            processed = 0
+        if processed:
+            click.echo(f"Processed {processed} image jobs")
+            continue
+        if once:
+            return
+        time.sleep(interval)
+
+@click.command('expire-stock-holds')
+@click.option('--once', is_flag=True, help="Release the holds that have expired and exit")
+@click.option('--interval', type=float, default=None, help="Seconds between sweeps")
+@with_appcontext
+def expire_stock_holds(once, interval):
+    """Release checkout stock holds that have expired"""
+    interval = interval or current_app.config.get('STOCK_HOLD_SWEEP_INTERVAL', 5)
+    batch_size = current_app.config.get('STOCK_HOLD_SWEEP_BATCH', 500)
+    while True:
+        try:
+            released = expire_holds(batch_size)
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"Error releasing stock holds: {str(e)}")
+            released = 0
+        if released:
+            click.echo(f"Released {released} expired stock holds")
+            continue
+        if once:
+            return
+        time.sleep(interval)
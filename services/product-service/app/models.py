@@ -1,10 +1,16 @@
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+from sqlalchemy import func, case, event, DDL
 from sqlalchemy.ext.hybrid import hybrid_property
+from .utils.category_directory import category_directory
 
 db = SQLAlchemy()
 
+
+def _isoformat(value):
+    """Serialize an optional datetime"""
+    return value.isoformat() if value else None
+
 class Category(db.Model):
     """Category model for organizing products"""
     id = db.Column(db.Integer, primary_key=True)
@@ -27,6 +33,31 @@ class Category(db.Model):
         }
 
 
+# Fields of Product.to_dict(): name -> (columns the field reads, value getter).
+# Listing a subset serializes only those fields and lets queries load only
+# their columns; none of them touch a relationship.
+PRODUCT_FIELDS = {
+    'id': (('id',), lambda product: product.id),
+    'name': (('name',), lambda product: product.name),
+    'description': (('description',), lambda product: product.description),
+    'price': (('price',), lambda product: float(product.price)),
+    'category_id': (('category_id',), lambda product: product.category_id),
+    'category_name': (('category_id',), lambda product: category_directory.name_for(product.category_id)),
+    'stock_quantity': (('stock_quantity',), lambda product: product.stock_quantity),
+    'sku': (('sku',), lambda product: product.sku),
+    'image_url': (('image_url',), lambda product: product.image_url),
+    'image_status': (('image_status',), lambda product: product.image_status),
+    'average_rating': (('rating_average',), lambda product: product.average_rating),
+    'reviews_count': (('review_count',), lambda product: product.review_count or 0),
+    'rating_histogram': (
+        tuple(f'rating_{stars}_count' for stars in range(1, 6)),
+        lambda product: product.rating_histogram
+    ),
+    'created_at': (('created_at',), lambda product: _isoformat(product.created_at)),
+    'updated_at': (('updated_at',), lambda product: _isoformat(product.updated_at)),
+}
+
+
 class Product(db.Model):
     """Product model for the e-commerce platform"""
     id = db.Column(db.Integer, primary_key=True)
@@ -35,47 +66,161 @@ class Product(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
     stock_quantity = db.Column(db.Integer, default=0)
+    # Units held by active checkout holds (see StockHold); available stock is
+    # stock_quantity - held_quantity
+    held_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     sku = db.Column(db.String(50), unique=True)
     image_url = db.Column(db.String(255))
+    # Storage ID of image_url, and 'pending'/'failed' while a new upload is
+    # processed in the background (None once the image is ready)
+    image_public_id = db.Column(db.String(255))
+    image_status = db.Column(db.String(20))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Review aggregates, maintained by adjust_rating_aggregates in the same
+    # transaction as every review write (repair with `flask repair-rating-aggregates`)
+    review_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_average = db.Column(db.Float, nullable=False, default=0, server_default='0')
+    rating_1_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relationships
     reviews = db.relationship('Review', backref='product', lazy=True, cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Composite indexes backing keyset pagination for the price, name and rating sorts
+        db.Index('ix_product_price_id', 'price', 'id'),
+        db.Index('ix_product_name_id', 'name', 'id'),
+        db.Index('ix_product_rating_average_id', 'rating_average', 'id'),
+        # Incremental catalog exports (updated_since)
+        db.Index('ix_product_updated_at_id', 'updated_at', 'id'),
+    )
+    
     @hybrid_property
     def average_rating(self):
-        """Calculate the average rating for this product"""
-        if not self.reviews:
-            return 0
-        return sum(review.rating for review in self.reviews) / len(self.reviews)
+        """Average rating for this product, read from the stored aggregate"""
+        return self.rating_average or 0
     
     @average_rating.expression
     def average_rating(cls):
         """SQLAlchemy expression for average rating"""
-        return (
-            db.select([func.avg(Review.rating)])
-            .where(Review.product_id == cls.id)
-            .label("average_rating")
-        )
+        return cls.rating_average
     
-    def to_dict(self):
-        """Convert product to dictionary representation"""
+    @property
+    def rating_histogram(self):
+        """Number of reviews per star rating"""
         return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price),
-            'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'stock_quantity': self.stock_quantity,
-            'sku': self.sku,
-            'image_url': self.image_url,
-            'average_rating': self.average_rating,
-            'reviews_count': len(self.reviews),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            str(stars): getattr(self, f'rating_{stars}_count') or 0
+            for stars in range(1, 6)
+        }
+    
+    @staticmethod
+    def adjust_rating_aggregates(product_id, added=None, removed=None):
+        """
+        Apply a review change to a product's rating aggregates
+        
+        Issues a single UPDATE with relative increments, so concurrent review
+        writes cannot lose each other's changes. Call it in the same transaction
+        as the review write and commit them together.
+        
+        Args:
+            product_id: ID of the product the review belongs to
+            added: Rating of a review being added (or the new rating on update)
+            removed: Rating of a review being removed (or the old rating on update)
+        """
+        added = int(added) if added is not None else None
+        removed = int(removed) if removed is not None else None
+        count_delta = (1 if added is not None else 0) - (1 if removed is not None else 0)
+        sum_delta = (added or 0) - (removed or 0)
+        
+        new_count = Product.review_count + count_delta
+        new_sum = Product.rating_sum + sum_delta
+        values = {
+            Product.review_count: new_count,
+            Product.rating_sum: new_sum,
+            Product.rating_average: case(
+                (new_count > 0, new_sum * 1.0 / new_count),
+                else_=0
+            )
         }
+        if added != removed:
+            if added is not None:
+                column = getattr(Product, f'rating_{added}_count')
+                values[column] = column + 1
+            if removed is not None:
+                column = getattr(Product, f'rating_{removed}_count')
+                values[column] = column - 1
+                
+        db.session.query(Product).filter(Product.id == product_id).update(
+            values, synchronize_session=False
+        )
+    
+    @staticmethod
+    def rebuild_rating_aggregates():
+        """
+        Recompute every product's rating aggregates from the review table
+        
+        Returns:
+            int: Number of products that have reviews
+        """
+        stars = [func.sum(case((Review.rating == n, 1), else_=0)) for n in range(1, 6)]
+        rows = db.session.query(
+            Review.product_id, func.count(Review.id), func.sum(Review.rating), *stars
+        ).group_by(Review.product_id).all()
+        
+        # Reset everything, then write the grouped totals in bulk
+        db.session.query(Product).update({
+            Product.review_count: 0,
+            Product.rating_sum: 0,
+            Product.rating_average: 0,
+            Product.rating_1_count: 0,
+            Product.rating_2_count: 0,
+            Product.rating_3_count: 0,
+            Product.rating_4_count: 0,
+            Product.rating_5_count: 0,
+        }, synchronize_session=False)
+        
+        mappings = []
+        for product_id, count, total, *histogram in rows:
+            mapping = {
+                'id': product_id,
+                'review_count': count,
+                'rating_sum': total,
+                'rating_average': total / count if count else 0,
+            }
+            for n, value in enumerate(histogram, start=1):
+                mapping[f'rating_{n}_count'] = value
+            mappings.append(mapping)
+        db.session.bulk_update_mappings(Product, mappings)
+        
+        return len(mappings)
+    
+    def to_dict(self, fields=None):
+        """
+        Convert product to dictionary representation
+        
+        Args:
+            fields: Names of the PRODUCT_FIELDS to include (all if None)
+        """
+        return {name: PRODUCT_FIELDS[name][1](self) for name in (fields or PRODUCT_FIELDS)}
+
+
+# Fields of Review.to_dict(), in the same shape as PRODUCT_FIELDS
+REVIEW_FIELDS = {
+    'id': (('id',), lambda review: review.id),
+    'product_id': (('product_id',), lambda review: review.product_id),
+    'user_id': (('user_id',), lambda review: review.user_id),
+    'user_name': (('user_name',), lambda review: review.user_name),
+    'rating': (('rating',), lambda review: review.rating),
+    'comment': (('comment',), lambda review: review.comment),
+    'created_at': (('created_at',), lambda review: _isoformat(review.created_at)),
+    'updated_at': (('updated_at',), lambda review: _isoformat(review.updated_at)),
+}
 
 
 class Review(db.Model):
@@ -91,17 +236,111 @@ class Review(db.Model):
     
     __table_args__ = (
         db.CheckConstraint('rating >= 1 AND rating <= 5', name='valid_rating_range'),
+        # A product's reviews by date: newest-first pages, cursors and since polling
+        db.Index('ix_review_product_id_created_at_id', 'product_id', 'created_at', 'id'),
+    )
+    
+    def to_dict(self, fields=None):
+        """
+        Convert review to dictionary representation
+        
+        Args:
+            fields: Names of the REVIEW_FIELDS to include (all if None)
+        """
+        return {name: REVIEW_FIELDS[name][1](self) for name in (fields or REVIEW_FIELDS)}
+
+
+class ProductImageJob(db.Model):
+    """Background image upload or deletion, processed by the image worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    # Not a foreign key: deletions of a removed product's image outlive the product
+    product_id = db.Column(db.Integer, nullable=True)
+    action = db.Column(db.String(10), nullable=False)  # 'upload' or 'delete'
+    spool_path = db.Column(db.String(512))
+    public_id = db.Column(db.String(255))
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # The worker polls for due jobs by status and next attempt time
+        db.Index('ix_product_image_job_status_next_attempt', 'status', 'next_attempt_at'),
     )
     
     def to_dict(self):
-        """Convert review to dictionary representation"""
+        """Convert image job to dictionary representation"""
         return {
             'id': self.id,
             'product_id': self.product_id,
-            'user_id': self.user_id,
-            'user_name': self.user_name,
-            'rating': self.rating,
-            'comment': self.comment,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'action': self.action,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': _isoformat(self.next_attempt_at),
+            'last_error': self.last_error,
+            'created_at': _isoformat(self.created_at),
+            'updated_at': _isoformat(self.updated_at)
         }
+
+
+class StockReservation(db.Model):
+    """
+    One product line of stock taken by POST /stock/reserve
+    
+    Kept until the reservation is released, so only stock that was actually
+    reserved can be given back, and only once.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    reference = db.Column(db.String(64), nullable=False)
+    # Not a foreign key: reservations outlive deleted products
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.UniqueConstraint('reference', 'product_id', name='uq_stock_reservation_reference_product'),
+    )
+
+
+class StockHold(db.Model):
+    """
+    One product line of a checkout stock hold
+    
+    Rows only exist while the hold is active: confirming, releasing or expiring
+    a hold deletes its rows and moves their quantity out of the product's
+    held_quantity in the same transaction.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    hold_id = db.Column(db.String(36), nullable=False)
+    # User who placed the hold; only they can confirm or release it
+    owner_id = db.Column(db.String(36), nullable=False)
+    # Not a foreign key: holds on a deleted product simply expire
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_stock_hold_hold_id', 'hold_id'),
+        # Counting a user's held units for the per-user limit
+        db.Index('ix_stock_hold_owner_id', 'owner_id'),
+        # The sweeper reads the oldest expired holds first
+        db.Index('ix_stock_hold_expires_at', 'expires_at'),
+    )
+
+
+class CatalogVersion(db.Model):
+    """Single-row counter bumped by every catalog write, used to build ETags"""
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+
+# Seed the counter row whenever db.create_all() creates the table
+event.listen(
+    CatalogVersion.__table__,
+    'after_create',
+    DDL("INSERT INTO catalog_version (id, version) VALUES (1, 1)")
+)
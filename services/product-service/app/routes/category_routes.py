@@ -4,12 +4,19 @@ from ..auth.middleware import auth_required
 from ..utils.validators import validate_category_data
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from app.shared.utils.pagination import PaginationHelper
+from app.shared.utils.count_cache import count_cache
+from ..utils.serialization import CATEGORY_PLAN
+from ..utils.query_budget import query_budget
+from ..utils.http_cache import conditional_get, catalog_version
+from ..utils.category_directory import category_directory
 import logging
 
 bp = Blueprint('category', __name__, url_prefix='/api/categories')
 logger = logging.getLogger(__name__)
 
 @bp.route('', methods=['GET'])
+@conditional_get
+@query_budget(2)
 def get_all_categories():
     """Get all categories with pagination"""
     logger.info("Getting all categories")
@@ -90,16 +97,35 @@ def get_all_categories():
     try:
         # Get pagination parameters
         page, per_page = PaginationHelper.get_pagination_params()
+        cursor = PaginationHelper.get_cursor_param()
+        
+        # Clients that send a cursor get keyset pagination instead of page/offset
+        if cursor is not None:
+            try:
+                result = PaginationHelper.paginate_cursor(
+                    Category.query, Category, per_page, cursor,
+                    Category.name, Category.id, plan=CATEGORY_PLAN
+                )
+            except ValueError as e:
+                logger.warning(f"Invalid cursor in get_all_categories: {str(e)}")
+                return jsonify({"error": "Invalid cursor", "message": str(e)}), 400
+            return jsonify(result), 200
         
         # Use shared pagination helper
         query = Category.query.order_by(Category.name.asc())
-        result = PaginationHelper.paginate_query(query, Category, page, per_page)
+        result = PaginationHelper.paginate_query(
+            query, Category, page, per_page,
+            count_strategy=PaginationHelper.get_count_strategy(), count_key=('categories', ()),
+            plan=CATEGORY_PLAN
+        )
         return jsonify(result), 200
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_all_categories: {str(e)}")
         return jsonify({"error": "Database error", "message": str(e)}), 500
 
 @bp.route('/<int:category_id>', methods=['GET'])
+@conditional_get
+@query_budget(1)
 def get_category(category_id):
     """Get category by ID"""
     logger.info(f"Getting category with ID: {category_id}")
@@ -197,7 +223,12 @@ def create_category():
         )
         
         db.session.add(category)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('categories')
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        category_directory.invalidate()
         
         logger.info(f"Category created successfully with ID: {category.id}")
         return jsonify(category.to_dict()), 201
@@ -240,7 +271,12 @@ def update_category(category_id):
         category.name = data['name']
         category.description = data.get('description', category.description)
         
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('categories')
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        category_directory.invalidate()
         
         logger.info(f"Category updated successfully with ID: {category.id}")
         return jsonify(category.to_dict()), 200
@@ -277,7 +313,12 @@ def delete_category(category_id):
             }), 409
             
         db.session.delete(category)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('categories')
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        category_directory.invalidate()
         
         logger.info(f"Category deleted successfully with ID: {category_id}")
         return jsonify({"message": "Category deleted successfully"}), 200
@@ -1,17 +1,49 @@
-from flask import Blueprint, request, jsonify, current_app, make_response
+from flask import Blueprint, request, jsonify, current_app, make_response, Response, stream_with_context, send_from_directory
 from ..models import Product, Category, db
-from ..auth.middleware import auth_required
+from ..auth.middleware import auth_required, service_required, has_service_credential
 from ..utils.validators import validate_product_data
+from ..utils.search import apply_search
+from ..utils.serialization import PRODUCT_PLAN
+from ..utils.query_budget import query_budget
+from ..utils.http_cache import conditional_get, catalog_version
+from ..utils.category_directory import category_directory
+from ..utils.facets import parse_facets, compute_facets
+from ..utils.bulk_import import FORMATS as IMPORT_FORMATS, detect_format, iter_rows, import_products
+from ..utils.stock import (
+    InsufficientStock, HoldNotFound, HoldLimitExceeded, ReservationExists, ReservationNotFound, parse_lines, stock_levels,
+    reserve_stock, release_stock,
+    place_hold, confirm_hold, release_hold
+)
+from ..utils.image_jobs import spool_upload, discard_spool, enqueue_upload, enqueue_delete, legacy_public_id, image_worker
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy import or_, and_, func
 from app.shared.utils.pagination import PaginationHelper
-# from app.shared.utils.cloudinary_utils import cloudinary_uploader  # Commented out until we implement this
+from app.shared.utils.count_cache import count_cache
+from app.shared.utils.json_provider import dumps as json_dumps
+from datetime import datetime
+import csv
 import logging
 
 bp = Blueprint('product', __name__, url_prefix='/api/v1/products')
 logger = logging.getLogger(__name__)
 
+# Fields PUT and PATCH may change; stock holds, ratings and image state are
+# maintained by the service itself
+EDITABLE_FIELDS = ('name', 'description', 'price', 'category_id', 'stock_quantity', 'sku', 'image_url')
+
+def _category_exists(category_id):
+    """Check that a (possibly string) category ID exists, trusting the database on a directory miss"""
+    try:
+        category_id = int(category_id)
+    except (ValueError, TypeError):
+        return False
+    if category_directory.name_for(category_id) is not None:
+        return True
+    return Category.query.get(category_id) is not None
+
 @bp.route('', methods=['GET', 'OPTIONS'])
+@conditional_get
+@query_budget(4)
 def get_products():
     """
     Get products with pagination, filtering, and sorting
@@ -26,12 +58,19 @@ def get_products():
     
     # Get pagination parameters
     page, per_page = PaginationHelper.get_pagination_params()
+    cursor = PaginationHelper.get_cursor_param()
+    count_strategy = PaginationHelper.get_count_strategy()
     sort_by = request.args.get('sort', 'id')
     order = request.args.get('order', 'asc')
     search = request.args.get('search', '')
     category_name = request.args.get('category', '')
     min_price = request.args.get('min_price', None, type=float)
     max_price = request.args.get('max_price', None, type=float)
+    facets = parse_facets(request.args.get('facets', ''))
+    try:
+        fields = PRODUCT_PLAN.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": "Invalid fields", "message": str(e)}), 400
     
     if debug_mode:
         # In DEBUG_MODE, return mock product data with filtering and pagination
@@ -204,16 +243,13 @@ def get_products():
         
         # Apply filters
         if category_name:
-            category = Category.query.filter(func.lower(Category.name) == func.lower(category_name)).first()
-            if category:
-                query = query.filter(Product.category_id == category.id)
+            category_id = category_directory.id_for(category_name)
+            if category_id:
+                query = query.filter(Product.category_id == category_id)
                 
+        relevance = None
         if search:
-            search_term = f'%{search}%'
-            query = query.filter(or_(
-                Product.name.ilike(search_term),
-                Product.description.ilike(search_term)
-            ))
+            query, relevance = apply_search(query, search)
             
         if min_price is not None:
             query = query.filter(Product.price >= min_price)
@@ -221,23 +257,411 @@ def get_products():
         if max_price is not None:
             query = query.filter(Product.price <= max_price)
             
+        # Counts only depend on the filters, so cache them per normalized filter signature
+        count_signature = (search.strip().lower(), category_name.strip().lower(), min_price, max_price)
+        
+        # Facet counts for the filtered set; without a search term the filter
+        # space is small enough to cache
+        facet_counts = None
+        if facets:
+            facet_counts = compute_facets(
+                query, facets,
+                cache_signature=None if search else count_signature
+            )
+            
         # Apply sorting
         if sort_by == 'price':
-            query = query.order_by(Product.price.asc() if order == 'asc' else Product.price.desc())
+            sort_column = Product.price
         elif sort_by == 'name':
-            query = query.order_by(Product.name.asc() if order == 'asc' else Product.name.desc())
+            sort_column = Product.name
+        elif sort_by == 'rating':
+            sort_column = Product.rating_average
         else:  # Default to id
-            query = query.order_by(Product.id.asc() if order == 'asc' else Product.id.desc())
+            sort_column = Product.id
+        
+        if sort_by == 'relevance' and relevance is not None:
+            # Best matches first; order is implied by the ranking
+            query = query.order_by(relevance, Product.id.asc())
+        else:
+            query = query.order_by(sort_column.asc() if order == 'asc' else sort_column.desc())
+        
+        # Clients that send a cursor get keyset pagination instead of page/offset
+        if cursor is not None:
+            if sort_by == 'relevance' and relevance is not None:
+                return jsonify({
+                    "error": "Invalid cursor",
+                    "message": "Cursor pagination is not supported for sort=relevance"
+                }), 400
+            try:
+                result = PaginationHelper.paginate_cursor(
+                    query, Product, per_page, cursor,
+                    sort_column, Product.id, descending=order != 'asc',
+                    # The next cursor is built from the last row's sort key
+                    plan=PRODUCT_PLAN.narrow(fields, extra_columns=(sort_column.key,))
+                )
+            except ValueError as e:
+                logger.warning(f"Invalid cursor in get_products: {str(e)}")
+                return jsonify({"error": "Invalid cursor", "message": str(e)}), 400
+            if facet_counts is not None:
+                result['facets'] = facet_counts
+            return jsonify(result), 200
             
         # Use shared pagination helper
-        result = PaginationHelper.paginate_query(query, Product, page, per_page)
+        result = PaginationHelper.paginate_query(
+            query, Product, page, per_page,
+            count_strategy=count_strategy, count_key=('products', count_signature),
+            plan=PRODUCT_PLAN.narrow(fields)
+        )
+        if facet_counts is not None:
+            result['facets'] = facet_counts
         return jsonify(result), 200
 
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_products: {str(e)}")
         return jsonify({"error": "Database error", "message": str(e)}), 500
 
+@bp.route('/batch', methods=['GET', 'POST', 'OPTIONS'])
+@conditional_get
+@query_budget(1)
+def get_products_batch():
+    """
+    Get many products by ID in a single query
+    
+    GET takes a comma-separated ?ids=1,2,3 list; POST takes {"ids": [...]} for
+    lists too long for a URL. Returns the found products keyed by ID, plus the
+    requested IDs that do not exist. ?fields= limits the serialized fields.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        raw_ids = data.get('ids')
+    else:
+        raw_ids = [part for part in request.args.get('ids', '').split(',') if part.strip()]
+        
+    if not isinstance(raw_ids, list):
+        return jsonify({"error": "ids must be a list of product IDs"}), 400
+        
+    try:
+        plan = PRODUCT_PLAN.narrow(PRODUCT_PLAN.parse_fields(request.args.get('fields')))
+    except ValueError as e:
+        return jsonify({"error": "Invalid fields", "message": str(e)}), 400
+        
+    try:
+        # Deduplicate while keeping the caller's order
+        product_ids = list(dict.fromkeys(int(product_id) for product_id in raw_ids))
+    except (ValueError, TypeError):
+        return jsonify({"error": "Product IDs must be integers"}), 400
+        
+    max_batch_size = current_app.config.get('MAX_BATCH_SIZE', 500)
+    if len(product_ids) > max_batch_size:
+        return jsonify({"error": f"At most {max_batch_size} product IDs can be requested at once"}), 400
+        
+    logger.info(f"Getting {len(product_ids)} products in batch")
+    if not product_ids:
+        return jsonify({"products": {}, "missing": []}), 200
+        
+    try:
+        products = plan.apply(Product.query).filter(Product.id.in_(product_ids)).all()
+        found = {str(product.id): plan.serialize(product) for product in products}
+        missing = [product_id for product_id in product_ids if str(product_id) not in found]
+        
+        return jsonify({"products": found, "missing": missing}), 200
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_products_batch: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+
+@bp.route('/export', methods=['GET'])
+def export_products():
+    """
+    Stream the catalog as newline-delimited JSON
+    
+    Rows are read through a server-side cursor in EXPORT_BATCH_SIZE chunks and
+    written as they are serialized, so memory stays flat regardless of catalog
+    size. ?updated_since=<ISO datetime> limits the export to products changed
+    since then; the X-Export-Started-At header is the value to pass next time.
+    """
+    updated_since = request.args.get('updated_since')
+    started_at = datetime.utcnow()
+    
+    query = Product.query
+    if updated_since:
+        try:
+            since = datetime.fromisoformat(updated_since)
+        except ValueError:
+            return jsonify({"error": "updated_since must be an ISO 8601 datetime"}), 400
+        query = query.filter(Product.updated_at >= since).order_by(Product.updated_at.asc(), Product.id.asc())
+    else:
+        query = query.order_by(Product.id.asc())
+        
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    query = PRODUCT_PLAN.apply(query).execution_options(stream_results=True).yield_per(batch_size)
+    logger.info(f"Exporting products (updated_since={updated_since})")
+    
+    def generate():
+        exported = 0
+        try:
+            for product in query:
+                yield json_dumps(product.to_dict()) + '\n'
+                exported += 1
+        except SQLAlchemyError as e:
+            # Headers are already sent, so the truncated stream is the only signal
+            logger.error(f"Database error in export_products after {exported} products: {str(e)}")
+            return
+        logger.info(f"Exported {exported} products")
+        
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Export-Started-At'] = started_at.isoformat()
+    return response
+
+@bp.route('/import', methods=['POST', 'OPTIONS'])
+@auth_required
+def import_products_feed():
+    """
+    Bulk create or update products from a CSV or NDJSON feed
+    
+    The feed is sent as a multipart 'file' upload or as the raw request body.
+    ?format=csv|ndjson overrides detection from the file name or Content-Type.
+    Rows are upserted by SKU in IMPORT_BATCH_SIZE batches; rows may name their
+    category with 'category' instead of 'category_id'. The response reports
+    created/updated/failed counts and the errors of the rows that failed.
+    """
+    upload = request.files.get('file')
+    if upload:
+        stream = upload.stream
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.mimetype)
+    else:
+        stream = request.stream
+        fmt = request.args.get('format') or detect_format(content_type=request.mimetype)
+    
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"error": "Feed format must be 'csv' or 'ndjson'"}), 400
+    
+    logger.info(f"Importing products from {fmt} feed")
+    try:
+        report = import_products(
+            iter_rows(stream, fmt),
+            batch_size=current_app.config.get('IMPORT_BATCH_SIZE', 1000),
+            max_errors=current_app.config.get('IMPORT_MAX_ERRORS', 1000)
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        logger.warning(f"Unreadable feed in import_products_feed: {str(e)}")
+        return jsonify({"error": "Feed could not be parsed", "message": str(e)}), 400
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in import_products_feed: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+    
+    return jsonify(report.to_dict()), 200
+
+def _reservation_reference(data):
+    """Validate the caller's reservation reference"""
+    reference = data.get('reference')
+    if not isinstance(reference, str) or not reference.strip() or len(reference) > 64:
+        raise ValueError("reference must be a non-empty string of at most 64 characters")
+    return reference.strip()
+
+@bp.route('/stock/reserve', methods=['POST', 'OPTIONS'])
+@service_required
+def reserve_product_stock():
+    """
+    Atomically take stock for a set of order lines (services only)
+    
+    Takes {"reference": "order-42", "items": [{"product_id": 1, "quantity": 2}, ...]}.
+    Every line is decremented with a conditional UPDATE in one transaction:
+    either all lines are reserved, or none are and the response is 409 with
+    the shortages and missing products. The reserved lines are recorded under
+    the reference, which must be unique, for /stock/release.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        reference = _reservation_reference(data)
+        lines = parse_lines(data.get('items'), max_lines=current_app.config.get('MAX_BATCH_SIZE', 500))
+    except ValueError as e:
+        return jsonify({"error": "Invalid items", "message": str(e)}), 400
+        
+    try:
+        reserve_stock(lines, reference)
+    except ReservationExists as e:
+        return jsonify({"error": "Reservation already exists", "message": str(e)}), 409
+    except InsufficientStock as e:
+        logger.info(f"Stock reservation refused: {str(e)}")
+        return jsonify({"error": "Insufficient stock", "shortages": e.shortages, "missing": e.missing}), 409
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in reserve_product_stock: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    reserved = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+    return jsonify({"reference": reference, "reserved": reserved}), 200
+
+@bp.route('/stock/release', methods=['POST', 'OPTIONS'])
+@service_required
+def release_product_stock():
+    """
+    Give back the stock of a reservation made with /stock/reserve (services only)
+    
+    Takes {"reference": "order-42"}, e.g. when the order the stock was
+    reserved for could not be saved or was cancelled. A reservation can only
+    be released once; unknown or released references return 404.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        reference = _reservation_reference(data)
+    except ValueError as e:
+        return jsonify({"error": "Invalid reservation", "message": str(e)}), 400
+        
+    try:
+        lines, missing = release_stock(reference)
+    except ReservationNotFound as e:
+        return jsonify({"error": "Reservation not found", "message": str(e)}), 404
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in release_product_stock: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    released = [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+    return jsonify({"reference": reference, "released": released, "missing": missing}), 200
+
+@bp.route('/stock', methods=['GET', 'OPTIONS'])
+def get_stock_levels():
+    """
+    Get live stock levels for ?ids=1,2,3
+    
+    Not cached: available_quantity (stock minus active holds) changes with
+    every checkout hold, which does not bump the catalog version.
+    """
+    try:
+        product_ids = list(dict.fromkeys(
+            int(part) for part in request.args.get('ids', '').split(',') if part.strip()
+        ))
+    except ValueError:
+        return jsonify({"error": "Product IDs must be integers"}), 400
+        
+    max_batch_size = current_app.config.get('MAX_BATCH_SIZE', 500)
+    if len(product_ids) > max_batch_size:
+        return jsonify({"error": f"At most {max_batch_size} product IDs can be requested at once"}), 400
+        
+    try:
+        levels = stock_levels(product_ids) if product_ids else {}
+    except SQLAlchemyError as e:
+        logger.error(f"Database error in get_stock_levels: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    return jsonify({
+        "stock": {str(product_id): level for product_id, level in levels.items()},
+        "missing": [product_id for product_id in product_ids if product_id not in levels]
+    }), 200
+
+@bp.route('/stock/holds', methods=['POST', 'OPTIONS'])
+@auth_required
+def create_stock_hold():
+    """
+    Hold stock for a checkout
+    
+    Takes {"items": [...], "ttl": seconds} (ttl defaults to STOCK_HOLD_TTL and
+    is capped at STOCK_HOLD_MAX_TTL). Held units are not available to other
+    holds or reservations until the hold is confirmed, released or expires.
+    A user's active holds may add up to at most STOCK_HOLD_MAX_UNITS units.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        lines = parse_lines(data.get('items'), max_lines=current_app.config.get('MAX_BATCH_SIZE', 500))
+        ttl = int(data.get('ttl') or current_app.config.get('STOCK_HOLD_TTL', 600))
+        if ttl <= 0:
+            raise ValueError("ttl must be a positive number of seconds")
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": "Invalid hold", "message": str(e)}), 400
+    ttl = min(ttl, current_app.config.get('STOCK_HOLD_MAX_TTL', 3600))
+        
+    try:
+        hold_id, expires_at = place_hold(
+            lines, ttl, request.user['id'], max_units=current_app.config.get('STOCK_HOLD_MAX_UNITS', 50)
+        )
+    except HoldLimitExceeded as e:
+        return jsonify({"error": "Too many units held", "message": str(e)}), 429
+    except InsufficientStock as e:
+        logger.info(f"Stock hold refused: {str(e)}")
+        return jsonify({"error": "Insufficient stock", "shortages": e.shortages, "missing": e.missing}), 409
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in create_stock_hold: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    return jsonify({
+        "hold_id": hold_id,
+        "expires_at": expires_at.isoformat(),
+        "items": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+    }), 201
+
+@bp.route('/stock/holds/<hold_id>/confirm', methods=['POST', 'OPTIONS'])
+@service_required
+@auth_required
+def confirm_stock_hold(hold_id):
+    """
+    Take a hold's units out of stock (services, on behalf of the hold's owner)
+    
+    Takes {"reference": "order-42", "items": [...]}; the optional items must
+    match the hold's lines. The taken stock is recorded as a reservation under
+    the reference that /stock/release can give back. The Authorization token
+    must be the user's who placed the hold. Expired, already settled or other
+    users' holds return 404.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        expected = parse_lines(data['items']) if data.get('items') is not None else None
+        reference = _reservation_reference(data)
+    except ValueError as e:
+        return jsonify({"error": "Invalid items", "message": str(e)}), 400
+        
+    try:
+        lines = confirm_hold(hold_id, reference, expected, owner_id=request.user['id'])
+    except ReservationExists as e:
+        return jsonify({"error": "Reservation already exists", "message": str(e)}), 409
+    except HoldNotFound:
+        return jsonify({"error": "Hold not found or expired"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    except InsufficientStock as e:
+        logger.warning(f"Stock hold {hold_id} could not be confirmed: {str(e)}")
+        return jsonify({"error": "Insufficient stock", "shortages": e.shortages, "missing": e.missing}), 409
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in confirm_stock_hold: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    return jsonify({
+        "hold_id": hold_id,
+        "confirmed": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+    }), 200
+
+@bp.route('/stock/holds/<hold_id>/release', methods=['POST', 'OPTIONS'])
+@auth_required
+def release_stock_hold(hold_id):
+    """Give a hold's units back before it expires (only the user who placed it, or a service)"""
+    try:
+        lines = release_hold(hold_id, owner_id=None if has_service_credential() else request.user['id'])
+    except HoldNotFound:
+        return jsonify({"error": "Hold not found"}), 404
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error(f"Database error in release_stock_hold: {str(e)}")
+        return jsonify({"error": "Database error", "message": str(e)}), 500
+        
+    return jsonify({
+        "hold_id": hold_id,
+        "released": [{"product_id": product_id, "quantity": quantity} for product_id, quantity in lines.items()]
+    }), 200
+
+@bp.route('/images/<path:filename>', methods=['GET'])
+def get_product_image(filename):
+    """Serve an image stored by the local image storage backend"""
+    if current_app.config.get('IMAGE_STORAGE_BACKEND', 'local') != 'local':
+        return jsonify({"error": "Image not found"}), 404
+    # Stored file names are unique, so the content never changes
+    return send_from_directory(current_app.config['IMAGE_STORAGE_DIR'], filename, max_age=31536000)
+
 @bp.route('/<int:product_id>', methods=['GET', 'OPTIONS'])
+@conditional_get
+@query_budget(1)
 def get_product(product_id):
     """Get product by ID"""
     logger.info(f"Getting product with ID: {product_id}")
@@ -326,15 +750,20 @@ def get_product(product_id):
             logger.warning(f"DEBUG_MODE: Mock product not found with ID: {product_id}")
             return jsonify({"error": "Product not found"}), 404
     
+    try:
+        plan = PRODUCT_PLAN.narrow(PRODUCT_PLAN.parse_fields(request.args.get('fields')))
+    except ValueError as e:
+        return jsonify({"error": "Invalid fields", "message": str(e)}), 400
+    
     # Normal database operation if not in DEBUG_MODE
     try:
-        product = Product.query.get(product_id)
+        product = plan.apply(Product.query).get(product_id)
         
         if not product:
             logger.warning(f"Product not found with ID: {product_id}")
             return jsonify({"error": "Product not found"}), 404
             
-        return jsonify(product.to_dict()), 200
+        return jsonify(plan.serialize(product)), 200
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_product: {str(e)}")
         return jsonify({"error": "Database error", "message": str(e)}), 500
@@ -342,9 +771,15 @@ def get_product(product_id):
 @bp.route('', methods=['POST', 'OPTIONS'])
 @auth_required
 def create_product():
-    """Create a new product"""
+    """
+    Create a new product
+    
+    An uploaded image is spooled and stored by the image worker; the product is
+    returned straight away with image_status 'pending' until image_url is set.
+    """
     logger.info("Creating new product")
     
+    spool_path = None
     try:
         # Handle form data and file
         data = request.form.to_dict()
@@ -354,23 +789,9 @@ def create_product():
         if validation_error:
             logger.warning(f"Validation error in create_product: {validation_error}")
             return jsonify({"error": validation_error}), 400
-            
-        # Upload image if provided
-        image_url = None
-        if image_file:
-            try:
-                upload_result = cloudinary_uploader.upload_file(
-                    image_file,
-                    folder='products'
-                )
-                image_url = upload_result['url']
-            except Exception as e:
-                logger.error(f"Image upload error: {str(e)}")
-                return jsonify({"error": "Failed to upload image"}), 500
 
         # Verify category exists
-        category = Category.query.get(data['category_id'])
-        if not category:
+        if not _category_exists(data['category_id']):
             logger.warning(f"Category not found with ID: {data['category_id']}")
             return jsonify({"error": "Category not found"}), 404
 
@@ -380,27 +801,43 @@ def create_product():
             price=data['price'],
             category_id=data['category_id'],
             stock_quantity=data.get('stock_quantity', 0),
-            sku=data.get('sku'),
-            image_url=image_url
+            sku=data.get('sku')
         )
         
         db.session.add(product)
+        if image_file:
+            db.session.flush()
+            spool_path = spool_upload(image_file)
+            enqueue_upload(product, spool_path)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        if spool_path:
+            image_worker.notify()
         
         logger.info(f"Product created successfully with ID: {product.id}")
         return jsonify(product.to_dict()), 201
 
     except Exception as e:
         db.session.rollback()
+        discard_spool(spool_path)
         logger.error(f"Error in create_product: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @bp.route('/<int:product_id>', methods=['PUT', 'OPTIONS'])
 @auth_required
 def update_product(product_id):
-    """Update a product"""
+    """
+    Update a product
+    
+    A new image is spooled and stored by the image worker, which also deletes
+    the image it replaces; until then the product keeps its current image_url
+    and has image_status 'pending'.
+    """
     logger.info(f"Updating product with ID: {product_id}")
     
+    spool_path = None
     try:
         data = request.form.to_dict()
         image_file = request.files.get('image')
@@ -415,35 +852,28 @@ def update_product(product_id):
             logger.warning(f"Product not found with ID: {product_id}")
             return jsonify({"error": "Product not found"}), 404
 
-        # Handle image update if provided
-        if image_file:
-            try:
-                # Delete old image if exists
-                if product.image_url and 'cloudinary' in product.image_url:
-                    old_public_id = product.image_url.split('/')[-1].split('.')[0]
-                    cloudinary_uploader.delete_file(old_public_id)
-
-                # Upload new image
-                upload_result = cloudinary_uploader.upload_file(
-                    image_file,
-                    folder='products'
-                )
-                data['image_url'] = upload_result['url']
-            except Exception as e:
-                logger.error(f"Image upload error: {str(e)}")
-                return jsonify({"error": "Failed to upload image"}), 500
-
         # Update product fields
         for key, value in data.items():
-            if hasattr(product, key):
+            if key in EDITABLE_FIELDS:
                 setattr(product, key, value)
 
+        # Queue the new image; the worker swaps it in and deletes the old one
+        if image_file:
+            spool_path = spool_upload(image_file)
+            enqueue_upload(product, spool_path)
+
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        if spool_path:
+            image_worker.notify()
         logger.info(f"Product updated successfully with ID: {product.id}")
         return jsonify(product.to_dict()), 200
 
     except Exception as e:
         db.session.rollback()
+        discard_spool(spool_path)
         logger.error(f"Error in update_product: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
@@ -468,8 +898,7 @@ def partial_update_product(product_id):
             
         # Validate category_id if provided
         if 'category_id' in data:
-            category = Category.query.get(data['category_id'])
-            if not category:
+            if not _category_exists(data['category_id']):
                 logger.warning(f"Category not found with ID: {data['category_id']}")
                 return jsonify({"error": "Category not found"}), 404
                 
@@ -500,10 +929,13 @@ def partial_update_product(product_id):
                 
         # Update product fields
         for key, value in data.items():
-            if hasattr(product, key):
+            if key in EDITABLE_FIELDS:
                 setattr(product, key, value)
                 
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
         
         logger.info(f"Product partially updated successfully with ID: {product.id}")
         return jsonify(product.to_dict()), 200
@@ -529,8 +961,13 @@ def delete_product(product_id):
             logger.warning(f"Product not found with ID: {product_id}")
             return jsonify({"error": "Product not found"}), 404
             
+        enqueue_delete(product.image_public_id or legacy_public_id(product.image_url), product_id=product.id)
         db.session.delete(product)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+        count_cache.invalidate('reviews')
         
         logger.info(f"Product deleted successfully with ID: {product_id}")
         return jsonify({"message": "Product deleted successfully"}), 200
@@ -4,14 +4,26 @@ from ..auth.middleware import auth_required
 from ..utils.validators import validate_review_data
 from sqlalchemy.exc import SQLAlchemyError
 from app.shared.utils.pagination import PaginationHelper
+from app.shared.utils.count_cache import count_cache
+from ..utils.serialization import REVIEW_PLAN
+from ..utils.query_budget import query_budget
+from ..utils.http_cache import conditional_get, catalog_version
 import logging
 
 bp = Blueprint('review', __name__, url_prefix='/api/reviews')
 logger = logging.getLogger(__name__)
 
 @bp.route('/product/<int:product_id>', methods=['GET'])
+@conditional_get
+@query_budget(3)
 def get_product_reviews(product_id):
-    """Get all reviews for a product with pagination"""
+    """
+    Get all reviews for a product with pagination
+    
+    Reviews are listed newest first, by page or with ?cursor= keyset paging.
+    ?since=<next_since token or ISO datetime> instead returns only the reviews
+    added after that point, oldest first, for clients polling for new reviews.
+    """
     logger.info(f"Getting reviews for product ID: {product_id}")
     
     # Check if DEBUG_MODE is enabled
@@ -140,28 +152,67 @@ def get_product_reviews(product_id):
         
         return jsonify(result), 200
     
+    try:
+        fields = REVIEW_PLAN.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({"error": "Invalid fields", "message": str(e)}), 400
+    
     # Normal database operation if not in DEBUG_MODE
     try:
         # Check if product exists
-        product = Product.query.get(product_id)
+        product = db.session.query(Product.id).filter(Product.id == product_id).first()
         if not product:
             logger.warning(f"Product not found with ID: {product_id}")
             return jsonify({"error": "Product not found"}), 404
             
         # Get pagination parameters
         page, per_page = PaginationHelper.get_pagination_params()
+        cursor = PaginationHelper.get_cursor_param()
+        since = request.args.get('since')
         
         # Build query with sorting by date
         query = Review.query.filter_by(product_id=product_id).order_by(Review.created_at.desc())
         
+        # Only the reviews added after the client's newest one
+        if since:
+            try:
+                result = PaginationHelper.paginate_since(
+                    query, Review, per_page, since,
+                    Review.created_at, Review.id,
+                    plan=REVIEW_PLAN.narrow(fields, extra_columns=('created_at',))
+                )
+            except ValueError as e:
+                logger.warning(f"Invalid since in get_product_reviews: {str(e)}")
+                return jsonify({"error": "Invalid since", "message": str(e)}), 400
+            return jsonify(result), 200
+        
+        # Clients that send a cursor get keyset pagination instead of page/offset
+        if cursor is not None:
+            try:
+                result = PaginationHelper.paginate_cursor(
+                    query, Review, per_page, cursor,
+                    Review.created_at, Review.id, descending=True,
+                    plan=REVIEW_PLAN.narrow(fields, extra_columns=('created_at',))
+                )
+            except ValueError as e:
+                logger.warning(f"Invalid cursor in get_product_reviews: {str(e)}")
+                return jsonify({"error": "Invalid cursor", "message": str(e)}), 400
+            return jsonify(result), 200
+        
         # Use shared pagination helper
-        result = PaginationHelper.paginate_query(query, Review, page, per_page)
+        result = PaginationHelper.paginate_query(
+            query, Review, page, per_page,
+            count_strategy=PaginationHelper.get_count_strategy(), count_key=('reviews', (product_id,)),
+            plan=REVIEW_PLAN.narrow(fields)
+        )
         return jsonify(result), 200
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_product_reviews: {str(e)}")
         return jsonify({"error": "Database error", "message": str(e)}), 500
 
 @bp.route('/<int:review_id>', methods=['GET'])
+@conditional_get
+@query_budget(1)
 def get_review(review_id):
     """Get review by ID"""
     logger.info(f"Getting review with ID: {review_id}")
@@ -265,15 +316,20 @@ def get_review(review_id):
             logger.warning(f"DEBUG_MODE: Mock review not found with ID: {review_id}")
             return jsonify({"error": "Review not found"}), 404
     
+    try:
+        plan = REVIEW_PLAN.narrow(REVIEW_PLAN.parse_fields(request.args.get('fields')))
+    except ValueError as e:
+        return jsonify({"error": "Invalid fields", "message": str(e)}), 400
+    
     # Normal database operation if not in DEBUG_MODE
     try:
-        review = Review.query.get(review_id)
+        review = plan.apply(Review.query).get(review_id)
         
         if not review:
             logger.warning(f"Review not found with ID: {review_id}")
             return jsonify({"error": "Review not found"}), 404
             
-        return jsonify(review.to_dict()), 200
+        return jsonify(plan.serialize(review)), 200
     except SQLAlchemyError as e:
         logger.error(f"Database error in get_review: {str(e)}")
         return jsonify({"error": "Database error", "message": str(e)}), 500
@@ -323,7 +379,10 @@ def create_review():
         )
         
         db.session.add(review)
+        Product.adjust_rating_aggregates(review.product_id, added=review.rating)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('reviews')
         
         logger.info(f"Review created successfully with ID: {review.id}")
         return jsonify(review.to_dict()), 201
@@ -365,13 +424,22 @@ def update_review(review_id):
                 logger.warning(f"Product not found with ID: {data['product_id']}")
                 return jsonify({"error": "Product not found"}), 404
                 
+        # Move the rating between product aggregates in the same transaction
+        if data['product_id'] != review.product_id:
+            Product.adjust_rating_aggregates(review.product_id, removed=review.rating)
+            Product.adjust_rating_aggregates(data['product_id'], added=data['rating'])
+        elif data['rating'] != review.rating:
+            Product.adjust_rating_aggregates(review.product_id, added=data['rating'], removed=review.rating)
+            
         # Update review fields
         review.product_id = data['product_id']
         review.user_name = data['user_name']
         review.rating = data['rating']
         review.comment = data.get('comment', review.comment)
         
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('reviews')
         
         logger.info(f"Review updated successfully with ID: {review.id}")
         return jsonify(review.to_dict()), 200
@@ -400,7 +468,10 @@ def delete_review(review_id):
             return jsonify({"error": "You can only delete your own reviews"}), 403
             
         db.session.delete(review)
+        Product.adjust_rating_aggregates(review.product_id, removed=review.rating)
+        catalog_version.bump()
         db.session.commit()
+        count_cache.invalidate('reviews')
         
         logger.info(f"Review deleted successfully with ID: {review_id}")
         return jsonify({"message": "Review deleted successfully"}), 200
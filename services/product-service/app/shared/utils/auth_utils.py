@@ -0,0 +1,368 @@
+import os
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+import jwt
+import requests
+from functools import wraps
+from flask import request, jsonify
+
+# Token claims that carry the user's profile; tokens with all of them are
+# authorized without asking the Auth Service who the user is
+USER_CLAIMS = ('email', 'first_name', 'last_name', 'role')
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of verified user data keyed by a SHA-256 hash of the token,
+    so raw tokens are never kept in memory. Entries expire with their token
+    (or sooner, see AuthUtils.token_cache_ttl).
+    """
+    
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+        
+    def get(self, token):
+        """Return the cached user for a token, or None if unknown or expired"""
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+            
+    def set(self, token, user, expires_at):
+        """Cache a verified user until expires_at (epoch seconds)"""
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (user, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class CurrentClaimsCache(VerifiedTokenCache):
+    """
+    Bounded LRU of users' current token claims as the Auth Service reports
+    them, keyed by user ID; {} marks a user that does not exist or is inactive
+    """
+    
+    @staticmethod
+    def _key(user_id):
+        return str(user_id)
+
+class AuthServiceUnavailable(Exception):
+    """Raised by verify_token(allow_degraded=False) when the Auth Service cannot be reached"""
+
+class AuthUtils:
+    """
+    Shared authentication utility for Shop Meeting API microservices.
+    This allows services to communicate with the Auth Service securely
+    and validates tokens without relying on DEBUG_MODE.
+    """
+    
+    def __init__(self, auth_service_url=None, jwt_secret=None, service_api_key=None):
+        self.auth_service_url = auth_service_url or os.getenv('AUTH_SERVICE_URL', 'http://localhost:5002')
+        self.jwt_secret = jwt_secret or os.getenv('JWT_SECRET_KEY', 'your_super_secret_jwt_key')
+        self.service_api_key = service_api_key or os.getenv('SERVICE_API_KEY')
+        
+        # Flag for using DEBUG_MODE - should be False in production
+        self.debug_mode = os.getenv('DEBUG_MODE', 'False').lower() == 'true'
+        
+        # Verified tokens are cached per process; user data fetched from the
+        # Auth Service is reused for at most token_cache_ttl seconds
+        self.token_cache = VerifiedTokenCache(int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000')))
+        self.token_cache_ttl = int(os.getenv('AUTH_TOKEN_CACHE_TTL', '300'))
+        self.verify_timeout = float(os.getenv('AUTH_VERIFY_TIMEOUT', '2'))
+        
+        # Each user's current claims, against which the claims version (cv) of
+        # their tokens is checked, are reused for claims_cache_ttl seconds
+        self.claims_cache = CurrentClaimsCache(int(os.getenv('AUTH_TOKEN_CACHE_SIZE', '10000')))
+        self.claims_cache_ttl = int(os.getenv('AUTH_CLAIMS_CACHE_TTL', '30'))
+        
+    def verify_token(self, token, allow_degraded=True):
+        """
+        Verify a JWT token, locally first:
+        1. Return the cached user if this token was verified recently
+        2. Check the signature and expiry with JWT_SECRET_KEY (invalid tokens
+           are rejected without a network call)
+        3. Build the user from the token's claims when it carries them, and
+           otherwise fetch it from the Auth Service's /auth/verify endpoint
+        4. Using a mock user if DEBUG_MODE is enabled
+        
+        Users built from a token's claims are then checked against the
+        user's current claims (see with_current_claims).
+        
+        While the Auth Service is unreachable, a token that is valid but does
+        not carry the user's claims yields minimal user info, or raises
+        AuthServiceUnavailable if allow_degraded is False.
+        
+        Returns: User data dictionary if verified, None if invalid
+        """
+        if self.debug_mode:
+            # In debug mode, return a mock user
+            return {
+                'id': 1,
+                'email': 'test@example.com',
+                'first_name': 'Test',
+                'last_name': 'User',
+                'role': 'user',
+                'is_admin': False,
+                'is_support_agent': False
+            }
+            
+        user = self.token_cache.get(token)
+        if user is not None:
+            return self.with_current_claims(user)
+            
+        payload = self.decode_token(token)
+        if payload is None:
+            return None
+            
+        expires_at = payload.get('exp', time.time())
+        user = self.user_from_claims(payload)
+        if user is None:
+            user, available = self.fetch_user(token)
+            if not available:
+                if not allow_degraded:
+                    raise AuthServiceUnavailable()
+                # Minimal user info while the Auth Service is unreachable (not cached)
+                return {
+                    'id': payload.get('sub'),
+                    'role': 'user'
+                }
+            if user is None:
+                return None
+            expires_at = min(expires_at, time.time() + self.token_cache_ttl)
+            
+        self.token_cache.set(token, user, expires_at)
+        return self.with_current_claims(user)
+        
+    def decode_token(self, token):
+        """
+        Check a token's signature and expiry in-process
+        
+        Returns: The token's claims, or None if it is invalid, expired or not an access token
+        """
+        try:
+            # The Auth Service issues integer subjects, which newer PyJWT rejects by default
+            payload = jwt.decode(token, self.jwt_secret, algorithms=['HS256'], options={'verify_sub': False})
+        except jwt.PyJWTError:
+            return None
+        if payload.get('type', 'access') != 'access':
+            return None
+        return payload
+        
+    @staticmethod
+    def user_from_claims(payload):
+        """
+        Build user data from a token that carries the user's claims
+        
+        Returns: User data dictionary, or None if the token only identifies the user
+        """
+        if not all(claim in payload for claim in USER_CLAIMS):
+            return None
+        role = payload['role']
+        return {
+            'id': payload.get('sub'),
+            'email': payload['email'],
+            'first_name': payload['first_name'],
+            'last_name': payload['last_name'],
+            'role': role,
+            'is_admin': payload.get('is_admin', role == 'admin'),
+            'is_support_agent': payload.get('is_support_agent', role == 'support_agent'),
+            # Tokens issued before claims were versioned count as version 1
+            'cv': payload.get('cv', 1)
+        }
+        
+    def fetch_user(self, token):
+        """
+        Ask the Auth Service for the user a token belongs to
+        
+        Returns: (user data or None, whether the Auth Service answered)
+        """
+        try:
+            response = requests.get(
+                f"{self.auth_service_url}/auth/verify",
+                headers={'Authorization': f'Bearer {token}'},
+                timeout=self.verify_timeout
+            )
+        except requests.exceptions.RequestException:
+            return None, False
+        if response.status_code == 200:
+            return response.json().get('user'), True
+        if response.status_code in (401, 403, 422):
+            return None, True
+        return None, False
+        
+    def with_current_claims(self, user):
+        """
+        Check a user built from a token's claims against the user's current claims
+        
+        The token's role is only trusted while its claims version (cv) is the
+        user's current one: a token issued before a role change is authorized
+        with the user's current claims, and tokens of users that no longer
+        exist or were deactivated are rejected. If the current claims can not
+        be looked up, the token's own apply until it expires.
+        
+        Returns: User data dictionary, or None if the user is gone
+        """
+        if 'cv' not in user:
+            # Fetched from the Auth Service, which checks the version itself
+            return user
+        current = self.current_claims(user['id'])
+        if current is None:
+            return user
+        if not current:
+            return None
+        if current.get('cv', 1) > user['cv']:
+            return self.user_from_claims(dict(current, sub=user['id']))
+        return user
+        
+    def current_claims(self, user_id):
+        """
+        Ask the Auth Service for a user's current token claims, with
+        SERVICE_API_KEY; answers are cached for claims_cache_ttl seconds
+        
+        Returns: Claims dictionary, {} if the user does not exist or is
+        inactive, or None if they could not be looked up
+        """
+        if not self.service_api_key:
+            return None
+        claims = self.claims_cache.get(user_id)
+        if claims is not None:
+            return claims
+        try:
+            response = requests.get(
+                f"{self.auth_service_url}/auth/users/{user_id}/claims",
+                headers={'X-Service-Key': self.service_api_key},
+                timeout=self.verify_timeout
+            )
+        except requests.exceptions.RequestException:
+            return None
+        if response.status_code == 200:
+            claims = response.json().get('claims') or {}
+        elif response.status_code == 404:
+            claims = {}
+        else:
+            return None
+        self.claims_cache.set(user_id, claims, time.time() + self.claims_cache_ttl)
+        return claims
+            
+    def auth_required(self, f):
+        """
+        Decorator for endpoints that require authentication
+        """
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            auth_header = request.headers.get('Authorization')
+            
+            if not auth_header:
+                return jsonify({"error": "No authorization header"}), 401
+                
+            if not auth_header.startswith('Bearer '):
+                return jsonify({"error": "Invalid authorization format"}), 401
+                
+            token = auth_header.split(' ')[1]
+            
+            user = self.verify_token(token)
+            if not user:
+                return jsonify({"error": "Invalid token"}), 401
+                
+            # Add user info to request context
+            request.user = user
+            
+            # For backward compatibility with existing code
+            if isinstance(user, dict) and 'id' in user:
+                request.user_id = user['id']
+                
+            return f(*args, **kwargs)
+        return decorated_function
+        
+    def admin_required(self, f):
+        """
+        Decorator for endpoints that require admin privileges
+        """
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            auth_header = request.headers.get('Authorization')
+            
+            if not auth_header:
+                return jsonify({"error": "No authorization header"}), 401
+                
+            if not auth_header.startswith('Bearer '):
+                return jsonify({"error": "Invalid authorization format"}), 401
+                
+            token = auth_header.split(' ')[1]
+            
+            user = self.verify_token(token)
+            if not user:
+                return jsonify({"error": "Invalid token"}), 401
+                
+            if not user.get('is_admin', False):
+                return jsonify({"error": "Admin access required"}), 403
+                
+            # Add user info to request context
+            request.user = user
+            
+            # For backward compatibility with existing code
+            if isinstance(user, dict) and 'id' in user:
+                request.user_id = user['id']
+                
+            return f(*args, **kwargs)
+        return decorated_function
+        
+    def support_agent_required(self, f):
+        """
+        Decorator for Customer Support Service endpoints
+        """
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            auth_header = request.headers.get('Authorization')
+            
+            if not auth_header:
+                return jsonify({"error": "No authorization header"}), 401
+                
+            if not auth_header.startswith('Bearer '):
+                return jsonify({"error": "Invalid authorization format"}), 401
+                
+            token = auth_header.split(' ')[1]
+            
+            user = self.verify_token(token)
+            if not user:
+                return jsonify({"error": "Invalid token"}), 401
+                
+            if not user.get('is_support_agent', False):
+                return jsonify({"error": "Support agent access required"}), 403
+                
+            # Add user info to request context
+            request.user = user
+            
+            # For backward compatibility with existing code
+            if isinstance(user, dict) and 'id' in user:
+                request.user_id = user['id']
+                
+            return f(*args, **kwargs)
+        return decorated_function
+
+# Create a singleton instance
+auth_utils = AuthUtils()
+
+# Export decorators for easy import by services
+auth_required = auth_utils.auth_required
+admin_required = auth_utils.admin_required
+support_agent_required = auth_utils.support_agent_required
@@ -0,0 +1,81 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CountCache:
+    """
+    In-process cache of exact row counts for paginated listings.
+    
+    Entries are grouped by namespace (e.g. 'products') and keyed by a normalized
+    filter signature, expire after a short TTL and are dropped wholesale when a
+    write touches the namespace. The cache is per worker process, so the TTL
+    bounds how stale a count can be in workers that did not see the write.
+    """
+    
+    def __init__(self, ttl=30, max_entries=1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        
+    def get(self, namespace, signature):
+        """
+        Get a cached count
+        
+        Returns:
+            int or None: Cached count, or None if missing or expired
+        """
+        with self._lock:
+            entries = self._namespaces.get(namespace)
+            if not entries or signature not in entries:
+                return None
+            expires_at, value = entries[signature]
+            if expires_at < time.monotonic():
+                del entries[signature]
+                return None
+            entries.move_to_end(signature)
+            return value
+            
+    def set(self, namespace, signature, value):
+        """Store a count, evicting the least recently used entry when full"""
+        with self._lock:
+            entries = self._namespaces.setdefault(namespace, OrderedDict())
+            entries[signature] = (time.monotonic() + self.ttl, value)
+            entries.move_to_end(signature)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                
+    def get_or_compute(self, namespace, signature, compute):
+        """
+        Get a cached count or compute and cache it
+        
+        Args:
+            namespace: Cache namespace, usually the listing's table
+            signature: Hashable normalized filter signature
+            compute: Callable returning the exact count
+            
+        Returns:
+            int: Row count
+        """
+        value = self.get(namespace, signature)
+        if value is None:
+            value = compute()
+            self.set(namespace, signature, value)
+        return value
+        
+    def invalidate(self, namespace=None):
+        """Drop all counts in a namespace, or every namespace if none is given"""
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+
+# Create a singleton instance
+count_cache = CountCache(
+    ttl=int(os.environ.get('COUNT_CACHE_TTL', '30')),
+    max_entries=int(os.environ.get('COUNT_CACHE_MAX_ENTRIES', '1024'))
+)
@@ -1,3 +1,22 @@
+import base64
+import json
+import logging
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import SQLAlchemyError
+
+from .count_cache import count_cache
+
+logger = logging.getLogger(__name__)
+
+# How the total item count of a listing is obtained
+COUNT_EXACT = 'exact'          # SELECT COUNT(*), cached per filter signature
+COUNT_ESTIMATED = 'estimated'  # Planner row estimate (PostgreSQL), exact elsewhere
+COUNT_NONE = 'none'            # No totals; has_next comes from fetching one extra row
+COUNT_STRATEGIES = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE)
+
 class PaginationHelper:
     @staticmethod
     def get_pagination_params():
@@ -26,7 +45,282 @@ class PaginationHelper:
             return 1, 10
     
     @staticmethod
-    def paginate_query(query, model_class, page, per_page):
+    def get_count_strategy():
+        """
+        Get the count strategy from the request object
+        
+        Returns:
+            str: One of COUNT_STRATEGIES, defaulting to COUNT_EXACT
+        """
+        from flask import request
+        
+        strategy = request.args.get('count', COUNT_EXACT).lower()
+        return strategy if strategy in COUNT_STRATEGIES else COUNT_EXACT
+    
+    @staticmethod
+    def estimate_count(query):
+        """
+        Estimate the number of rows a query returns from planner statistics
+        
+        Args:
+            query: SQLAlchemy query object
+            
+        Returns:
+            int or None: Estimated row count, or None if the database cannot estimate
+        """
+        bind = query.session.get_bind()
+        if bind.dialect.name != 'postgresql':
+            return None
+            
+        compiled = query.order_by(None).statement.compile(dialect=bind.dialect)
+        try:
+            row = query.session.connection().exec_driver_sql(
+                f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params
+            ).fetchone()
+            plan = row[0] if not isinstance(row[0], str) else json.loads(row[0])
+            return int(plan[0]['Plan']['Plan Rows'])
+        except (SQLAlchemyError, ValueError, TypeError, KeyError, IndexError) as e:
+            logger.warning(f"Could not estimate row count: {str(e)}")
+            return None
+    
+    @staticmethod
+    def get_cursor_param():
+        """
+        Get the keyset cursor from the request object
+        
+        Returns:
+            str or None: Cursor token ('' requests the first page in cursor mode),
+            or None if the client did not opt in to cursor pagination
+        """
+        from flask import request
+        
+        return request.args.get('cursor')
+    
+    @staticmethod
+    def encode_cursor(item, sort_column, id_column, descending=False):
+        """
+        Build an opaque cursor pointing just past the given item
+        
+        Args:
+            item: Last model instance of the current page
+            sort_column: Model attribute the listing is ordered by
+            id_column: Unique model attribute used as a tie-breaker
+            descending: Whether the listing is in descending order
+            
+        Returns:
+            str: URL-safe cursor token
+        """
+        value = getattr(item, sort_column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+            
+        payload = {
+            's': sort_column.key,
+            'd': bool(descending),
+            'k': value,
+            'i': getattr(item, id_column.key)
+        }
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor, sort_column, id_column, descending=False):
+        """
+        Decode a cursor produced by encode_cursor
+        
+        Args:
+            cursor: Cursor token from the request
+            sort_column: Model attribute the listing is ordered by
+            id_column: Unique model attribute used as a tie-breaker
+            descending: Whether the listing is in descending order
+            
+        Returns:
+            tuple: (sort_value, last_id) - position to seek past
+            
+        Raises:
+            ValueError: If the cursor is malformed or was issued for a different sort
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            sort_key, cursor_desc = payload['s'], payload['d']
+            value, last_id = payload['k'], payload['i']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Malformed cursor")
+            
+        if sort_key != sort_column.key or cursor_desc != bool(descending):
+            raise ValueError("Cursor does not match the requested sort order")
+            
+        # Restore the native types of the position for the seek comparison
+        try:
+            last_id = id_column.type.python_type(last_id)
+            if value is not None:
+                python_type = sort_column.type.python_type
+                if python_type is datetime:
+                    value = datetime.fromisoformat(value)
+                else:
+                    value = python_type(value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValueError("Malformed cursor")
+                
+        return value, last_id
+    
+    @staticmethod
+    def _keyset_page(query, per_page, position, sort_column, id_column, descending, plan):
+        """
+        Fetch the page of rows strictly after a (sort key, id) position
+        
+        Args:
+            position: (sort_value, last_id) to seek past, or None for the start;
+                a last_id of None seeks past every row with that sort value
+            
+        Returns:
+            tuple: (items, has_next) - model instances and whether more rows follow
+        """
+        if position is not None:
+            value, last_id = position
+            
+            if sort_column is id_column:
+                seek = id_column < last_id if descending else id_column > last_id
+            elif last_id is None:
+                seek = sort_column < value if descending else sort_column > value
+            elif descending:
+                seek = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+            else:
+                seek = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+            query = query.filter(seek)
+            
+        # Order by the sort key plus the id tie-breaker so the position is unique
+        query = query.order_by(None)
+        if sort_column is id_column:
+            query = query.order_by(id_column.desc() if descending else id_column.asc())
+        elif descending:
+            query = query.order_by(sort_column.desc(), id_column.desc())
+        else:
+            query = query.order_by(sort_column.asc(), id_column.asc())
+            
+        if plan is not None:
+            query = plan.apply(query)
+            
+        # Fetch one extra row to find out whether another page exists
+        items = query.limit(per_page + 1).all()
+        return items[:per_page], len(items) > per_page
+    
+    @staticmethod
+    def _serialize(items, plan):
+        """Convert items to dictionaries, through the plan if there is one"""
+        if plan is not None:
+            return [plan.serialize(item) for item in items]
+        return [item.to_dict() if hasattr(item, 'to_dict') else item for item in items]
+    
+    @staticmethod
+    def paginate_cursor(query, model_class, per_page, cursor, sort_column, id_column, descending=False, plan=None):
+        """
+        Paginate SQLAlchemy query with keyset (seek) pagination
+        
+        Instead of counting and skipping rows with OFFSET, the query is filtered
+        to rows strictly after the (sort key, id) position encoded in the cursor,
+        so every page costs the same regardless of how deep the client is.
+        
+        Args:
+            query: SQLAlchemy query object (any existing ordering is replaced)
+            model_class: SQLAlchemy model class with to_dict method
+            per_page: Number of items per page
+            cursor: Cursor token from a previous page, or '' for the first page
+            sort_column: Model attribute the listing is ordered by
+            id_column: Unique model attribute used as a tie-breaker
+            descending: Whether the listing is in descending order
+            plan: Optional serialization plan whose loader options are applied
+                before the page is fetched, and which serializes the items
+            
+        Returns:
+            dict: Dictionary with paginated results and cursor metadata
+            
+        Raises:
+            ValueError: If the cursor is malformed or was issued for a different sort
+        """
+        position = None
+        if cursor:
+            position = PaginationHelper.decode_cursor(cursor, sort_column, id_column, descending)
+            
+        items, has_next = PaginationHelper._keyset_page(
+            query, per_page, position, sort_column, id_column, descending, plan
+        )
+        
+        next_cursor = None
+        if has_next:
+            next_cursor = PaginationHelper.encode_cursor(items[-1], sort_column, id_column, descending)
+            
+        result = {
+            'items': PaginationHelper._serialize(items, plan),
+            'pagination': {
+                'per_page': per_page,
+                'cursor': cursor or None,
+                'next_cursor': next_cursor,
+                'has_next': has_next
+            }
+        }
+        
+        return result
+    
+    @staticmethod
+    def paginate_since(query, model_class, per_page, since, sort_column, id_column, plan=None):
+        """
+        Fetch the items that come after a feed position, oldest first
+        
+        Used to poll a listing for new items: the client passes the newest
+        position it has seen and gets only what was added since, then passes
+        next_since back until has_more is false.
+        
+        Args:
+            query: SQLAlchemy query object (any existing ordering is replaced)
+            model_class: SQLAlchemy model class with to_dict method
+            per_page: Maximum number of items to return
+            since: next_since token from a previous response, or an ISO 8601
+                value of sort_column (items strictly after it are returned)
+            sort_column: Model attribute new items are ordered by
+            id_column: Unique model attribute used as a tie-breaker
+            plan: Optional serialization plan whose loader options are applied
+                before the items are fetched, and which serializes the items
+            
+        Returns:
+            dict: Dictionary with the new items and feed position metadata
+            
+        Raises:
+            ValueError: If since is neither a valid token nor an ISO 8601 value
+        """
+        try:
+            value = datetime.fromisoformat(since)
+            if value.tzinfo is not None:
+                # Timestamps are stored as naive UTC
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            position = (value, None)
+        except ValueError:
+            position = PaginationHelper.decode_cursor(since, sort_column, id_column, descending=False)
+            
+        items, has_more = PaginationHelper._keyset_page(
+            query, per_page, position, sort_column, id_column, False, plan
+        )
+        
+        # An empty result leaves the client's position where it was
+        next_since = since
+        if items:
+            next_since = PaginationHelper.encode_cursor(items[-1], sort_column, id_column, descending=False)
+            
+        return {
+            'items': PaginationHelper._serialize(items, plan),
+            'pagination': {
+                'per_page': per_page,
+                'since': since,
+                'next_since': next_since,
+                'has_more': has_more
+            }
+        }
+    
+    @staticmethod
+    def paginate_query(query, model_class, page, per_page, count_strategy=COUNT_EXACT, count_key=None, plan=None):
         """
         Paginate SQLAlchemy query and return standardized response format
         
@@ -35,24 +329,59 @@ class PaginationHelper:
             model_class: SQLAlchemy model class with to_dict method
             page: Current page number (1-indexed)
             per_page: Number of items per page
+            count_strategy: How to obtain the total item count (see COUNT_STRATEGIES)
+            count_key: Optional (namespace, signature) tuple identifying the filtered
+                query in the count cache; exact counts are only cached when given
+            plan: Optional serialization plan whose loader options are applied
+                to the page query (counts run without them), and which
+                serializes the items
             
         Returns:
             dict: Dictionary with paginated results and metadata
         """
         # Ensure page is at least 1
         page = max(1, page)
+        offset = (page - 1) * per_page
+        page_query = plan.apply(query) if plan is not None else query
         
-        # Get total count of items
-        total_items = query.count()
+        if count_strategy == COUNT_EXACT:
+            # Get total count of items
+            if count_key is not None:
+                total_items = count_cache.get_or_compute(count_key[0], count_key[1], query.count)
+            else:
+                total_items = query.count()
+                
+            # Apply pagination to query
+            items = page_query.limit(per_page).offset(offset).all()
+            has_next = offset + len(items) < total_items
+        else:
+            # Fetch one extra row to find out whether another page exists
+            items = page_query.limit(per_page + 1).offset(offset).all()
+            has_next = len(items) > per_page
+            items = items[:per_page]
+            
+            total_items = None
+            if count_strategy == COUNT_ESTIMATED:
+                total_items = PaginationHelper.estimate_count(query)
+                if total_items is None:
+                    # No planner statistics on this database, use the cached exact count
+                    count_strategy = COUNT_EXACT
+                    if count_key is not None:
+                        total_items = count_cache.get_or_compute(count_key[0], count_key[1], query.count)
+                    else:
+                        total_items = query.count()
+                else:
+                    # Never report fewer items than the client has already seen
+                    total_items = max(total_items, offset + len(items) + (1 if has_next else 0))
         
         # Calculate pagination values
-        total_pages = (total_items + per_page - 1) // per_page if per_page > 0 else 1
-        
-        # Apply pagination to query
-        items = query.limit(per_page).offset((page - 1) * per_page).all()
+        if total_items is not None:
+            total_pages = (total_items + per_page - 1) // per_page if per_page > 0 else 1
+        else:
+            total_pages = None
         
         # Convert items to dictionaries
-        items_dict = [item.to_dict() if hasattr(item, 'to_dict') else item for item in items]
+        items_dict = PaginationHelper._serialize(items, plan)
         
         # Build response with items and pagination metadata
         result = {
@@ -62,11 +391,14 @@ class PaginationHelper:
                 'per_page': per_page,
                 'total_items': total_items,
                 'total_pages': total_pages,
-                'has_next': page < total_pages,
+                'has_next': has_next,
                 'has_prev': page > 1
             }
         }
         
+        if count_strategy != COUNT_EXACT:
+            result['pagination']['count'] = count_strategy
+        
         return result
         
     @staticmethod
@@ -0,0 +1,363 @@
+"""
+Bulk product import.
+
+Supplier feeds (CSV with a header row, or newline-delimited JSON) are read as a
+stream and processed in batches of IMPORT_BATCH_SIZE rows. Each batch is
+validated with the same rules as create_product, has its categories resolved
+through the category directory and its SKUs looked up with a single IN query,
+and is then written in one statement: a COPY into a temporary staging table
+followed by INSERT ... SELECT ... ON CONFLICT (sku) DO UPDATE on PostgreSQL, or
+an executemany of the equivalent upsert on SQLite. Rows are upserted by SKU;
+rows without a SKU are always inserted. Each batch is its own transaction, so a
+database error only fails the rows of that batch.
+"""
+import csv
+import io
+import json
+import logging
+from datetime import datetime
+from decimal import Decimal
+
+from ..models import Category, Product, db
+from ..shared.utils.count_cache import count_cache
+from .category_directory import category_directory
+from .http_cache import catalog_version
+from .validators import validate_product_data
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+
+# Columns written for every imported row, in staging/VALUES order
+IMPORT_COLUMNS = (
+    'name', 'description', 'price', 'category_id', 'stock_quantity',
+    'sku', 'image_url', 'created_at', 'updated_at',
+)
+
+# Columns a row may leave out; an existing product keeps its current value
+OPTIONAL_COLUMNS = ('description', 'stock_quantity', 'image_url')
+
+POSTGRES_STAGING_DDL = (
+    "CREATE TEMP TABLE IF NOT EXISTS product_import_stage ("
+    "name varchar(100), description text, price numeric(10, 2), category_id integer, "
+    "stock_quantity integer, sku varchar(50), image_url varchar(255), "
+    "created_at timestamp, updated_at timestamp"
+    ") ON COMMIT DELETE ROWS"
+)
+
+
+def _upsert_clause(excluded):
+    """Build the ON CONFLICT (sku) DO UPDATE clause shared by both dialects"""
+    assignments = []
+    for column in IMPORT_COLUMNS:
+        if column in ('sku', 'created_at'):
+            continue
+        if column in OPTIONAL_COLUMNS:
+            assignments.append(f"{column} = COALESCE({excluded}.{column}, product.{column})")
+        else:
+            assignments.append(f"{column} = {excluded}.{column}")
+    return "ON CONFLICT (sku) DO UPDATE SET " + ', '.join(assignments)
+
+
+POSTGRES_UPSERT = (
+    f"INSERT INTO product ({', '.join(IMPORT_COLUMNS)}) "
+    f"SELECT {', '.join(IMPORT_COLUMNS)} FROM product_import_stage "
+    + _upsert_clause('EXCLUDED')
+)
+
+SQLITE_UPSERT = (
+    f"INSERT INTO product ({', '.join(IMPORT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in IMPORT_COLUMNS)}) "
+    + _upsert_clause('excluded')
+)
+
+
+class ImportReport:
+    """Counts and per-row errors for one import run"""
+
+    def __init__(self, max_errors=None):
+        self.max_errors = max_errors
+        self.processed = 0
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, sku, message):
+        """Record a row that was not imported"""
+        self.failed += 1
+        if self.max_errors is None or len(self.errors) < self.max_errors:
+            self.errors.append({'row': row_number, 'sku': sku, 'error': message})
+
+    def to_dict(self):
+        """Convert report to dictionary"""
+        return {
+            'processed': self.processed,
+            'created': self.created,
+            'updated': self.updated,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def detect_format(filename=None, content_type=None):
+    """
+    Work out the feed format from a file name or content type
+
+    Returns:
+        str or None: 'csv', 'ndjson', or None if it cannot be determined
+    """
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    Read feed rows from a binary stream
+
+    Args:
+        stream: Binary file-like object
+        fmt: 'csv' or 'ndjson'
+
+    Yields:
+        tuple: (row_number, row, error) - the 1-based data row number, the row
+        as a dict (or None), and a parse error message (or None)
+    """
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row_number, row in enumerate(csv.DictReader(text_stream), start=1):
+            # Extra values beyond the header end up under the None key
+            row.pop(None, None)
+            yield row_number, row, None
+        return
+
+    row_number = 0
+    for line in text_stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield row_number, None, f"Invalid JSON: {str(e)}"
+            continue
+        if not isinstance(row, dict):
+            yield row_number, None, "Each line must be a JSON object"
+            continue
+        yield row_number, row, None
+
+
+def _clean_row(row):
+    """Strip whitespace and drop empty values, so blank CSV cells count as missing"""
+    cleaned = {}
+    for key, value in row.items():
+        if key is None:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        cleaned[key.strip()] = value
+    return cleaned
+
+
+def _resolve_category(data):
+    """
+    Fill in category_id from a category name column
+
+    Returns:
+        str: Error message if the named category does not exist, None otherwise
+    """
+    if 'category_id' in data or 'category' not in data:
+        return None
+    category_id = category_directory.id_for(str(data['category']))
+    if category_id is None:
+        return f"Category not found: {data['category']}"
+    data['category_id'] = category_id
+    return None
+
+
+def _unknown_category_ids(category_ids):
+    """Find which category IDs do not exist, with at most one query for directory misses"""
+    missing = {category_id for category_id in category_ids if category_directory.name_for(category_id) is None}
+    if not missing:
+        return missing
+    found = {row[0] for row in db.session.query(Category.id).filter(Category.id.in_(missing)).all()}
+    return missing - found
+
+
+def _prepare_batch(rows, report):
+    """
+    Validate a batch and turn it into a list of prepared rows
+
+    Args:
+        rows: List of (row_number, row, error) tuples from iter_rows
+        report: ImportReport receiving the errors
+
+    Returns:
+        list: (row_number, data) tuples that passed validation, one per SKU
+    """
+    valid = []
+    for row_number, row, error in rows:
+        if error is None:
+            data = _clean_row(row)
+            error = _resolve_category(data) or validate_product_data(data)
+            if error is None:
+                try:
+                    data['category_id'] = int(data['category_id'])
+                except (ValueError, TypeError):
+                    error = "Category ID must be a valid integer"
+        if error is not None:
+            report.add_error(row_number, (row or {}).get('sku'), error)
+            continue
+        if 'sku' in data:
+            data['sku'] = str(data['sku'])
+        valid.append((row_number, data))
+
+    unknown = _unknown_category_ids({data['category_id'] for _, data in valid})
+    if unknown:
+        kept = []
+        for row_number, data in valid:
+            if data['category_id'] in unknown:
+                report.add_error(row_number, data.get('sku'), "Category not found")
+            else:
+                kept.append((row_number, data))
+        valid = kept
+
+    # A SKU can only be written once per statement; the last row for it wins
+    last_row_for_sku = {data['sku']: row_number for row_number, data in valid if 'sku' in data}
+    deduplicated = []
+    for row_number, data in valid:
+        sku = data.get('sku')
+        if sku is not None and last_row_for_sku[sku] != row_number:
+            report.add_error(row_number, sku, f"Superseded by row {last_row_for_sku[sku]} with the same SKU")
+            continue
+        deduplicated.append((row_number, data))
+    return deduplicated
+
+
+def _existing_skus(skus):
+    """Look up which SKUs already exist with a single IN query"""
+    if not skus:
+        return set()
+    rows = db.session.query(Product.sku).filter(Product.sku.in_(skus)).all()
+    return {row[0] for row in rows}
+
+
+def _row_values(data, exists, now):
+    """Build the IMPORT_COLUMNS tuple for a validated row"""
+    stock = data.get('stock_quantity')
+    if stock is not None:
+        stock = int(stock)
+    elif not exists:
+        stock = 0
+    timestamp = now.isoformat(sep=' ')
+    return (
+        data['name'],
+        data.get('description'),
+        str(Decimal(str(data['price']))),
+        data['category_id'],
+        stock,
+        data.get('sku'),
+        data.get('image_url'),
+        timestamp,
+        timestamp,
+    )
+
+
+def _write_postgres(connection, values):
+    """COPY the batch into the staging table, then upsert it into product"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in values:
+        # Unquoted empty fields are NULL in COPY's CSV format
+        writer.writerow(['' if value is None else value for value in row])
+    buffer.seek(0)
+
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(POSTGRES_STAGING_DDL)
+        cursor.copy_expert(
+            f"COPY product_import_stage ({', '.join(IMPORT_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+        cursor.execute(POSTGRES_UPSERT)
+    finally:
+        cursor.close()
+
+
+def _write_sqlite(connection, values):
+    """Upsert the batch with a single executemany"""
+    connection.exec_driver_sql(SQLITE_UPSERT, values)
+
+
+def _write_batch(batch, report):
+    """Write one validated batch in its own transaction"""
+    existing = _existing_skus([data['sku'] for _, data in batch if 'sku' in data])
+    now = datetime.utcnow()
+    values = [_row_values(data, data.get('sku') in existing, now) for _, data in batch]
+
+    try:
+        connection = db.session.connection()
+        if connection.dialect.name == 'postgresql':
+            _write_postgres(connection, values)
+        else:
+            _write_sqlite(connection, values)
+        catalog_version.bump()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error writing import batch of {len(batch)} rows: {str(e)}")
+        for row_number, data in batch:
+            report.add_error(row_number, data.get('sku'), f"Database error: {str(e)}")
+        return
+
+    updated = sum(1 for _, data in batch if data.get('sku') in existing)
+    report.updated += updated
+    report.created += len(batch) - updated
+
+
+def import_products(rows, batch_size=1000, max_errors=None):
+    """
+    Validate and upsert products from an iterable of feed rows
+
+    Args:
+        rows: Iterable of (row_number, row, error) tuples, as from iter_rows
+        batch_size: Number of rows validated and written together
+        max_errors: Maximum number of row errors kept in the report (None for all)
+
+    Returns:
+        ImportReport: Counts of created, updated and failed rows with per-row errors
+    """
+    report = ImportReport(max_errors=max_errors)
+    batch = []
+    written = False
+
+    def flush():
+        nonlocal written
+        prepared = _prepare_batch(batch, report)
+        if prepared:
+            _write_batch(prepared, report)
+            written = True
+        batch.clear()
+
+    for row in rows:
+        batch.append(row)
+        report.processed += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    if written:
+        count_cache.invalidate('products')
+        count_cache.invalidate('product_facets')
+    logger.info(f"Product import finished: {report.processed} rows, {report.created} created, "
+                f"{report.updated} updated, {report.failed} failed")
+    return report
@@ -0,0 +1,96 @@
+"""
+In-process directory of categories.
+
+The category table is small and rarely written, so each worker keeps an
+id -> name and lowercased name -> id map instead of querying it for every
+product listing and lazily loading the category of every serialized product.
+The directory is loaded on first use, refreshed after CATEGORY_DIRECTORY_TTL
+seconds, reloaded immediately when this worker writes a category, and reloaded
+on a lookup miss (at most every few seconds) to pick up other workers' writes.
+"""
+import logging
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between reloads triggered by lookups of unknown categories
+MISS_RELOAD_INTERVAL = 5
+
+
+class CategoryDirectory:
+    """Cached id <-> name lookups for categories"""
+
+    def __init__(self):
+        self._names_by_id = {}
+        self._ids_by_name = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load every category from the database, replacing the current maps"""
+        from ..models import Category, db
+
+        rows = db.session.query(Category.id, Category.name).all()
+        names_by_id = {category_id: name for category_id, name in rows}
+        ids_by_name = {name.lower(): category_id for category_id, name in rows}
+
+        with self._lock:
+            self._names_by_id = names_by_id
+            self._ids_by_name = ids_by_name
+            self._loaded_at = time.monotonic()
+        logger.debug(f"Loaded {len(rows)} categories into the category directory")
+
+    def invalidate(self):
+        """Force a reload on the next lookup"""
+        with self._lock:
+            self._loaded_at = None
+
+    def _refresh(self, missed=False):
+        """Reload if the directory was never loaded, has expired, or missed a lookup"""
+        loaded_at = self._loaded_at
+        if loaded_at is not None:
+            age = time.monotonic() - loaded_at
+            ttl = current_app.config.get('CATEGORY_DIRECTORY_TTL', 300)
+            if age < ttl and not (missed and age >= MISS_RELOAD_INTERVAL):
+                return False
+        try:
+            self.load()
+            return True
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not load category directory: {str(e)}")
+            return False
+
+    def id_for(self, name):
+        """
+        Look up a category ID by name (case-insensitive)
+
+        Returns:
+            int or None: Category ID, or None if no category has this name
+        """
+        key = name.strip().lower()
+        self._refresh()
+        category_id = self._ids_by_name.get(key)
+        if category_id is None and self._refresh(missed=True):
+            category_id = self._ids_by_name.get(key)
+        return category_id
+
+    def name_for(self, category_id):
+        """
+        Look up a category name by ID
+
+        Returns:
+            str or None: Category name, or None if the category does not exist
+        """
+        self._refresh()
+        name = self._names_by_id.get(category_id)
+        if name is None and self._refresh(missed=True):
+            name = self._names_by_id.get(category_id)
+        return name
+
+
+# Create a singleton instance
+category_directory = CategoryDirectory()
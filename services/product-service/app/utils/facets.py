@@ -0,0 +1,106 @@
+"""
+Facet counts for product listings.
+
+All requested facets are computed from one grouped query over the filtered
+product query (GROUP BY category and price bucket), then folded into one count
+list per facet. Without a search term the filter space is small, so results are
+cached per filter signature in the count cache alongside listing totals.
+"""
+from sqlalchemy import case, func, literal_column
+
+from ..models import Product
+from ..shared.utils.count_cache import count_cache
+from .category_directory import category_directory
+
+SUPPORTED_FACETS = ('category', 'price')
+
+# Lower bounds of the price buckets; the last bucket is open-ended
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000)
+
+
+def parse_facets(raw):
+    """
+    Parse the ?facets= parameter
+
+    Args:
+        raw: Comma-separated facet names
+
+    Returns:
+        list: Supported facet names in request order, without duplicates
+    """
+    names = [name.strip().lower() for name in (raw or '').split(',')]
+    return [name for name in dict.fromkeys(names) if name in SUPPORTED_FACETS]
+
+
+def _price_bucket_label(index):
+    lower = PRICE_BUCKETS[index]
+    if index + 1 < len(PRICE_BUCKETS):
+        return f"{lower}-{PRICE_BUCKETS[index + 1]}"
+    return f"{lower}+"
+
+
+def _grouped_counts(query):
+    """Count the query's products per (category, price bucket) in one query"""
+    bucket = case(
+        *[(Product.price < upper, index) for index, upper in enumerate(PRICE_BUCKETS[1:])],
+        else_=len(PRICE_BUCKETS) - 1
+    ).label('price_bucket')
+
+    rows = (
+        query.order_by(None)
+        .with_entities(Product.category_id, bucket, func.count(Product.id))
+        .group_by(Product.category_id, literal_column('price_bucket'))
+        .all()
+    )
+    return [(category_id, bucket_index, count) for category_id, bucket_index, count in rows]
+
+
+def compute_facets(query, facets, cache_signature=None):
+    """
+    Compute facet counts for a filtered product query
+
+    Args:
+        query: Filtered (unpaginated) Product query
+        facets: Facet names from parse_facets
+        cache_signature: Hashable filter signature to cache the grouped counts
+            under, or None to always query
+
+    Returns:
+        dict: Count lists keyed by facet name
+    """
+    if not facets:
+        return {}
+
+    if cache_signature is not None:
+        rows = count_cache.get_or_compute('product_facets', cache_signature, lambda: _grouped_counts(query))
+    else:
+        rows = _grouped_counts(query)
+
+    result = {}
+    if 'category' in facets:
+        by_category = {}
+        for category_id, _, count in rows:
+            by_category[category_id] = by_category.get(category_id, 0) + count
+        result['category'] = sorted(
+            (
+                {'id': category_id, 'name': category_directory.name_for(category_id), 'count': count}
+                for category_id, count in by_category.items()
+            ),
+            key=lambda entry: (-entry['count'], entry['name'] or '')
+        )
+
+    if 'price' in facets:
+        by_bucket = [0] * len(PRICE_BUCKETS)
+        for _, bucket_index, count in rows:
+            by_bucket[bucket_index] += count
+        result['price'] = [
+            {
+                'label': _price_bucket_label(index),
+                'min': PRICE_BUCKETS[index],
+                'max': PRICE_BUCKETS[index + 1] if index + 1 < len(PRICE_BUCKETS) else None,
+                'count': by_bucket[index]
+            }
+            for index in range(len(PRICE_BUCKETS))
+        ]
+
+    return result
@@ -0,0 +1,120 @@
+"""
+HTTP conditional caching for catalog reads.
+
+Every product, category and review write bumps a catalog-wide version number
+(stored in the catalog_version table, in the same transaction as the write).
+Catalog GET responses carry a strong ETag derived from that version and the
+request URL, so a client or CDN revalidating with If-None-Match gets a 304
+without the endpoint querying or serializing anything. Each worker caches the
+version for CATALOG_VERSION_TTL seconds, which bounds how long another worker's
+write can go unnoticed.
+
+Stock movements from orders and holds are not catalog writes: they do not bump
+the version (see utils.stock), so cached responses can carry an older
+stock_quantity.
+"""
+import hashlib
+import logging
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import CatalogVersion, db
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogVersionTracker:
+    """Per-process cache of the catalog version"""
+
+    def __init__(self):
+        self._version = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self):
+        """
+        Get the catalog version, reading it from the database at most once per TTL
+
+        Returns:
+            int or None: Catalog version, or None if it cannot be read
+        """
+        ttl = current_app.config.get('CATALOG_VERSION_TTL', 1.0)
+        now = time.monotonic()
+        with self._lock:
+            if self._version is not None and now - self._fetched_at < ttl:
+                return self._version
+
+        try:
+            row = db.session.query(CatalogVersion.version).filter(CatalogVersion.id == 1).first()
+        except SQLAlchemyError as e:
+            logger.warning(f"Could not read catalog version: {str(e)}")
+            return None
+        version = row[0] if row else 0
+
+        with self._lock:
+            self._version = version
+            self._fetched_at = now
+        return version
+
+    def bump(self):
+        """
+        Increment the catalog version in the current transaction
+
+        Call before committing a catalog write; the new version becomes visible
+        to other workers when the transaction commits.
+        """
+        updated = db.session.query(CatalogVersion).filter(CatalogVersion.id == 1).update(
+            {CatalogVersion.version: CatalogVersion.version + 1}, synchronize_session=False
+        )
+        if not updated:
+            db.session.add(CatalogVersion(id=1, version=1))
+        self.invalidate()
+
+    def invalidate(self):
+        """Forget the cached version so the next read goes to the database"""
+        with self._lock:
+            self._version = None
+
+
+# Create a singleton instance
+catalog_version = CatalogVersionTracker()
+
+
+def catalog_etag(version):
+    """Build the ETag for the current request URL at a catalog version"""
+    digest = hashlib.sha1(f"{version}:{request.full_path}".encode('utf-8')).hexdigest()
+    return f"v{version}-{digest[:16]}"
+
+
+def conditional_get(f):
+    """
+    Decorator adding ETag/Cache-Control to catalog GETs and answering
+    matching If-None-Match requests with 304 before the endpoint runs
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method != 'GET':
+            return f(*args, **kwargs)
+
+        version = catalog_version.current()
+        if version is None:
+            return f(*args, **kwargs)
+
+        etag = catalog_etag(version)
+        cache_control = f"public, max-age={current_app.config.get('CATALOG_CACHE_MAX_AGE', 0)}, must-revalidate"
+
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = cache_control
+        return response
+    return decorated_function
@@ -0,0 +1,258 @@
+"""
+Background processing of product images.
+
+Product writes no longer talk to the image store inside the request: the upload
+is written to a local spool directory, a ProductImageJob is queued in the same
+transaction as the product, and the product is returned with image_status
+'pending'. A worker then uploads the spooled file, points the product at the new
+image, and queues deletion of the image it replaced. Failed jobs are retried
+with exponential backoff up to IMAGE_JOB_MAX_ATTEMPTS times.
+
+The worker runs as a thread in each service process (IMAGE_WORKER_THREAD) and
+can also be run on its own with `flask process-images`. Jobs are claimed with a
+conditional UPDATE, so any number of workers can poll the same table.
+"""
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from werkzeug.utils import secure_filename
+
+from ..models import Product, ProductImageJob, db
+from .http_cache import catalog_version
+from .image_storage import get_image_storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FOLDER = 'products'
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+def spool_upload(image_file):
+    """
+    Write an uploaded file to the spool directory
+
+    Args:
+        image_file: werkzeug FileStorage from the request
+
+    Returns:
+        str: Path of the spooled file
+    """
+    spool_dir = current_app.config['IMAGE_SPOOL_DIR']
+    os.makedirs(spool_dir, exist_ok=True)
+    extension = os.path.splitext(secure_filename(image_file.filename or ''))[1].lower()
+    path = os.path.join(spool_dir, uuid.uuid4().hex + extension)
+    image_file.save(path)
+    return path
+
+
+def discard_spool(path):
+    """Remove a spooled file, ignoring files that are already gone"""
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove spooled image {path}: {str(e)}")
+
+
+def enqueue_upload(product, spool_path):
+    """
+    Queue the upload of a spooled image for a product in the current transaction
+
+    Sets the product's image_status to 'pending'; the product must have an ID
+    (flush it first if it is new).
+    """
+    product.image_status = STATUS_PENDING
+    db.session.add(ProductImageJob(product_id=product.id, action='upload', spool_path=spool_path))
+
+
+def enqueue_delete(public_id, product_id=None):
+    """Queue deletion of a stored image in the current transaction"""
+    if public_id:
+        db.session.add(ProductImageJob(product_id=product_id, action='delete', public_id=public_id))
+
+
+def legacy_public_id(image_url):
+    """Derive the Cloudinary public ID of an image stored before public IDs were recorded"""
+    if image_url and 'cloudinary' in image_url:
+        return image_url.split('/')[-1].split('.')[0]
+    return None
+
+
+def _claim(job_id):
+    """
+    Atomically take a due job, or a processing job whose worker stopped renewing it
+
+    Returns:
+        bool: True if this worker now owns the job
+    """
+    now = datetime.utcnow()
+    lease_expired = now - timedelta(seconds=current_app.config.get('IMAGE_JOB_LEASE', 300))
+    claimed = db.session.query(ProductImageJob).filter(
+        ProductImageJob.id == job_id,
+        or_(
+            ProductImageJob.status == STATUS_PENDING,
+            and_(ProductImageJob.status == STATUS_PROCESSING, ProductImageJob.locked_at < lease_expired)
+        )
+    ).update({
+        ProductImageJob.status: STATUS_PROCESSING,
+        ProductImageJob.locked_at: now,
+        ProductImageJob.attempts: ProductImageJob.attempts + 1,
+    }, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+
+def _run_upload(job, storage):
+    """Upload a spooled image and point the product at it"""
+    if not job.spool_path or not os.path.exists(job.spool_path):
+        raise FileNotFoundError(f"Spooled image {job.spool_path} is missing")
+
+    product = Product.query.get(job.product_id)
+    newer = ProductImageJob.query.filter(
+        ProductImageJob.product_id == job.product_id,
+        ProductImageJob.action == 'upload',
+        ProductImageJob.id > job.id
+    ).first()
+    if product is None or newer is not None:
+        # The product was deleted or has a newer image queued; this one is moot
+        logger.info(f"Skipping superseded image upload job {job.id}")
+        return
+
+    result = storage.upload_file(job.spool_path, folder=IMAGE_FOLDER)
+    replaced = product.image_public_id or legacy_public_id(product.image_url)
+
+    product.image_url = result['url']
+    product.image_public_id = result['public_id']
+    product.image_status = None
+    if replaced and replaced != result['public_id']:
+        enqueue_delete(replaced, product_id=product.id)
+    catalog_version.bump()
+
+
+def _run_delete(job, storage):
+    """Delete an image that is no longer referenced"""
+    storage.delete_file(job.public_id)
+
+
+def _fail(job, error):
+    """Schedule a retry with exponential backoff, or give up after the last attempt"""
+    db.session.rollback()
+    job = ProductImageJob.query.get(job.id)
+    job.last_error = str(error)
+    job.locked_at = None
+    max_attempts = current_app.config.get('IMAGE_JOB_MAX_ATTEMPTS', 5)
+    if job.attempts >= max_attempts:
+        job.status = STATUS_FAILED
+        logger.error(f"Image job {job.id} ({job.action}) failed after {job.attempts} attempts: {str(error)}")
+        if job.action == 'upload':
+            product = Product.query.get(job.product_id) if job.product_id else None
+            if product is not None and product.image_status == STATUS_PENDING:
+                product.image_status = STATUS_FAILED
+                catalog_version.bump()
+            discard_spool(job.spool_path)
+    else:
+        delay = current_app.config.get('IMAGE_JOB_RETRY_DELAY', 5) * 2 ** (job.attempts - 1)
+        job.status = STATUS_PENDING
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        logger.warning(f"Image job {job.id} ({job.action}) attempt {job.attempts} failed, "
+                       f"retrying in {delay}s: {str(error)}")
+    db.session.commit()
+
+
+def process_job(job_id, storage=None):
+    """
+    Claim and run one image job
+
+    Returns:
+        bool: True if the job was claimed by this worker
+    """
+    if not _claim(job_id):
+        return False
+    job = ProductImageJob.query.get(job_id)
+    storage = storage or get_image_storage()
+    try:
+        if job.action == 'upload':
+            _run_upload(job, storage)
+        else:
+            _run_delete(job, storage)
+        job.status = STATUS_DONE
+        job.locked_at = None
+        job.last_error = None
+        db.session.commit()
+    except Exception as e:
+        _fail(job, e)
+        return True
+
+    if job.action == 'upload':
+        discard_spool(job.spool_path)
+    return True
+
+
+def process_pending_jobs(limit=50):
+    """
+    Run the image jobs that are due, oldest first
+
+    Returns:
+        int: Number of jobs processed
+    """
+    now = datetime.utcnow()
+    job_ids = [row[0] for row in db.session.query(ProductImageJob.id).filter(
+        ProductImageJob.status.in_((STATUS_PENDING, STATUS_PROCESSING)),
+        ProductImageJob.next_attempt_at <= now
+    ).order_by(ProductImageJob.next_attempt_at, ProductImageJob.id).limit(limit).all()]
+    db.session.commit()
+
+    storage = get_image_storage() if job_ids else None
+    return sum(1 for job_id in job_ids if process_job(job_id, storage))
+
+
+class ImageWorker:
+    """Background thread that processes image jobs for one app"""
+
+    def __init__(self):
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Start the worker thread for an app (once per process)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='image-worker', daemon=True)
+            self._thread.start()
+        logger.info("Image worker started")
+
+    def notify(self):
+        """Wake the worker up because a job was just queued"""
+        self._wakeup.set()
+
+    def _run(self, app):
+        interval = app.config.get('IMAGE_WORKER_POLL_INTERVAL', 5)
+        while True:
+            self._wakeup.wait(interval)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    while process_pending_jobs():
+                        pass
+                except Exception as e:
+                    logger.error(f"Image worker error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+# Create a singleton instance
+image_worker = ImageWorker()
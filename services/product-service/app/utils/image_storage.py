@@ -0,0 +1,120 @@
+"""
+Storage backends for product images.
+
+The image worker stores uploads through one of these backends, chosen with
+IMAGE_STORAGE_BACKEND: 'local' keeps files under IMAGE_STORAGE_DIR and serves
+them from the product service (the default, and the stand-in for Cloudinary in
+development), 'cloudinary' uploads to Cloudinary with the CLOUDINARY_*
+credentials. Both return the same {'url', 'public_id'} shape.
+"""
+import logging
+import os
+import shutil
+import uuid
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+
+class LocalImageStorage:
+    """Stores images on the local filesystem"""
+
+    def __init__(self, root, base_url):
+        """
+        Args:
+            root: Directory images are written to
+            base_url: URL prefix the files under root are served from
+        """
+        self.root = root
+        self.base_url = base_url.rstrip('/')
+
+    def upload_file(self, path, folder=None):
+        """
+        Copy a spooled file into storage
+
+        Returns:
+            dict: 'url' and 'public_id' of the stored image
+        """
+        extension = os.path.splitext(path)[1].lower()
+        public_id = f"{folder}/{uuid.uuid4().hex}" if folder else uuid.uuid4().hex
+        target = os.path.join(self.root, public_id + extension)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(path, target)
+        return {
+            'url': f"{self.base_url}/{public_id}{extension}",
+            'public_id': public_id + extension
+        }
+
+    def delete_file(self, public_id):
+        """
+        Delete a stored image
+
+        Returns:
+            bool: True if the image existed
+        """
+        path = os.path.realpath(os.path.join(self.root, public_id))
+        if not path.startswith(os.path.realpath(self.root) + os.sep):
+            raise ValueError(f"Invalid image ID: {public_id}")
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+class CloudinaryImageStorage:
+    """Stores images in Cloudinary"""
+
+    def __init__(self):
+        import cloudinary
+
+        cloudinary.config(
+            cloud_name=os.getenv('CLOUDINARY_CLOUD_NAME'),
+            api_key=os.getenv('CLOUDINARY_API_KEY'),
+            api_secret=os.getenv('CLOUDINARY_API_SECRET')
+        )
+
+    def upload_file(self, path, folder=None):
+        """
+        Upload a spooled file to Cloudinary
+
+        Returns:
+            dict: 'url' and 'public_id' of the uploaded image
+        """
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(path, resource_type='auto', folder=folder)
+        return {'url': result['secure_url'], 'public_id': result['public_id']}
+
+    def delete_file(self, public_id):
+        """
+        Delete an image from Cloudinary
+
+        Returns:
+            bool: True if Cloudinary deleted the image
+        """
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.destroy(public_id)
+        if result.get('result') not in ('ok', 'not found'):
+            raise RuntimeError(f"Cloudinary could not delete {public_id}: {result}")
+        return result.get('result') == 'ok'
+
+
+def get_image_storage():
+    """
+    Build the storage backend configured for the current app
+
+    Returns:
+        LocalImageStorage or CloudinaryImageStorage
+    """
+    backend = current_app.config.get('IMAGE_STORAGE_BACKEND', 'local')
+    if backend == 'cloudinary':
+        return CloudinaryImageStorage()
+    if backend != 'local':
+        logger.warning(f"Unknown IMAGE_STORAGE_BACKEND '{backend}', using local storage")
+    return LocalImageStorage(
+        current_app.config['IMAGE_STORAGE_DIR'],
+        current_app.config.get('IMAGE_BASE_URL', '/api/v1/products/images')
+    )
@@ -0,0 +1,62 @@
+"""
+Per-endpoint SQL query budgets.
+
+Endpoints declare how many statements they may issue with @query_budget(n).
+When ENFORCE_QUERY_BUDGETS (or TESTING) is enabled, every statement executed
+during a request is counted and a request that goes over its budget fails with
+QueryBudgetExceeded, which makes N+1 regressions show up as test failures.
+Outside of those modes the budget is only reported, alongside the measured
+query count, by the SQL instrumentation (/debug/sql-stats).
+"""
+from functools import wraps
+
+from flask import current_app, g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised when an endpoint issues more SQL statements than its budget"""
+
+
+def budgets_enforced():
+    """Check whether query budgets are enforced for the current app"""
+    return bool(current_app.config.get('ENFORCE_QUERY_BUDGETS') or current_app.config.get('TESTING'))
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count statements executed while a budgeted endpoint is running"""
+    if has_request_context() and getattr(g, '_query_budget_count', None) is not None:
+        g._query_budget_count += 1
+
+
+def query_budget(max_queries):
+    """
+    Decorator declaring the maximum number of SQL statements an endpoint may issue
+
+    Args:
+        max_queries: Statement budget for a single request
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            # Reported per endpoint by the SQL instrumentation, enforced or not
+            g.query_budget = max_queries
+            if not budgets_enforced():
+                return f(*args, **kwargs)
+
+            g._query_budget_count = 0
+            try:
+                response = f(*args, **kwargs)
+                used = g._query_budget_count
+            finally:
+                g._query_budget_count = None
+
+            if used > max_queries:
+                raise QueryBudgetExceeded(
+                    f"{f.__name__} issued {used} queries (budget {max_queries})"
+                )
+            return response
+        return decorated_function
+    return decorator
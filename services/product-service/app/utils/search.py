@@ -0,0 +1,218 @@
+"""
+Full-text product search.
+
+On PostgreSQL products carry a generated ``search_vector`` tsvector column
+(name weighted above description) with a GIN index; on the SQLite fallback an
+external-content FTS5 table ``product_fts`` is kept in sync by triggers. Both are
+maintained by the database on every write, so searches use the index instead of
+scanning the catalog with ILIKE. Databases without the search structures keep
+the ILIKE behaviour until ``flask init-search-index`` is run; workers notice the
+new index within SEARCH_INDEX_RECHECK_SECONDS without a restart.
+
+The structures are not part of the models, so migrations/env.py passes
+``include_object`` to Alembic to keep autogenerate from dropping them.
+"""
+import logging
+import os
+import re
+import threading
+import time
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, and_, event, func, literal_column, or_, select, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..models import Product
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONFIG = 'english'
+
+POSTGRES_DDL = [
+    "ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    "GENERATED ALWAYS AS ("
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')"
+    ") STORED",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING GIN (search_vector)",
+]
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "name, description, content='product', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, description ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO product_fts(rowid, name, description) VALUES (new.id, new.name, new.description); "
+    "END",
+]
+
+# Lightweight description of the FTS5 table for building queries. It lives in its
+# own MetaData so db.create_all() never tries to create it as a regular table.
+product_fts = Table(
+    'product_fts', MetaData(),
+    Column('rowid', Integer),
+    Column('name', Text),
+    Column('description', Text),
+    Column('rank', Text),
+)
+
+# Engines (by URL) whose search structures have been checked, with the result
+# and when it expires: a found index is kept for good, a missing one is looked
+# for again after SEARCH_INDEX_RECHECK_SECONDS
+SEARCH_INDEX_RECHECK_SECONDS = int(os.environ.get('SEARCH_INDEX_RECHECK_SECONDS', '60'))
+_index_available = {}
+_index_lock = threading.Lock()
+
+
+def tokenize(term):
+    """Split a search term into word tokens, dropping query-syntax characters"""
+    return re.findall(r'\w+', term.lower())
+
+
+def ensure_search_index(connection, rebuild=False):
+    """
+    Create the full-text search structures for the connection's dialect
+
+    Args:
+        connection: SQLAlchemy connection (inside a transaction)
+        rebuild: Re-index existing rows (only needed for SQLite FTS5; the
+            PostgreSQL generated column is populated when it is added)
+
+    Returns:
+        bool: True if the dialect supports full-text search
+    """
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        statements = POSTGRES_DDL
+    elif dialect == 'sqlite':
+        statements = SQLITE_DDL
+        if rebuild:
+            statements = statements + ["INSERT INTO product_fts(product_fts) VALUES ('rebuild')"]
+    else:
+        logger.warning(f"Full-text search is not supported on {dialect}")
+        return False
+
+    for statement in statements:
+        connection.exec_driver_sql(statement)
+
+    with _index_lock:
+        _index_available[str(connection.engine.url)] = (True, None)
+    return True
+
+
+@event.listens_for(Product.__table__, 'after_create')
+def _create_search_index(target, connection, **kw):
+    """Set up the search structures whenever db.create_all() creates the product table"""
+    ensure_search_index(connection)
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """
+    Alembic include_object hook leaving the search structures out of
+    autogenerate, which would otherwise drop them as unknown to the models
+    """
+    if type_ == 'column' and name == 'search_vector' and object.table.name == Product.__tablename__:
+        return False
+    if type_ == 'index' and name == 'ix_product_search_vector':
+        return False
+    # product_fts and the shadow tables FTS5 keeps next to it
+    if type_ == 'table' and name.startswith('product_fts'):
+        return False
+    return True
+
+
+def search_index_available(session):
+    """
+    Check whether the full-text search structures exist
+
+    A found index is remembered per engine; a missing one is checked again
+    after SEARCH_INDEX_RECHECK_SECONDS, so workers pick up an index created
+    later with ``flask init-search-index``.
+
+    Returns:
+        bool: True if queries can use the full-text index
+    """
+    engine = session.get_bind()
+    key = str(engine.url)
+    cached = _index_available.get(key)
+    if cached is not None and (cached[1] is None or cached[1] > time.monotonic()):
+        return cached[0]
+
+    available = False
+    try:
+        if engine.dialect.name == 'postgresql':
+            available = session.execute(text(
+                "SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'product' AND column_name = 'search_vector'"
+            )).first() is not None
+        elif engine.dialect.name == 'sqlite':
+            available = session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'product_fts'"
+            )).first() is not None
+    except SQLAlchemyError as e:
+        logger.warning(f"Could not check for the search index: {str(e)}")
+
+    if not available:
+        logger.warning("Full-text search index not found, falling back to ILIKE search. "
+                       "Run 'flask init-search-index' to create it.")
+    with _index_lock:
+        _index_available[key] = (available, None if available else time.monotonic() + SEARCH_INDEX_RECHECK_SECONDS)
+    return available
+
+
+def apply_search(query, term):
+    """
+    Filter a Product query to rows matching a search term
+
+    Every word of the term must match, each also as a prefix so results stay
+    useful while the user is still typing.
+
+    Args:
+        query: SQLAlchemy Product query
+        term: Raw search term from the request
+
+    Returns:
+        tuple: (query, relevance) - filtered query and an expression to order
+        by for best matches first, or None if relevance is not available
+    """
+    tokens = tokenize(term)
+    if not tokens:
+        return query, None
+
+    search_term = f'%{term}%'
+    ilike_match = or_(
+        Product.name.ilike(search_term),
+        Product.description.ilike(search_term)
+    )
+    session = query.session
+    if not search_index_available(session):
+        return query.filter(ilike_match), None
+
+    if session.get_bind().dialect.name == 'postgresql':
+        search_vector = literal_column('product.search_vector')
+        ts_query = func.to_tsquery(SEARCH_CONFIG, ' & '.join(f"{token}:*" for token in tokens))
+        # A term made only of stopwords ("the", "and") gives an empty tsquery,
+        # which matches nothing; search those with ILIKE instead
+        query = query.filter(or_(
+            search_vector.op('@@')(ts_query),
+            and_(func.numnode(ts_query) == 0, ilike_match)
+        ))
+        return query, func.ts_rank_cd(search_vector, ts_query).desc()
+
+    # SQLite FTS5: quoted prefix terms are implicitly ANDed
+    fts_query = ' '.join(f'"{token}"*' for token in tokens)
+    matches = (
+        select(product_fts.c.rowid.label('product_id'), product_fts.c.rank.label('rank'))
+        .where(literal_column('product_fts').op('MATCH')(fts_query))
+        .subquery()
+    )
+    query = query.join(matches, matches.c.product_id == Product.id)
+    # FTS5 rank is bm25, where lower values are better matches
+    return query, matches.c.rank.asc()
@@ -0,0 +1,118 @@
+"""
+Serialization plans for product-service responses.
+
+Each plan declares what a response's to_dict() calls need from the database, and
+applies the matching eager-loading options to a query before it executes, so a
+page of results is loaded in a fixed number of queries instead of one lazy load
+per row.
+
+Plans for models with a field registry (PRODUCT_FIELDS, REVIEW_FIELDS) can be
+narrowed to a ?fields= subset: the query then loads only the columns those
+fields read and the response serializes only those fields.
+"""
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from ..models import Category, Product, Review, PRODUCT_FIELDS, REVIEW_FIELDS
+
+
+class SerializationPlan:
+    """Loader options required to serialize a model without lazy loads"""
+
+    def __init__(self, model, joined=(), selectin=(), columns=None, field_registry=None, fields=None):
+        """
+        Args:
+            model: SQLAlchemy model class the plan serializes
+            joined: Names of many-to-one relationships to load in the same query (JOIN)
+            selectin: Names of collections to load with one extra IN query per page
+            columns: Names of the columns to load (all columns if None)
+            field_registry: The model's serialized fields (name -> (columns, getter))
+            fields: Names of the fields to serialize (all fields if None)
+        """
+        self.model = model
+        self.joined = tuple(joined)
+        self.selectin = tuple(selectin)
+        self.columns = tuple(columns) if columns else None
+        self.field_registry = field_registry
+        self.fields = tuple(fields) if fields else None
+
+    def parse_fields(self, raw):
+        """
+        Parse a comma-separated ?fields= value
+
+        Args:
+            raw: Raw parameter value, or None if the parameter was not sent
+
+        Returns:
+            tuple or None: Requested field names (always including 'id'), or
+            None to serialize every field
+
+        Raises:
+            ValueError: If a requested field does not exist
+        """
+        if not raw or self.field_registry is None:
+            return None
+        fields = ['id']
+        for name in raw.split(','):
+            name = name.strip()
+            if not name or name in fields:
+                continue
+            if name not in self.field_registry:
+                raise ValueError(f"Unknown field '{name}'. Available fields: {', '.join(self.field_registry)}")
+            fields.append(name)
+        return tuple(fields)
+
+    def narrow(self, fields, extra_columns=()):
+        """
+        Build a plan that loads and serializes only some fields
+
+        Args:
+            fields: Field names from parse_fields (None keeps this plan)
+            extra_columns: Further columns the caller reads, e.g. a cursor's sort key
+
+        Returns:
+            SerializationPlan: Plan limited to the fields' columns
+        """
+        if fields is None:
+            return self
+        columns = list(self.columns or ())
+        for name in fields:
+            columns.extend(self.field_registry[name][0])
+        columns.extend(extra_columns)
+        return SerializationPlan(
+            self.model, self.joined, self.selectin,
+            columns=dict.fromkeys(columns), field_registry=self.field_registry, fields=fields
+        )
+
+    def options(self):
+        """
+        Build the loader options for this plan
+
+        Returns:
+            list: SQLAlchemy loader options
+        """
+        # Attributes are resolved lazily since backrefs only exist once mappers are configured
+        options = [joinedload(getattr(self.model, name)) for name in self.joined]
+        options += [selectinload(getattr(self.model, name)) for name in self.selectin]
+        if self.columns:
+            options.append(load_only(*[getattr(self.model, name) for name in self.columns]))
+        return options
+
+    def apply(self, query):
+        """Apply the plan's loader options to a query"""
+        options = self.options()
+        return query.options(*options) if options else query
+
+    def serialize(self, item):
+        """Serialize an item loaded with this plan"""
+        if self.fields is not None:
+            return item.to_dict(fields=self.fields)
+        return item.to_dict()
+
+
+# Product.to_dict takes category_name from the category directory and rating
+# fields from columns on the product, so it needs no relationships
+PRODUCT_PLAN = SerializationPlan(Product, field_registry=PRODUCT_FIELDS)
+
+# Category.to_dict and Review.to_dict only read their own columns
+CATEGORY_PLAN = SerializationPlan(Category)
+REVIEW_PLAN = SerializationPlan(Review, field_registry=REVIEW_FIELDS)
@@ -0,0 +1,459 @@
+"""
+Atomic stock reservation and checkout holds.
+
+Orders take stock with one conditional UPDATE per line,
+
+    UPDATE product SET stock_quantity = stock_quantity - :n
+    WHERE id = :id AND stock_quantity - held_quantity >= :n
+
+all in one transaction. The database only decrements a row that still has
+enough available stock, so concurrent checkouts cannot oversell, and no row is
+read and locked before it is written. If any line cannot be satisfied the
+transaction is rolled back and nothing is reserved. Lines are applied in
+product ID order so two orders for the same products always lock their rows in
+the same order. Each reservation is recorded line by line in the
+stock_reservation ledger under a reference chosen by the caller (order-service
+uses the order ID), and only a recorded reservation can be released, once.
+
+Stock movements do not bump the catalog version: that is a single row every
+checkout would queue on, and every order would invalidate every catalog ETag.
+Cached catalog responses can therefore show stock_quantity as of the last
+catalog write; live stock is read from GET /stock.
+
+Checkouts can instead put a time-limited hold on stock. A hold raises the
+product's held_quantity with the same kind of conditional UPDATE and records
+its lines in the stock_hold ledger with an expiry time and the user who placed
+it; one user can only hold a limited number of units at a time. Confirming a
+hold turns it into a stock decrement recorded as a reservation (so it can be
+released like any other), releasing it gives the units back, and the sweeper
+releases expired holds by walking the expires_at index, oldest first, in
+batches. Each of them deletes the ledger rows first and only moves the
+quantities of the rows it actually deleted, so a hold is settled exactly once
+even when a confirm races the sweeper.
+
+Placing, confirming and releasing holds do not bump the catalog version
+either; available stock is read from GET /stock instead of the cached catalog.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from ..models import Product, StockHold, StockReservation, db
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Raised when a reservation cannot be satisfied; nothing was reserved"""
+
+    def __init__(self, shortages, missing):
+        self.shortages = shortages
+        self.missing = missing
+        super().__init__(f"Insufficient stock for products {[item['product_id'] for item in shortages] + missing}")
+
+
+class ReservationExists(Exception):
+    """Raised when a reservation reference is already in use; nothing was reserved"""
+
+
+class ReservationNotFound(Exception):
+    """Raised for a reservation that does not exist or was already released"""
+
+
+class HoldNotFound(Exception):
+    """Raised for a hold that does not exist, has expired or was already settled"""
+
+
+class HoldLimitExceeded(Exception):
+    """Raised when a hold would take a user past the units they may hold at once"""
+
+
+def parse_lines(raw_items, max_lines=None):
+    """
+    Validate reservation lines and merge lines for the same product
+
+    Args:
+        raw_items: List of {"product_id": int, "quantity": int} dicts
+        max_lines: Maximum number of distinct products
+
+    Returns:
+        dict: Quantity per product ID, in the caller's order
+
+    Raises:
+        ValueError: If the lines are malformed
+    """
+    if not isinstance(raw_items, list) or not raw_items:
+        raise ValueError("items must be a non-empty list of {product_id, quantity} objects")
+
+    lines = {}
+    for item in raw_items:
+        if not isinstance(item, dict):
+            raise ValueError("items must be a non-empty list of {product_id, quantity} objects")
+        try:
+            product_id = int(item.get('product_id'))
+            quantity = int(item.get('quantity', 1))
+        except (ValueError, TypeError):
+            raise ValueError("product_id and quantity must be integers")
+        if quantity <= 0:
+            raise ValueError("quantity must be a positive integer")
+        lines[product_id] = lines.get(product_id, 0) + quantity
+
+    if max_lines is not None and len(lines) > max_lines:
+        raise ValueError(f"At most {max_lines} products can be reserved at once")
+    return lines
+
+
+def _available():
+    """SQL expression for a product's stock not taken by holds"""
+    return func.coalesce(Product.stock_quantity, 0) - Product.held_quantity
+
+
+def stock_levels(product_ids):
+    """
+    Get stock, held and available quantities with one query
+
+    Returns:
+        dict: Product ID -> {'stock_quantity', 'held_quantity', 'available_quantity'}
+    """
+    rows = db.session.query(Product.id, Product.stock_quantity, Product.held_quantity).filter(
+        Product.id.in_(list(product_ids))
+    ).all()
+    return {
+        product_id: {
+            'stock_quantity': stock or 0,
+            'held_quantity': held,
+            'available_quantity': (stock or 0) - held,
+        }
+        for product_id, stock, held in rows
+    }
+
+
+def _shortages(lines):
+    """Describe the lines that cannot currently be satisfied, with one query"""
+    levels = stock_levels(lines)
+    shortages = [
+        {'product_id': product_id, 'requested': quantity, 'available': levels[product_id]['available_quantity']}
+        for product_id, quantity in lines.items()
+        if product_id in levels and levels[product_id]['available_quantity'] < quantity
+    ]
+    missing = [product_id for product_id in lines if product_id not in levels]
+    return shortages, missing
+
+
+def _take_available(lines, values):
+    """
+    Apply an UPDATE to every line's product where enough stock is available
+
+    Rolls back and raises InsufficientStock if any line cannot be satisfied.
+
+    Args:
+        lines: Quantity per product ID
+        values: Function of a quantity returning the UPDATE's values
+    """
+    for product_id in sorted(lines):
+        quantity = lines[product_id]
+        updated = db.session.query(Product).filter(
+            Product.id == product_id,
+            _available() >= quantity
+        ).update(values(quantity), synchronize_session=False)
+        if updated != 1:
+            db.session.rollback()
+            shortages, missing = _shortages(lines)
+            if not shortages and not missing:
+                # Stock was restored between the failed UPDATE and the lookup
+                shortages = [{'product_id': product_id, 'requested': quantity, 'available': None}]
+            raise InsufficientStock(shortages, missing)
+
+
+def _record_reservation(reference, lines):
+    """Write a reservation's lines to the ledger in the current transaction"""
+    if db.session.query(StockReservation.id).filter(StockReservation.reference == reference).first():
+        db.session.rollback()
+        raise ReservationExists(f"Reservation {reference} already exists")
+    try:
+        db.session.execute(StockReservation.__table__.insert(), [
+            {'reference': reference, 'product_id': product_id, 'quantity': quantity, 'created_at': datetime.utcnow()}
+            for product_id, quantity in lines.items()
+        ])
+    except IntegrityError:
+        # Recorded concurrently under the same reference
+        db.session.rollback()
+        raise ReservationExists(f"Reservation {reference} already exists")
+
+
+def reserve_stock(lines, reference):
+    """
+    Decrement stock for every line, all or nothing, and commit
+
+    Args:
+        lines: Quantity per product ID (see parse_lines)
+        reference: Caller's unique name for the reservation, used to release it
+
+    Raises:
+        ReservationExists: If the reference is already in use; nothing is reserved
+        InsufficientStock: If any product is missing or short; nothing is reserved
+    """
+    _record_reservation(reference, lines)
+    _take_available(lines, lambda quantity: {Product.stock_quantity: Product.stock_quantity - quantity})
+    db.session.commit()
+    logger.info(f"Reserved stock for {len(lines)} products as {reference}")
+
+
+def release_stock(reference):
+    """
+    Return the stock of a recorded reservation, e.g. when its order was cancelled
+
+    Returns:
+        tuple: (quantity per product ID released, IDs of products that no longer exist)
+
+    Raises:
+        ReservationNotFound: If there is no such reservation or it was already released
+    """
+    rows = db.session.query(StockReservation.product_id, StockReservation.quantity).filter(
+        StockReservation.reference == reference
+    ).all()
+    deleted = db.session.query(StockReservation).filter(
+        StockReservation.reference == reference
+    ).delete(synchronize_session=False) if rows else 0
+    if not rows or deleted != len(rows):
+        # Unknown, or released by someone else since the read
+        db.session.rollback()
+        raise ReservationNotFound(f"Reservation {reference} not found")
+
+    lines = {}
+    for product_id, quantity in rows:
+        lines[product_id] = lines.get(product_id, 0) + quantity
+
+    missing = []
+    for product_id in sorted(lines):
+        updated = db.session.query(Product).filter(Product.id == product_id).update(
+            {Product.stock_quantity: func.coalesce(Product.stock_quantity, 0) + lines[product_id]},
+            synchronize_session=False
+        )
+        if updated != 1:
+            missing.append(product_id)
+
+    db.session.commit()
+    logger.info(f"Released reservation {reference} for {len(lines) - len(missing)} products")
+    return lines, missing
+
+
+def held_units(owner_id):
+    """Get the number of units a user holds in active holds"""
+    return db.session.query(func.coalesce(func.sum(StockHold.quantity), 0)).filter(
+        StockHold.owner_id == str(owner_id),
+        StockHold.expires_at > datetime.utcnow()
+    ).scalar()
+
+
+def place_hold(lines, ttl, owner_id, max_units=None):
+    """
+    Hold stock for every line, all or nothing, and commit
+
+    Args:
+        lines: Quantity per product ID (see parse_lines)
+        ttl: Seconds until the hold expires
+        owner_id: ID of the user placing the hold; only they can settle it
+        max_units: Most units the user may hold at once across active holds
+
+    Returns:
+        tuple: (hold ID, expiry time)
+
+    Raises:
+        HoldLimitExceeded: If the hold would exceed max_units; nothing is held
+        InsufficientStock: If any product is missing or short; nothing is held
+    """
+    if max_units is not None and held_units(owner_id) + sum(lines.values()) > max_units:
+        db.session.rollback()
+        raise HoldLimitExceeded(f"At most {max_units} units can be held at once")
+    _take_available(lines, lambda quantity: {Product.held_quantity: Product.held_quantity + quantity})
+
+    hold_id = str(uuid.uuid4())
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    db.session.execute(StockHold.__table__.insert(), [
+        {'hold_id': hold_id, 'owner_id': str(owner_id), 'product_id': product_id, 'quantity': quantity,
+         'expires_at': expires_at, 'created_at': datetime.utcnow()}
+        for product_id, quantity in lines.items()
+    ])
+    db.session.commit()
+    return hold_id, expires_at
+
+
+def _unhold(lines):
+    """Move settled hold quantities out of held_quantity, in product ID order"""
+    for product_id in sorted(lines):
+        db.session.query(Product).filter(Product.id == product_id).update(
+            {Product.held_quantity: Product.held_quantity - lines[product_id]},
+            synchronize_session=False
+        )
+
+
+def _settle_hold(hold_id, include_expired, owner_id=None):
+    """
+    Delete a hold's ledger rows in the current transaction
+
+    Returns:
+        dict: Quantity per product ID of the hold
+
+    Raises:
+        HoldNotFound: If the hold is gone (or expired, unless include_expired),
+            or was placed by someone other than owner_id (when given)
+    """
+    holds = db.session.query(StockHold).filter(StockHold.hold_id == hold_id)
+    if owner_id is not None:
+        holds = holds.filter(StockHold.owner_id == str(owner_id))
+    rows = holds.with_entities(StockHold.id, StockHold.product_id, StockHold.quantity).all()
+    query = holds
+    if not include_expired:
+        query = query.filter(StockHold.expires_at > datetime.utcnow())
+    deleted = query.delete(synchronize_session=False) if rows else 0
+    if not rows or deleted != len(rows):
+        # Unknown, expired, or settled by someone else since the read
+        db.session.rollback()
+        raise HoldNotFound(f"Hold {hold_id} not found or expired")
+
+    lines = {}
+    for _, product_id, quantity in rows:
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    return lines
+
+
+def confirm_hold(hold_id, reference, expected_lines=None, owner_id=None):
+    """
+    Turn an active hold into a stock decrement and commit
+
+    Args:
+        hold_id: ID returned by place_hold
+        reference: Record the taken stock as a reservation under this name, so
+            release_stock can give it back later
+        expected_lines: Quantity per product ID the hold must match, if given
+        owner_id: Only confirm the hold if this user placed it, if given
+
+    Returns:
+        dict: Quantity per product ID taken from stock
+
+    Raises:
+        HoldNotFound: If the hold does not exist, has expired or is not owner_id's
+        ValueError: If the hold does not match expected_lines; the hold is kept
+        InsufficientStock: If stock was lowered below the hold; the hold is kept
+        ReservationExists: If the reference is already in use; the hold is kept
+    """
+    lines = _settle_hold(hold_id, include_expired=False, owner_id=owner_id)
+    if expected_lines is not None and expected_lines != lines:
+        db.session.rollback()
+        raise ValueError("Items do not match the hold")
+    _record_reservation(reference, lines)
+
+    for product_id in sorted(lines):
+        quantity = lines[product_id]
+        # Held units can still be short if stock was edited down after the hold
+        updated = db.session.query(Product).filter(
+            Product.id == product_id,
+            Product.stock_quantity >= quantity
+        ).update({
+            Product.stock_quantity: Product.stock_quantity - quantity,
+            Product.held_quantity: Product.held_quantity - quantity,
+        }, synchronize_session=False)
+        if updated != 1:
+            db.session.rollback()
+            shortages, missing = _shortages({product_id: quantity})
+            raise InsufficientStock(shortages, missing)
+
+    db.session.commit()
+    return lines
+
+
+def release_hold(hold_id, owner_id=None):
+    """
+    Give a hold's units back and commit
+
+    Args:
+        hold_id: ID returned by place_hold
+        owner_id: Only release the hold if this user placed it, if given
+
+    Returns:
+        dict: Quantity per product ID that was held
+
+    Raises:
+        HoldNotFound: If the hold does not exist, was already settled or is not owner_id's
+    """
+    lines = _settle_hold(hold_id, include_expired=True, owner_id=owner_id)
+    _unhold(lines)
+    db.session.commit()
+    return lines
+
+
+def expire_holds(limit=500):
+    """
+    Release one batch of expired holds, oldest first
+
+    Returns:
+        int: Number of ledger rows released
+    """
+    now = datetime.utcnow()
+    rows = db.session.query(StockHold.id, StockHold.product_id, StockHold.quantity).filter(
+        StockHold.expires_at <= now
+    ).order_by(StockHold.expires_at).limit(limit).all()
+    if not rows:
+        db.session.commit()
+        return 0
+
+    deleted = db.session.query(StockHold).filter(
+        StockHold.id.in_([row.id for row in rows])
+    ).delete(synchronize_session=False)
+    if deleted != len(rows):
+        # Some were confirmed or released meanwhile: only release the rows we delete
+        db.session.rollback()
+        rows = [row for row in rows if db.session.query(StockHold).filter(
+            StockHold.id == row.id
+        ).delete(synchronize_session=False) == 1]
+
+    lines = {}
+    for _, product_id, quantity in rows:
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    _unhold(lines)
+    db.session.commit()
+    if rows:
+        logger.info(f"Released {len(rows)} expired stock holds")
+    return len(rows)
+
+
+class HoldSweeper:
+    """Background thread that releases expired stock holds for one app"""
+
+    def __init__(self):
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self, app):
+        """Start the sweeper thread for an app (once per process)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(app,), name='hold-sweeper', daemon=True)
+            self._thread.start()
+        logger.info("Stock hold sweeper started")
+
+    def _run(self, app):
+        interval = app.config.get('STOCK_HOLD_SWEEP_INTERVAL', 5)
+        batch_size = app.config.get('STOCK_HOLD_SWEEP_BATCH', 500)
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    while expire_holds(batch_size) == batch_size:
+                        pass
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Stock hold sweeper error: {str(e)}")
+                finally:
+                    db.session.remove()
+
+
+# Create a singleton instance
+hold_sweeper = HoldSweeper()
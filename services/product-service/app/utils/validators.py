@@ -2,6 +2,7 @@
 Validation utilities for product service data inputs
 """
 import re
+import decimal
 from decimal import Decimal
 
 def validate_category_data(data):
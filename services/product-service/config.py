@@ -39,15 +39,64 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
     # JWT Configuration
-    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'ShopMeeting123!SharedSecretKey')
+    # Must match the auth service's JWT_SECRET_KEY so tokens verify locally
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'your_super_secret_jwt_key')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     
     # Service URLs
     AUTH_SERVICE_URL = os.environ.get('AUTH_SERVICE_URL', 'http://localhost:5002')
     
+    # Shared secret other services send in X-Service-Key for service-only
+    # endpoints (stock reservations); unset rejects every such call
+    SERVICE_API_KEY = os.environ.get('SERVICE_API_KEY')
+    
     # Pagination defaults
     DEFAULT_PAGE_SIZE = 10
     MAX_PAGE_SIZE = 100
     
+    # Seconds each worker keeps its in-process category directory before reloading
+    CATEGORY_DIRECTORY_TTL = int(os.environ.get('CATEGORY_DIRECTORY_TTL', '300'))
+    
+    # Rows fetched per server-side cursor round trip by the NDJSON export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+    
+    # Maximum number of IDs accepted by GET/POST /api/v1/products/batch
+    MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', '500'))
+    
+    # Product images: uploads are spooled locally and stored by a background
+    # worker ('local' files served from IMAGE_BASE_URL, or 'cloudinary')
+    IMAGE_STORAGE_BACKEND = os.environ.get('IMAGE_STORAGE_BACKEND', 'local')
+    IMAGE_STORAGE_DIR = os.environ.get('IMAGE_STORAGE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'images'))
+    IMAGE_SPOOL_DIR = os.environ.get('IMAGE_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'image_spool'))
+    IMAGE_BASE_URL = os.environ.get('IMAGE_BASE_URL', '/api/v1/products/images')
+    IMAGE_WORKER_THREAD = os.environ.get('IMAGE_WORKER_THREAD', 'True').lower() == 'true'
+    IMAGE_WORKER_POLL_INTERVAL = float(os.environ.get('IMAGE_WORKER_POLL_INTERVAL', '5'))
+    IMAGE_JOB_MAX_ATTEMPTS = int(os.environ.get('IMAGE_JOB_MAX_ATTEMPTS', '5'))
+    IMAGE_JOB_RETRY_DELAY = float(os.environ.get('IMAGE_JOB_RETRY_DELAY', '5'))
+    IMAGE_JOB_LEASE = int(os.environ.get('IMAGE_JOB_LEASE', '300'))
+    
+    # Checkout stock holds: default and maximum hold lifetime in seconds, and
+    # how often/how many expired holds the sweeper releases per batch
+    STOCK_HOLD_TTL = int(os.environ.get('STOCK_HOLD_TTL', '600'))
+    STOCK_HOLD_MAX_TTL = int(os.environ.get('STOCK_HOLD_MAX_TTL', '3600'))
+    # Most units one user may hold at once across their active holds
+    STOCK_HOLD_MAX_UNITS = int(os.environ.get('STOCK_HOLD_MAX_UNITS', '50'))
+    STOCK_HOLD_SWEEPER_THREAD = os.environ.get('STOCK_HOLD_SWEEPER_THREAD', 'True').lower() == 'true'
+    STOCK_HOLD_SWEEP_INTERVAL = float(os.environ.get('STOCK_HOLD_SWEEP_INTERVAL', '5'))
+    STOCK_HOLD_SWEEP_BATCH = int(os.environ.get('STOCK_HOLD_SWEEP_BATCH', '500'))
+    
+    # Bulk product import: rows validated and written per transaction, and the
+    # number of row errors returned by POST /api/v1/products/import
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', '1000'))
+    IMPORT_MAX_ERRORS = int(os.environ.get('IMPORT_MAX_ERRORS', '1000'))
+    
+    # HTTP caching of catalog reads: seconds clients/CDNs may reuse a response
+    # without revalidating, and seconds a worker caches the catalog version
+    CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', '0'))
+    CATALOG_VERSION_TTL = float(os.environ.get('CATALOG_VERSION_TTL', '1'))
+    
+    # Fail requests that exceed their @query_budget (always on when TESTING)
+    ENFORCE_QUERY_BUDGETS = os.environ.get('ENFORCE_QUERY_BUDGETS', 'False').lower() == 'true'
+    
     # Debug flag
     DEBUG_MODE = os.environ.get('DEBUG_MODE', 'False').lower() == 'true'
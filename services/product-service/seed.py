@@ -3,6 +3,7 @@ Seed script to populate the database with initial test data
 """
 from app import create_app
 from app.models import db, Category, Product, Review
+from app.utils.http_cache import catalog_version
 import logging
 import os
 import sys
@@ -209,6 +210,7 @@ def seed_reviews(products):
             
         review = Review(**review_data)
         db.session.add(review)
+        Product.adjust_rating_aggregates(review_data["product_id"], added=review_data["rating"])
         logger.info(f"Added review for product ID {review_data['product_id']} by {review_data['user_name']}")
         
     db.session.commit()
@@ -226,6 +228,10 @@ def main():
         products = seed_products(categories)
         seed_reviews(products)
         
+        # Invalidate cached catalog responses
+        catalog_version.bump()
+        db.session.commit()
+        
         logger.info("Database seeding completed successfully!")
         return 0
 
@@ -0,0 +1,548 @@
+import io
+import json
+import re
+import time
+import jwt
+import pytest
+from datetime import datetime
+from app import create_app
+from app.models import db, CatalogVersion, Category, Product, ProductImageJob, Review, StockHold
+from app.shared.utils import auth_utils
+from app.shared.utils.count_cache import count_cache
+from app.utils.bulk_import import import_products, iter_rows
+from app.utils.category_directory import category_directory
+from app.utils import image_jobs
+from app.utils.stock import expire_holds
+from app.utils.query_budget import QueryBudgetExceeded
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQL_STATS_ENDPOINT = True
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    count_cache.invalidate()
+    with app.app_context():
+        db.create_all()
+        electronics = Category(name='Electronics')
+        kitchen = Category(name='Kitchen')
+        db.session.add_all([electronics, kitchen])
+        db.session.commit()
+        for i in range(30):
+            db.session.add(Product(
+                name=f'Product {i}',
+                description=f'Description {i}',
+                price=10 + i,
+                category_id=electronics.id if i % 2 else kitchen.id,
+                stock_quantity=5,
+                sku=f'SKU-{i}'
+            ))
+        db.session.commit()
+        for i in range(15):
+            db.session.add(Review(product_id=1, user_id=f'user{i}', user_name='Tester', rating=i % 5 + 1))
+            Product.adjust_rating_aggregates(1, added=i % 5 + 1)
+        db.session.commit()
+        # Mirror the startup load create_app does against an existing database
+        category_directory.load()
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    with app.test_client() as client:
+        yield client
+
+
+def auth_headers(app, **claims):
+    """Authorization header with an access token signed like the auth service's"""
+    claims = dict({
+        'sub': 1, 'type': 'access', 'exp': int(time.time()) + 300,
+        'email': 'tester@example.com', 'first_name': 'Test', 'last_name': 'User', 'role': 'user'
+    }, **claims)
+    return {'Authorization': f"Bearer {jwt.encode(claims, app.config['JWT_SECRET_KEY'], algorithm='HS256')}"}
+
+
+def test_product_listing_stays_within_query_budget(client):
+    response = client.get('/api/v1/products?per_page=100')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['items']) == 30
+    assert {item['category_name'] for item in data['items']} == {'Electronics', 'Kitchen'}
+
+
+def test_query_budget_catches_lazy_loads(client, monkeypatch):
+    # A serializer that touches a lazy relationship issues one query per row
+    original = Product.to_dict
+    monkeypatch.setattr(Product, 'to_dict', lambda self: dict(original(self), reviews=len(self.reviews)))
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/api/v1/products?per_page=100')
+
+
+def test_sparse_fieldsets_narrow_the_payload(client):
+    response = client.get('/api/v1/products?fields=name,image_url&sort=price&cursor=&per_page=5')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [set(item) for item in data['items']] == [{'id', 'name', 'image_url'}] * 5
+
+    # The cursor is built from the sort key even though price was not requested
+    response = client.get(f"/api/v1/products?fields=name&sort=price&per_page=5&cursor={data['pagination']['next_cursor']}")
+    assert [item['id'] for item in response.get_json()['items']] == [6, 7, 8, 9, 10]
+
+    response = client.get('/api/reviews/product/1?fields=rating')
+    assert set(response.get_json()['items'][0]) == {'id', 'rating'}
+    assert client.get('/api/v1/products/1?fields=name,secret').status_code == 400
+
+
+def test_sql_stats_are_reported_per_request_and_endpoint(client):
+    response = client.get('/api/v1/products/1')
+    assert response.headers['Server-Timing'].endswith('desc="1 queries"')
+    client.get('/api/v1/products/2')
+
+    endpoints = {item['endpoint']: item for item in client.get('/debug/sql-stats').get_json()['endpoints']}
+    detail = endpoints['GET /api/v1/products/<int:product_id>']
+    assert (detail['requests'], detail['max_queries'], detail['budget'], detail['over_budget']) == (2, 1, 1, 0)
+    assert detail['slowest_statement'].startswith('SELECT')
+
+
+def test_category_filter_uses_directory(client):
+    response = client.get('/api/v1/products?category=kitchen&per_page=100')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['pagination']['total_items'] == 15
+    assert {item['category_name'] for item in data['items']} == {'Kitchen'}
+
+
+def test_search_uses_full_text_index(client):
+    response = client.get('/api/v1/products?search=product%2012&sort=relevance')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [item['id'] for item in data['items']] == [13]
+
+
+def test_facets_count_the_filtered_set(client):
+    response = client.get('/api/v1/products?facets=category,price&max_price=30&per_page=5')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['pagination']['total_items'] == 21
+    categories = {entry['name']: entry['count'] for entry in data['facets']['category']}
+    assert categories == {'Kitchen': 11, 'Electronics': 10}
+    prices = {entry['label']: entry['count'] for entry in data['facets']['price']}
+    assert prices['0-25'] == 15
+    assert prices['25-50'] == 6
+    assert prices['1000+'] == 0
+
+
+def test_product_detail_within_query_budget(client):
+    response = client.get('/api/v1/products/1')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['reviews_count'] == 15
+    assert data['rating_histogram'] == {'1': 3, '2': 3, '3': 3, '4': 3, '5': 3}
+
+
+def test_review_listing_within_query_budget(client):
+    response = client.get('/api/reviews/product/1?per_page=10')
+    assert response.status_code == 200
+    assert response.get_json()['pagination']['total_items'] == 15
+
+
+def test_review_feed_returns_only_newer_reviews(app, client):
+    response = client.get('/api/reviews/product/1?since=2000-01-01T00:00:00&per_page=10')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [item['id'] for item in data['items']] == list(range(1, 11))
+    assert data['pagination']['has_more'] is True
+
+    data = client.get(f"/api/reviews/product/1?since={data['pagination']['next_since']}&per_page=10").get_json()
+    assert [item['id'] for item in data['items']] == list(range(11, 16))
+    caught_up = data['pagination']['next_since']
+    assert client.get(f'/api/reviews/product/1?since={caught_up}').get_json()['items'] == []
+
+    with app.app_context():
+        db.session.add(Review(product_id=1, user_id='late', user_name='Tester', rating=5))
+        db.session.commit()
+    data = client.get(f'/api/reviews/product/1?since={caught_up}').get_json()
+    assert [item['user_id'] for item in data['items']] == ['late']
+    assert client.get('/api/reviews/product/1?since=yesterday').status_code == 400
+
+
+def test_batch_lookup_reports_missing_ids(client):
+    response = client.get('/api/v1/products/batch?ids=3,1,999,3')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert sorted(data['products']) == ['1', '3']
+    assert data['products']['3']['category_name'] == 'Kitchen'
+    assert data['missing'] == [999]
+
+    response = client.post('/api/v1/products/batch', json={'ids': list(range(1, 41))})
+    assert response.status_code == 200
+    data = response.get_json()
+    assert len(data['products']) == 30
+    assert data['missing'] == list(range(31, 41))
+
+
+def test_export_streams_ndjson(client):
+    response = client.get('/api/v1/products/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['id'] for line in lines] == list(range(1, 31))
+
+    since = response.headers['X-Export-Started-At']
+    response = client.get(f'/api/v1/products/export?updated_since={since}')
+    assert response.get_data(as_text=True) == ''
+
+
+def test_bulk_import_upserts_by_sku_and_reports_bad_rows(app):
+    feed = (
+        "name,price,category,category_id,stock_quantity,sku\n"
+        "Renamed,99.50,,1,,SKU-0\n"
+        "Kettle,25,kitchen,,3,NEW-1\n"
+        "No Price,,,1,,NEW-2\n"
+        "Mystery,5,Garden,,,NEW-3\n"
+        "Old Toaster,15,,2,1,NEW-4\n"
+        "Toaster,19.99,,2,7,NEW-4\n"
+    ).encode()
+    with app.app_context():
+        report = import_products(iter_rows(io.BytesIO(feed), 'csv'), batch_size=4)
+
+        assert (report.processed, report.created, report.updated, report.failed) == (6, 2, 1, 3)
+        assert [(error['row'], error['sku']) for error in report.errors] == [(3, 'NEW-2'), (4, 'NEW-3'), (5, 'NEW-4')]
+
+        renamed = Product.query.filter_by(sku='SKU-0').one()
+        assert (renamed.name, float(renamed.price), renamed.stock_quantity) == ('Renamed', 99.5, 5)
+        kettle = Product.query.filter_by(sku='NEW-1').one()
+        assert kettle.category_id == Category.query.filter_by(name='Kitchen').one().id
+        assert Product.query.filter_by(sku='NEW-4').one().name == 'Toaster'
+        assert Product.query.count() == 32
+
+
+def test_stock_reservation_is_all_or_nothing(app, client):
+    app.config.update(SERVICE_API_KEY='service-key')
+    headers = {'X-Service-Key': 'service-key'}
+    with app.app_context():
+        version = CatalogVersion.query.get(1).version
+
+    def reserve(reference, items, headers=headers):
+        return client.post('/api/v1/products/stock/reserve', headers=headers, json={'reference': reference, 'items': items})
+
+    def release(reference, headers=headers):
+        return client.post('/api/v1/products/stock/release', headers=headers, json={'reference': reference})
+
+    # Customers cannot take or create stock, even when logged in
+    items = [{'product_id': 1, 'quantity': 3}, {'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': 1}]
+    assert reserve('order-1', items, headers=auth_headers(app)).status_code == 403
+    assert reserve('order-1', items, headers={'X-Service-Key': 'guess'}).status_code == 403
+    assert release('order-1', headers=auth_headers(app)).status_code == 403
+
+    response = reserve('order-0', [
+        {'product_id': 1, 'quantity': 2}, {'product_id': 2, 'quantity': 6}, {'product_id': 999, 'quantity': 1}
+    ])
+    assert response.status_code == 409
+    data = response.get_json()
+    assert data['shortages'] == [{'product_id': 2, 'requested': 6, 'available': 5}]
+    assert data['missing'] == [999]
+
+    # Lines for the same product are merged; the last unit can be taken exactly once
+    assert reserve('order-1', items).status_code == 200
+    assert reserve('order-1', items[2:]).status_code == 409
+    assert reserve('order-2', items[2:]).status_code == 200
+    assert reserve('order-3', items[:1]).status_code == 409
+    with app.app_context():
+        assert [Product.query.get(i).stock_quantity for i in (1, 2)] == [0, 3]
+        # Stock movements leave catalog ETags alone
+        assert CatalogVersion.query.get(1).version == version
+
+    # Only recorded reservations can be released, and only once
+    response = release('order-1')
+    assert response.get_json()['released'] == [{'product_id': 1, 'quantity': 5}, {'product_id': 2, 'quantity': 1}]
+    assert release('order-1').status_code == 404
+    assert release('order-0').status_code == 404
+    with app.app_context():
+        assert [Product.query.get(i).stock_quantity for i in (1, 2)] == [5, 4]
+
+    assert reserve('order-4', [{'product_id': 1, 'quantity': 0}]).status_code == 400
+    assert reserve('', items).status_code == 400
+
+
+def test_stock_holds_are_confirmed_released_or_expired(app, client):
+    headers = auth_headers(app)
+
+    def hold(quantity, **body):
+        return client.post('/api/v1/products/stock/holds', headers=headers,
+                           json=dict(items=[{'product_id': 1, 'quantity': quantity}], **body))
+
+    with app.app_context():
+        version = CatalogVersion.query.get(1).version
+
+    first, second = hold(2).get_json(), hold(2).get_json()
+    # Held units are unavailable to further holds and to direct reservations
+    assert hold(2).status_code == 409
+    app.config.update(SERVICE_API_KEY='service-key')
+    reserve = {'reference': 'order-1', 'items': [{'product_id': 1, 'quantity': 2}]}
+    response = client.post('/api/v1/products/stock/reserve', headers={'X-Service-Key': 'service-key'}, json=reserve)
+    assert response.status_code == 409
+    assert client.get('/api/v1/products/stock?ids=1').get_json()['stock']['1'] == {
+        'stock_quantity': 5, 'held_quantity': 4, 'available_quantity': 1
+    }
+
+    # Only services confirm, with a reference, on behalf of the hold's owner
+    service_headers = dict(headers, **{'X-Service-Key': 'service-key'})
+    confirm = {'reference': 'order-2'}
+    response = client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/confirm", headers=headers, json=confirm)
+    assert response.status_code == 403
+    response = client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/confirm", headers=service_headers, json={})
+    assert response.status_code == 400
+    other_user = dict(auth_headers(app, sub=2), **{'X-Service-Key': 'service-key'})
+    response = client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/confirm", headers=other_user, json=confirm)
+    assert response.status_code == 404
+    assert client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/release", headers=auth_headers(app, sub=2)).status_code == 404
+    mismatch = dict(confirm, items=[{'product_id': 1, 'quantity': 1}])
+    response = client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/confirm", headers=service_headers, json=mismatch)
+    assert response.status_code == 409
+    response = client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/confirm", headers=service_headers, json=confirm)
+    assert response.get_json()['confirmed'] == [{'product_id': 1, 'quantity': 2}]
+    with app.app_context():
+        assert CatalogVersion.query.get(1).version == version
+    assert client.post(f"/api/v1/products/stock/holds/{first['hold_id']}/release", headers=headers).status_code == 404
+
+    assert client.post(f"/api/v1/products/stock/holds/{second['hold_id']}/release", headers=headers).status_code == 200
+    third = hold(3).get_json()
+    with app.app_context():
+        assert (Product.query.get(1).stock_quantity, Product.query.get(1).held_quantity) == (3, 3)
+        StockHold.query.filter_by(hold_id=third['hold_id']).update({'expires_at': datetime(2000, 1, 1)})
+        db.session.commit()
+        assert expire_holds() == 1
+        assert Product.query.get(1).held_quantity == 0
+    response = client.post(f"/api/v1/products/stock/holds/{third['hold_id']}/confirm", headers=service_headers,
+                           json={'reference': 'order-3'})
+    assert response.status_code == 404
+
+    # The confirmed hold was recorded as a reservation and can be given back
+    response = client.post('/api/v1/products/stock/release', headers=service_headers, json=confirm)
+    assert response.get_json()['released'] == [{'product_id': 1, 'quantity': 2}]
+    with app.app_context():
+        assert Product.query.get(1).stock_quantity == 5
+
+
+def test_tokens_are_verified_locally_and_cached(app, client, monkeypatch):
+    calls = []
+
+    class VerifyResponse:
+        status_code = 200
+
+        def json(self):
+            return {'user': {'id': 7, 'email': 'shopper@example.com', 'role': 'user'}}
+
+    monkeypatch.setattr(auth_utils.requests, 'get', lambda *args, **kwargs: calls.append(args) or VerifyResponse())
+    app.config.update(DEBUG_MODE=False)
+
+    def release(token):
+        return client.post('/api/v1/products/stock/holds/unknown/release', headers={'Authorization': f'Bearer {token}'})
+
+    claims = {'sub': 7, 'type': 'access', 'exp': int(time.time()) + 60}
+    token = jwt.encode(claims, app.config['JWT_SECRET_KEY'], algorithm='HS256')
+    # Authenticated (the hold does not exist); only the first request asks the auth service
+    assert [release(token).status_code for _ in range(3)] == [404, 404, 404]
+    assert len(calls) == 1
+
+    # Forged and expired tokens are rejected without a network call
+    assert release(jwt.encode(claims, 'another-secret-key-of-sufficient-length', algorithm='HS256')).status_code == 401
+    assert release(jwt.encode(dict(claims, exp=int(time.time()) - 1), app.config['JWT_SECRET_KEY'], algorithm='HS256')).status_code == 401
+
+    # Tokens that carry the user's claims never need the auth service
+    profile = {'email': 'agent@example.com', 'first_name': 'Sam', 'last_name': 'Lee', 'role': 'support_agent'}
+    assert release(jwt.encode(dict(claims, **profile), app.config['JWT_SECRET_KEY'], algorithm='HS256')).status_code == 404
+    assert len(calls) == 1
+
+    # DEBUG_MODE only lets requests through while the auth service is unreachable
+    def unreachable(*args, **kwargs):
+        raise auth_utils.requests.ConnectionError()
+    monkeypatch.setattr(auth_utils.requests, 'get', unreachable)
+    app.config.update(DEBUG_MODE=True)
+    assert release('not-a-token').status_code == 401
+    assert release(jwt.encode(claims, 'another-secret-key-of-sufficient-length', algorithm='HS256')).status_code == 401
+    assert release(jwt.encode(dict(claims, sub=8), app.config['JWT_SECRET_KEY'], algorithm='HS256')).status_code == 404
+
+
+def test_image_uploads_are_processed_in_the_background(app, client, tmp_path, monkeypatch):
+    app.config.update(IMAGE_STORAGE_DIR=str(tmp_path / 'images'), IMAGE_SPOOL_DIR=str(tmp_path / 'spool'))
+    response = client.post('/api/v1/products', headers=auth_headers(app), data={
+        'name': 'Camera', 'price': '199.99', 'category_id': '1', 'image': (io.BytesIO(b'first'), 'camera.jpg')
+    })
+    assert response.status_code == 201
+    product = response.get_json()
+    assert (product['image_status'], product['image_url']) == ('pending', None)
+
+    # The first attempt fails and is retried
+    real_storage = image_jobs.get_image_storage
+    failing = type('FailingStorage', (), {'upload_file': lambda self, path, folder=None: 1 / 0})()
+    monkeypatch.setattr(image_jobs, 'get_image_storage', lambda: failing)
+    with app.app_context():
+        assert image_jobs.process_pending_jobs() == 1
+        job = ProductImageJob.query.one()
+        assert (job.status, job.attempts) == ('pending', 1)
+        job.next_attempt_at = job.created_at
+        db.session.commit()
+    monkeypatch.setattr(image_jobs, 'get_image_storage', real_storage)
+    with app.app_context():
+        assert image_jobs.process_pending_jobs() == 1
+
+    stored = client.get(f"/api/v1/products/{product['id']}").get_json()
+    assert stored['image_status'] is None
+    assert client.get(stored['image_url']).data == b'first'
+
+    # Replacing the image deletes the old file once the new one is stored
+    client.put(f"/api/v1/products/{product['id']}", headers=auth_headers(app), data={
+        'name': 'Camera', 'price': '199.99', 'category_id': '1', 'image': (io.BytesIO(b'second'), 'camera.png')
+    })
+    with app.app_context():
+        # The upload queues the deletion, which the next poll picks up
+        assert image_jobs.process_pending_jobs() == 1
+        assert image_jobs.process_pending_jobs() == 1
+    replaced = client.get(f"/api/v1/products/{product['id']}").get_json()
+    assert client.get(replaced['image_url']).data == b'second'
+    assert client.get(stored['image_url']).status_code == 404
+    assert list((tmp_path / 'spool').iterdir()) == []
+
+
+def test_unchanged_catalog_reads_revalidate_with_304(app, client):
+    first = client.get('/api/v1/products/2')
+    assert first.status_code == 200
+    etag = first.headers['ETag']
+
+    second = client.get('/api/v1/products/2', headers={'If-None-Match': etag})
+    assert second.status_code == 304
+    assert second.headers['ETag'] == etag
+
+    # Any catalog write changes the version, so the old ETag no longer matches
+    from app.utils.http_cache import catalog_version
+    with app.app_context():
+        catalog_version.bump()
+        db.session.commit()
+    third = client.get('/api/v1/products/2', headers={'If-None-Match': etag})
+    assert third.status_code == 200
+    assert third.headers['ETag'] != etag
+
+
+def test_cursor_pagination_walks_every_product(client):
+    seen = []
+    cursor = ''
+    while True:
+        response = client.get(f'/api/v1/products?sort=price&order=desc&per_page=7&cursor={cursor}')
+        assert response.status_code == 200
+        data = response.get_json()
+        seen.extend(item['id'] for item in data['items'])
+        if not data['pagination']['has_next']:
+            break
+        cursor = data['pagination']['next_cursor']
+    assert seen == list(range(30, 0, -1))
+
+
+def queries_run(response):
+    """Number of SQL statements a request ran, from its Server-Timing header"""
+    return int(re.search(r'desc="(\d+) queries"', response.headers['Server-Timing']).group(1))
+
+
+def test_count_none_pages_without_counting(client):
+    response = client.get('/api/v1/products?count=none&per_page=10&page=2')
+    pagination = response.get_json()['pagination']
+    assert (pagination['count'], pagination['total_items'], pagination['total_pages']) == ('none', None, None)
+    assert pagination['has_next'] is True
+    # The last full page: the extra row is missing, so there is no next page
+    last = client.get('/api/v1/products?count=none&per_page=10&page=3').get_json()
+    assert (len(last['items']), last['pagination']['has_next']) == (10, False)
+
+    count_cache.invalidate()
+    exact = client.get('/api/v1/products?per_page=10&page=2')
+    assert queries_run(response) == queries_run(exact) - 1
+
+
+def test_count_estimated_is_exact_on_sqlite(client):
+    # SQLite has no planner estimates, so the exact count is used and reported as such
+    pagination = client.get('/api/v1/products?count=estimated&category=kitchen&per_page=10').get_json()['pagination']
+    assert 'count' not in pagination
+    assert (pagination['total_items'], pagination['total_pages'], pagination['has_next']) == (15, 2, True)
+
+
+def test_product_writes_invalidate_cached_counts(app, client):
+    total = lambda: client.get('/api/v1/products').get_json()['pagination']['total_items']
+    assert total() == 30
+    # A row written behind the API's back is not counted until the entry expires
+    with app.app_context():
+        db.session.add(Product(name='Unseen', price=1, category_id=1, stock_quantity=1, sku='SKU-unseen'))
+        db.session.commit()
+    assert total() == 30
+
+    response = client.post('/api/v1/products', headers=auth_headers(app),
+                           data={'name': 'New product', 'price': '5', 'category_id': '1'})
+    assert response.status_code == 201
+    assert total() == 32
+
+
+def test_updates_only_change_editable_fields(app, client):
+    response = client.patch('/api/v1/products/3', headers=auth_headers(app), json={
+        'name': 'Renamed', 'held_quantity': 99, 'rating_average': 5, 'image_status': 'done'
+    })
+    assert response.status_code == 200
+    with app.app_context():
+        product = Product.query.get(3)
+        assert product.name == 'Renamed'
+        assert product.held_quantity == 0
+        assert product.rating_average == 0
+        assert product.image_status is None
+
+    response = client.put('/api/v1/products/3', headers=auth_headers(app), data={
+        'name': 'Renamed again', 'price': '12', 'category_id': '1', 'review_count': '40'
+    })
+    assert response.status_code == 200
+    with app.app_context():
+        product = Product.query.get(3)
+        assert product.name == 'Renamed again'
+        assert product.review_count == 0
+
+
+def test_autogenerate_leaves_the_search_index_alone(app):
+    from alembic.autogenerate import compare_metadata
+    from alembic.migration import MigrationContext
+    from app.utils.search import include_object
+    with app.app_context(), db.engine.connect() as connection:
+        context = MigrationContext.configure(connection, opts={'include_object': include_object})
+        changes = compare_metadata(context, db.metadata)
+    assert not [change for change in changes if 'product_fts' in str(change)]
+
+
+def test_missing_search_index_is_looked_for_again(app, monkeypatch):
+    from app.utils import search
+    with app.app_context():
+        key = str(db.engine.url)
+        # A recent miss is trusted; once it expires the index created since is found
+        monkeypatch.setitem(search._index_available, key, (False, time.monotonic() + 60))
+        assert search.search_index_available(Product.query.session) is False
+        monkeypatch.setitem(search._index_available, key, (False, time.monotonic() - 1))
+        assert search.search_index_available(Product.query.session) is True
+        assert search._index_available[key] == (True, None)
+
+
+def test_users_can_only_hold_a_limited_number_of_units(app, client):
+    app.config.update(STOCK_HOLD_MAX_UNITS=6)
+
+    def hold(product_id, quantity, **claims):
+        return client.post('/api/v1/products/stock/holds', headers=auth_headers(app, **claims),
+                           json={'items': [{'product_id': product_id, 'quantity': quantity}]})
+
+    assert hold(1, 4).status_code == 201
+    response = hold(2, 3)
+    assert response.status_code == 429
+    assert hold(2, 2).status_code == 201
+    # The limit is per user
+    assert hold(3, 5, sub=2).status_code == 201
+    with app.app_context():
+        assert Product.query.get(2).held_quantity == 2
@@ -5,6 +5,8 @@ from flask_cors import CORS
 from config import Config
 from app.models import db
 from app.utils.error_handlers import register_error_handlers
+from app.utils.json_provider import install_json_provider
+from app.utils.sql_instrumentation import install_sql_instrumentation
 import os
 import logging
 import datetime
@@ -16,6 +18,8 @@ logger.setLevel(logging.DEBUG)
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    install_json_provider(app)
+    install_sql_instrumentation(app)
     
     # Configure CORS with allowed origins
     CORS(app, resources={r"/*": {
@@ -9,6 +9,9 @@ import os
 bp = Blueprint('wishlist', __name__)
 logger = logging.getLogger(__name__)
 
+# Largest ID list product-service accepts in one batch lookup
+PRODUCT_BATCH_SIZE = 500
+
 @bp.route('/wishlist', methods=['GET'])
 @auth_required
 def get_wishlist():
@@ -55,23 +58,31 @@ def get_wishlist():
     wishlist_items = WishlistItem.query.filter_by(profile_id=profile.id).all()
     product_ids = [item.product_id for item in wishlist_items]
     
-    # Fetch product details from product service
+    # Fetch product details from product service, one batch call per chunk of IDs
     products = []
     failed_products = []
-    for product_id in product_ids:
+    for start in range(0, len(product_ids), PRODUCT_BATCH_SIZE):
+        chunk = product_ids[start:start + PRODUCT_BATCH_SIZE]
         try:
-            response = requests.get(
-                f"{Config.PRODUCT_SERVICE_URL}/products/{product_id}",
+            response = requests.post(
+                f"{Config.PRODUCT_SERVICE_URL}/api/v1/products/batch",
+                json={'ids': chunk},
                 timeout=5
             )
             if response.status_code == 200:
-                products.append(response.json())
+                found = response.json().get('products', {})
+                for product_id in chunk:
+                    if str(product_id) in found:
+                        products.append(found[str(product_id)])
+                    else:
+                        failed_products.append(product_id)
+                        logger.error(f"Failed to fetch product {product_id}: not found")
             else:
-                failed_products.append(product_id)
-                logger.error(f"Failed to fetch product {product_id}: Status {response.status_code}")
+                failed_products.extend(chunk)
+                logger.error(f"Failed to fetch products {chunk}: Status {response.status_code}")
         except requests.RequestException as e:
-            failed_products.append(product_id)
-            logger.error(f"Failed to fetch product {product_id}: {str(e)}")
+            failed_products.extend(chunk)
+            logger.error(f"Failed to fetch products {chunk}: {str(e)}")
     
     result = {
         'wishlist': products,
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+Benchmark the shared JSON provider against the standard library encoder
+
+Encodes realistic product listing and order history payloads with both the
+stdlib json module (what Flask's default encoder uses) and json_provider.dumps,
+with sorted keys as Flask does by default, and prints the time per response.
+
+Usage:
+    python shared/json_benchmark.py [--iterations N]
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import json_provider  # noqa: E402
+
+
+def product_listing(count=100, native=False):
+    """A page of products shaped like Product.to_dict()"""
+    now = datetime.datetime(2025, 5, 1, 14, 45, 0, 123456)
+    products = []
+    for i in range(count):
+        created_at = now - datetime.timedelta(days=i)
+        products.append({
+            'id': i + 1,
+            'name': f'Product {i}',
+            'description': 'High-quality noise-cancelling headphones with superior sound ' * 2,
+            'price': Decimal(f'{10 + i}.99') if native else float(f'{10 + i}.99'),
+            'category_id': i % 8 + 1,
+            'category_name': 'Electronics',
+            'stock_quantity': 50,
+            'sku': f'SKU-{i:06d}',
+            'image_url': f'https://example.com/images/{i}.jpg',
+            'average_rating': 4.5,
+            'reviews_count': 12,
+            'rating_histogram': {'1': 0, '2': 1, '3': 2, '4': 4, '5': 5},
+            'created_at': created_at if native else created_at.isoformat(),
+            'updated_at': now if native else now.isoformat(),
+        })
+    return {
+        'items': products,
+        'pagination': {'page': 1, 'per_page': count, 'total_items': 5000, 'total_pages': 50,
+                       'has_next': True, 'has_prev': False},
+    }
+
+
+def order_history(count=50, items_per_order=5):
+    """An order history page with Decimal amounts, datetimes and nested items"""
+    now = datetime.datetime(2025, 5, 1, 14, 45, 0, 123456)
+    orders = []
+    for i in range(count):
+        items = [{
+            'id': i * items_per_order + n,
+            'product_id': n + 1,
+            'product_name': f'Product {n}',
+            'quantity': n + 1,
+            'unit_price': Decimal(f'{20 + n}.50'),
+        } for n in range(items_per_order)]
+        orders.append({
+            'id': i + 1,
+            'order_number': str(uuid.UUID(int=i)),
+            'user_id': str(uuid.UUID(int=10 ** 6 + i)),
+            'status': 'delivered',
+            'total_amount': sum((item['unit_price'] * item['quantity'] for item in items), Decimal('0')),
+            'shipping_address': '123 Market Street, Springfield',
+            'created_at': now - datetime.timedelta(days=i),
+            'updated_at': now,
+            'items': items,
+        })
+    return {'orders': orders, 'total': count}
+
+
+def stdlib_dumps(payload):
+    """The current path: stdlib json with the same fallbacks for non-JSON types"""
+    return json.dumps(payload, default=json_provider.default, sort_keys=True, separators=(',', ':'))
+
+
+def provider_dumps(payload):
+    return json_provider.dumps(payload, sort_keys=True)
+
+
+def run(iterations):
+    payloads = [
+        ('product listing (100, pre-serialized)', product_listing()),
+        ('product listing (100, Decimal/datetime)', product_listing(native=True)),
+        ('order history (50 orders x 5 items)', order_history()),
+    ]
+    backend = 'orjson' if json_provider.orjson is not None else 'stdlib fallback (orjson not installed)'
+    print(f"json_provider backend: {backend}, {iterations} iterations per payload\n")
+    print(f"{'payload':<42}{'bytes':>8}{'stdlib us':>12}{'provider us':>14}{'speedup':>10}")
+    for name, payload in payloads:
+        assert json.loads(stdlib_dumps(payload)) == json.loads(provider_dumps(payload))
+        size = len(provider_dumps(payload).encode('utf-8'))
+        baseline = min(timeit.repeat(lambda: stdlib_dumps(payload), number=iterations, repeat=3)) / iterations
+        fast = min(timeit.repeat(lambda: provider_dumps(payload), number=iterations, repeat=3)) / iterations
+        print(f"{name:<42}{size:>8}{baseline * 1e6:>12.1f}{fast * 1e6:>14.1f}{baseline / fast:>9.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    run(parser.parse_args().iterations)
@@ -0,0 +1,117 @@
+"""
+Fast JSON encoding for the Shop Meeting API services.
+
+install_json_provider(app) makes jsonify() (and every other Flask JSON
+response) encode with orjson, falling back to the standard library encoder when
+orjson is not installed. Datetimes, dates, times and UUIDs are serialized
+natively as ISO 8601 strings, and Decimals as numbers. Works with both the
+Flask 2.0 encoder hook (app.json_encoder) and the Flask 2.2+ provider API
+(app.json).
+
+Each service keeps a copy of this module next to its other shared utilities;
+edit this file and copy it over rather than changing a service's copy.
+"""
+import dataclasses
+import datetime
+import decimal
+import json
+import uuid
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - stdlib fallback
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2
+    DefaultJSONProvider = None
+
+
+def default(obj):
+    """
+    Serialize types the encoders do not handle natively
+
+    Raises:
+        TypeError: If the object cannot be serialized
+    """
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, sort_keys=False, indent=None):
+    """
+    Serialize an object to a JSON string
+
+    Args:
+        obj: Object to serialize
+        sort_keys: Sort dictionary keys
+        indent: Pretty-print with indentation (orjson always indents by 2)
+
+    Returns:
+        str: JSON document
+    """
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, default=default, option=option).decode('utf-8')
+        except orjson.JSONEncodeError:
+            # e.g. integers wider than 64 bits, which the stdlib encoder accepts
+            pass
+
+    separators = None if indent else (',', ':')
+    return json.dumps(obj, default=default, sort_keys=sort_keys, indent=indent,
+                      separators=separators, ensure_ascii=False)
+
+
+class FastJSONEncoder(json.JSONEncoder):
+    """Flask 2.0 encoder class whose encoding is delegated to dumps()"""
+
+    def encode(self, o):
+        return dumps(o, sort_keys=self.sort_keys, indent=self.indent)
+
+    def iterencode(self, o, _one_shot=False):
+        return iter([self.encode(o)])
+
+
+if DefaultJSONProvider is not None:
+    class FastJSONProvider(DefaultJSONProvider):
+        """Flask 2.2+ JSON provider that encodes with dumps()"""
+
+        def dumps(self, obj, **kwargs):
+            return dumps(obj, sort_keys=kwargs.get('sort_keys', self.sort_keys), indent=kwargs.get('indent'))
+else:
+    FastJSONProvider = None
+
+
+def install_json_provider(app):
+    """
+    Make a Flask app encode its JSON responses with dumps()
+
+    Args:
+        app: Flask application
+
+    Returns:
+        Flask: The same application
+    """
+    if FastJSONProvider is not None:
+        app.json_provider_class = FastJSONProvider
+        app.json = FastJSONProvider(app)
+    else:
+        app.json_encoder = FastJSONEncoder
+    return app
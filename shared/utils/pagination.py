@@ -1,6 +1,12 @@
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+
 from flask_sqlalchemy import SQLAlchemy
 from flask import request, url_for
-from typing import Dict, Any, List
+from sqlalchemy import and_, or_
+from typing import Dict, Any, List, Optional, Tuple
 
 class PaginationHelper:
     @staticmethod
@@ -48,4 +54,102 @@ class PaginationHelper:
             per_page = min(int(request.args.get('per_page', 10)), 100)
             return page, per_page
         except (TypeError, ValueError):
-            return 1, 10
\ No newline at end of file
+            return 1, 10
+
+    @staticmethod
+    def get_cursor_param() -> Optional[str]:
+        """
+        Gets the keyset cursor from request args ('' starts cursor mode, None opts out)
+        """
+        return request.args.get('cursor')
+
+    @staticmethod
+    def encode_cursor(item, sort_column, id_column, descending: bool = False) -> str:
+        """
+        Builds an opaque cursor pointing just past the given item
+        """
+        value = getattr(item, sort_column.key)
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+
+        payload = {'s': sort_column.key, 'd': bool(descending), 'k': value, 'i': getattr(item, id_column.key)}
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor: str, sort_column, id_column, descending: bool = False) -> Tuple[Any, Any]:
+        """
+        Decodes a cursor into (sort_value, last_id), raising ValueError if it is
+        malformed or was issued for a different sort
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            sort_key, cursor_desc = payload['s'], payload['d']
+            value, last_id = payload['k'], payload['i']
+        except (ValueError, TypeError, KeyError):
+            raise ValueError("Malformed cursor")
+
+        if sort_key != sort_column.key or cursor_desc != bool(descending):
+            raise ValueError("Cursor does not match the requested sort order")
+
+        try:
+            last_id = id_column.type.python_type(last_id)
+            if value is not None:
+                python_type = sort_column.type.python_type
+                value = datetime.fromisoformat(value) if python_type is datetime else python_type(value)
+        except (ValueError, TypeError, ArithmeticError):
+            raise ValueError("Malformed cursor")
+
+        return value, last_id
+
+    @staticmethod
+    def paginate_cursor(query, model, per_page: int, cursor: str, sort_column, id_column,
+                        descending: bool = False) -> Dict[str, Any]:
+        """
+        Paginates a SQLAlchemy query by seeking past the (sort key, id) position in
+        the cursor instead of using OFFSET, so deep pages cost the same as the first
+        """
+        if cursor:
+            value, last_id = PaginationHelper.decode_cursor(cursor, sort_column, id_column, descending)
+            if sort_column is id_column:
+                seek = id_column < last_id if descending else id_column > last_id
+            elif descending:
+                seek = or_(sort_column < value, and_(sort_column == value, id_column < last_id))
+            else:
+                seek = or_(sort_column > value, and_(sort_column == value, id_column > last_id))
+            query = query.filter(seek)
+
+        query = query.order_by(None)
+        if sort_column is id_column:
+            query = query.order_by(id_column.desc() if descending else id_column.asc())
+        elif descending:
+            query = query.order_by(sort_column.desc(), id_column.desc())
+        else:
+            query = query.order_by(sort_column.asc(), id_column.asc())
+
+        items = query.limit(per_page + 1).all()
+        has_next = len(items) > per_page
+        items = items[:per_page]
+
+        next_cursor = PaginationHelper.encode_cursor(
+            items[-1], sort_column, id_column, descending
+        ) if has_next else None
+
+        next_url = url_for(
+            request.endpoint,
+            **{**request.args.to_dict(), 'cursor': next_cursor, 'per_page': per_page}
+        ) if has_next else None
+
+        return {
+            'items': items,
+            'meta': {
+                'per_page': per_page,
+                'cursor': cursor or None,
+                'next_cursor': next_cursor,
+                'has_next': has_next,
+                'next_url': next_url
+            }
+        }